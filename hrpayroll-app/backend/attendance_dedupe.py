@@ -0,0 +1,77 @@
+"""
+Migration to one attendance record per employee and day.
+
+Databases created before uq_attendances_employee_date may hold several
+records for the same (employee_id, date). Each group is merged into its
+lowest id, keeping the earliest check-in and the latest check-out, and the
+other records are deleted, all set-based. The unique index is then created,
+the index on employee_id alone, which its prefix covers, is dropped and the
+dashboard summaries are rebuilt.
+
+Run from the backend directory before deploying: python -m attendance_dedupe
+"""
+from sqlalchemy import and_, delete, exists, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from attendance_ingest import work_hours_expression
+from models import Attendance
+from summaries import rebuild_summaries
+
+async def merge_duplicate_attendances(db: AsyncSession) -> int:
+    """Merge and delete duplicate attendance records; returns the number deleted."""
+    table = Attendance.__table__
+    other = table.alias("other")
+    same_day = and_(
+        other.c.employee_id == table.c.employee_id,
+        other.c.date == table.c.date
+    )
+
+    kept_ids = list(await db.scalars(
+        update(table)
+        .where(
+            table.c.id == select(func.min(other.c.id)).where(same_day).scalar_subquery(),
+            exists().where(same_day, other.c.id != table.c.id)
+        )
+        .values(
+            check_in=select(func.min(other.c.check_in)).where(same_day).scalar_subquery(),
+            check_out=select(func.max(other.c.check_out)).where(same_day).scalar_subquery(),
+            updated_at=func.now()
+        )
+        .returning(table.c.id)
+    ))
+    if not kept_ids:
+        return 0
+
+    await db.execute(
+        update(table)
+        .where(table.c.id.in_(kept_ids), table.c.check_out >= table.c.check_in)
+        .values(work_hours=work_hours_expression(
+            db.bind.dialect.name, table.c.check_in, table.c.check_out
+        ))
+    )
+    deleted = await db.execute(
+        delete(table).where(exists().where(same_day, other.c.id < table.c.id))
+    )
+    return deleted.rowcount
+
+async def migrate(db: AsyncSession) -> int:
+    """Deduplicate, add the unique index and rebuild the summaries."""
+    deleted = await merge_duplicate_attendances(db)
+    await db.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_attendances_employee_date "
+        "ON attendances(employee_id, date)"
+    ))
+    await db.execute(text("DROP INDEX IF EXISTS idx_attendances_employee_id"))
+    await rebuild_summaries(db)
+    return deleted
+
+async def _migrate() -> None:
+    from database import AsyncSessionLocal, dispose_engines
+    async with AsyncSessionLocal() as db:
+        deleted = await migrate(db)
+    print(f"Removed {deleted} duplicate attendance records")
+    await dispose_engines()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(_migrate())
@@ -0,0 +1,48 @@
+"""
+Attendance export query.
+
+Selects plain columns rather than Attendance objects, so rows streamed from
+the server-side cursor are never added to the session's identity map.
+"""
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select
+
+from models import Attendance, Employee
+
+EXPORT_COLUMNS = (
+    "id", "employee_id", "first_name", "last_name", "department_id", "date",
+    "status", "check_in", "check_out", "work_hours", "notes",
+)
+
+def export_query(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    department_id: Optional[int] = None
+):
+    """Attendance rows with the employee's name and department, ordered by (date, id)."""
+    query = (
+        select(
+            Attendance.id,
+            Attendance.employee_id,
+            Employee.first_name,
+            Employee.last_name,
+            Employee.department_id,
+            Attendance.date,
+            Attendance.status,
+            Attendance.check_in,
+            Attendance.check_out,
+            Attendance.work_hours,
+            Attendance.notes
+        )
+        .join(Employee, Employee.id == Attendance.employee_id)
+        .order_by(Attendance.date, Attendance.id)
+    )
+    if start_date:
+        query = query.where(Attendance.date >= start_date)
+    if end_date:
+        query = query.where(Attendance.date <= end_date)
+    if department_id:
+        query = query.where(Employee.department_id == department_id)
+    return query
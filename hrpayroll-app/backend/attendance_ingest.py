@@ -0,0 +1,151 @@
+"""
+Batch ingestion of time-clock punches.
+
+A batch of check-in/check-out events is reduced to one row per
+(employee_id, date) with the earliest check-in and the latest check-out, and
+upserted with INSERT ... ON CONFLICT on the unique (employee_id, date) index:
+existing rows keep the earlier check-in and the later check-out of the stored
+and the new punches, and keep their status. work_hours is then recomputed in
+SQL for the affected rows with an UPDATE, and the dashboard attendance
+summaries are adjusted from the rows' old and new values. Rows are written in
+slices that fit the bound parameter limit of one statement
+(summaries.MAX_STATEMENT_PARAMETERS); the whole batch is committed once.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import Integer, cast, extract, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Attendance, AttendanceType, Employee, PunchDirection
+from result_cache import result_cache
+from summaries import SummaryDelta, dialect_insert, statement_slices
+
+@dataclass
+class IngestResult:
+    received: int
+    upserted: int = 0
+    rejected: List[dict] = field(default_factory=list)
+
+def _earliest(dialect_name: str, stored, new):
+    if dialect_name == "postgresql":
+        return func.least(stored, new)
+    # SQLite's scalar min() returns NULL when either argument is NULL
+    return func.min(func.coalesce(stored, new), func.coalesce(new, stored))
+
+def _latest(dialect_name: str, stored, new):
+    if dialect_name == "postgresql":
+        return func.greatest(stored, new)
+    return func.max(func.coalesce(stored, new), func.coalesce(new, stored))
+
+def work_hours_expression(dialect_name: str, check_in, check_out):
+    """SQL expression for the hours between two timestamp columns."""
+    if dialect_name == "postgresql":
+        return extract("epoch", check_out - check_in) / 3600.0
+    # Whole seconds, which unlike julianday() differences are exact
+    seconds = (
+        cast(func.strftime("%s", check_out), Integer)
+        - cast(func.strftime("%s", check_in), Integer)
+    )
+    return seconds / 3600.0
+
+def coalesce_punches(events: Sequence) -> Dict[Tuple[int, date], dict]:
+    """
+    Reduce punch events (objects with employee_id, timestamp and direction)
+    to one attendance row per (employee_id, date) with the earliest check-in
+    and the latest check-out.
+    """
+    rows: Dict[Tuple[int, date], dict] = {}
+    for event in events:
+        day = event.timestamp.date()
+        row = rows.setdefault((event.employee_id, day), {
+            "employee_id": event.employee_id,
+            "date": day,
+            "status": AttendanceType.PRESENT,
+            "check_in": None,
+            "check_out": None,
+        })
+        if event.direction == PunchDirection.IN:
+            if row["check_in"] is None or event.timestamp < row["check_in"]:
+                row["check_in"] = event.timestamp
+        elif row["check_out"] is None or event.timestamp > row["check_out"]:
+            row["check_out"] = event.timestamp
+    return rows
+
+async def ingest_punches(db: AsyncSession, events: Sequence) -> IngestResult:
+    """
+    Upsert a batch of punch events and commit. Events of unknown employees
+    are rejected and reported by their index in the batch.
+    """
+    result = IngestResult(received=len(events))
+    employee_ids = list({event.employee_id for event in events})
+    known_employees = set()
+    for chunk in statement_slices(employee_ids, 1):
+        known_employees.update(await db.scalars(
+            select(Employee.id).where(Employee.id.in_(chunk))
+        ))
+
+    accepted = []
+    for index, event in enumerate(events):
+        if event.employee_id in known_employees:
+            accepted.append(event)
+        else:
+            result.rejected.append({"index": index, "error": "Employee not found"})
+
+    rows = coalesce_punches(accepted)
+    if not rows:
+        return result
+
+    dialect_name = db.bind.dialect.name
+    table = Attendance.__table__
+    delta = SummaryDelta()
+    keys = list(rows)
+    for chunk in statement_slices(keys, 2):
+        previous = await db.execute(
+            select(table.c.date, table.c.status, table.c.work_hours)
+            .where(tuple_(table.c.employee_id, table.c.date).in_(chunk))
+        )
+        for attendance in previous:
+            delta.attendance(attendance, sign=-1)
+
+    upserted = {}
+    values = list(rows.values())
+    for chunk in statement_slices(values, len(values[0])):
+        statement = dialect_insert(db)(table).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=["employee_id", "date"],
+            set_={
+                "check_in": _earliest(dialect_name, table.c.check_in, statement.excluded.check_in),
+                "check_out": _latest(dialect_name, table.c.check_out, statement.excluded.check_out),
+                "updated_at": func.now(),
+            }
+        ).returning(table.c.id, table.c.date, table.c.status, table.c.work_hours)
+        upserted.update((row.id, row) for row in await db.execute(statement))
+
+    recomputed = {}
+    for chunk in statement_slices(list(upserted), 1):
+        recomputed.update((await db.execute(
+            update(table)
+            .where(
+                table.c.id.in_(chunk),
+                table.c.check_out >= table.c.check_in
+            )
+            .values(work_hours=work_hours_expression(
+                dialect_name, table.c.check_in, table.c.check_out
+            ))
+            .returning(table.c.id, table.c.work_hours)
+        )).all())
+
+    for attendance_id, attendance in upserted.items():
+        delta.add_attendance(
+            attendance.date,
+            attendance.status,
+            recomputed.get(attendance_id, attendance.work_hours)
+        )
+    await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Attendance.__tablename__)
+
+    result.upserted = len(upserted)
+    return result
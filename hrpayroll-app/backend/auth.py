@@ -1,18 +1,38 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
 from models import User, UserRole
-from schemas import TokenData
+from schemas import TokenData, UserResponse
 from config import settings
+from principal_cache import principal_cache
 
 # Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt takes hundreds of milliseconds of CPU per call and releases the GIL,
+# so hashing runs on a bounded thread pool instead of the event loop. Calls
+# beyond PASSWORD_HASH_MAX_PENDING in flight are rejected with 429.
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count(),
+    thread_name_prefix="password-hash"
+)
+_password_hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_PENDING)
+
+T = TypeVar("T")
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_PREFIX}/auth/login")
@@ -25,6 +45,26 @@ def get_password_hash(password: str) -> str:
     """Generate a hash from a plain password."""
     return pwd_context.hash(password)
 
+async def _run_password_hashing(func: Callable[..., T], *args) -> T:
+    """Run a password hashing function on the hashing pool, with back-pressure."""
+    if _password_hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent authentication requests, please retry",
+            headers={"Retry-After": "1"}
+        )
+    async with _password_hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_hash_executor, func, *args)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without blocking the event loop."""
+    return await _run_password_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool without blocking the event loop."""
+    return await _run_password_hashing(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -33,7 +73,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(
         to_encode, 
         settings.SECRET_KEY, 
@@ -43,9 +83,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
-    """Get the current authenticated user from the token."""
+    """
+    Get the current authenticated user from the token.
+    The user is looked up once per token and then served from the principal
+    cache. The returned User is a transient copy without the password hash.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -63,30 +107,32 @@ async def get_current_user(
             raise credentials_exception
         
         token_data = TokenData(username=username)
+        issued_at = payload.get("iat")
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
+    # Read before the user so a concurrent invalidation is not overwritten
+    generation = await principal_cache.generation(token_data.username)
+    principal = await principal_cache.get(token_data.username, issued_at, generation)
+    if principal is None:
+        user = await db.scalar(select(User).where(User.username == token_data.username))
+        if user is None:
+            raise credentials_exception
+        principal = UserResponse.model_validate(user)
+        await principal_cache.set(token_data.username, issued_at, generation, principal)
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
     
-    return user
+    return User(**principal.model_dump())
 
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
-    """Get the current active user."""
-    if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
-        )
+    """Get the current active user. Inactive users are rejected by get_current_user."""
     return current_user
 
 def check_admin_permission(
@@ -0,0 +1,132 @@
+"""
+Batch payroll arithmetic benchmark: floats vs Decimal vs integer cents.
+
+Computes the amounts of a payroll run (overtime pay, deductions, tax and net
+salary) for synthetic employees (100k by default) three ways: the former
+float64 numpy arithmetic rounded with np.round, a per-payslip Decimal loop,
+and the vectorized integer-cents arithmetic of money.py used by
+payroll_run.py, including the conversion from and to the Decimal values read
+from and written to the NUMERIC columns. Prints the timings and how many
+payslips and cents the float results are off by against the exact ones,
+and the share of the integer-cents time spent on the arithmetic itself
+rather than on the Decimal conversions.
+
+Run from the backend directory:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_money
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.bench_money --payslips 1000000
+"""
+import argparse
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+import money
+from overtime import overtime_pay
+
+DEDUCTION_RATE = Decimal("0.0725")
+TAX_RATE = Decimal("0.1875")
+OVERTIME_MULTIPLIER = Decimal("1.5")
+STANDARD_MONTHLY_HOURS = Decimal("173.33")
+CENT = Decimal("0.01")
+
+
+def seed(payslips: int):
+    """Base salaries as Decimal (as read from NUMERIC) and overtime hours."""
+    rng = random.Random(42)
+    salaries = [
+        Decimal(rng.randrange(150_000, 2_500_000)).scaleb(-2) for _ in range(payslips)
+    ]
+    hours = [rng.choice((0.0, 0.0, 0.5, 1.25, 2.0, 7.75, 12.5)) for _ in range(payslips)]
+    return salaries, hours
+
+
+def compute_float(salaries, hours):
+    """The float64 arithmetic payroll runs used before money.py."""
+    base = np.fromiter(salaries, dtype=np.float64, count=len(salaries))
+    overtime_hours = np.asarray(hours, dtype=np.float64)
+    hourly_rate = base / float(STANDARD_MONTHLY_HOURS)
+    overtime = np.round(overtime_hours * hourly_rate * float(OVERTIME_MULTIPLIER), 2)
+    gross = base + overtime
+    deductions = np.round(gross * float(DEDUCTION_RATE), 2)
+    tax = np.round((gross - deductions) * float(TAX_RATE), 2)
+    net = np.round(gross - deductions - tax, 2)
+    return net.tolist()
+
+
+def compute_decimal(salaries, hours):
+    """Exact, one payslip at a time."""
+    net = []
+    for base, worked in zip(salaries, hours):
+        overtime = (
+            base * Decimal(repr(worked)) * OVERTIME_MULTIPLIER / STANDARD_MONTHLY_HOURS
+        ).quantize(CENT, rounding=ROUND_HALF_UP)
+        gross = base + overtime
+        deductions = (gross * DEDUCTION_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+        tax = ((gross - deductions) * TAX_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+        net.append(gross - deductions - tax)
+    return net
+
+
+def compute_cents_arrays(base, hours):
+    """The array arithmetic alone, on cents already read."""
+    overtime = overtime_pay(base, hours)
+    gross = base + overtime
+    deductions = money.multiply(gross, DEDUCTION_RATE, money.RoundingPolicy.HALF_UP)
+    tax = money.multiply(gross - deductions, TAX_RATE, money.RoundingPolicy.HALF_UP)
+    return gross - deductions - tax
+
+
+def compute_cents(salaries, hours):
+    """Exact and vectorized, as payroll_run.compute_payroll_run does."""
+    base = money.cents_array(salaries, count=len(salaries))
+    net = compute_cents_arrays(base, np.asarray(hours, dtype=np.float64))
+    return money.decimals(net)
+
+
+def timed(label: str, compute, *args):
+    started = time.perf_counter()
+    result = compute(*args)
+    print(f"{label:<28} {(time.perf_counter() - started) * 1000:8.1f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payslips", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # The benchmark rates, as payroll_run would read them from settings
+    money.settings.MONEY_ROUNDING = money.RoundingPolicy.HALF_UP.value
+    money.settings.OVERTIME_MULTIPLIER = float(OVERTIME_MULTIPLIER)
+    money.settings.STANDARD_MONTHLY_HOURS = float(STANDARD_MONTHLY_HOURS)
+
+    salaries, hours = seed(args.payslips)
+    print(f"{args.payslips} payslips")
+    floats = timed("float64 numpy (previous)", compute_float, salaries, hours)
+    exact = timed("Decimal per payslip", compute_decimal, salaries, hours)
+    cents = timed("integer cents numpy", compute_cents, salaries, hours)
+    timed(
+        "  of which arithmetic",
+        compute_cents_arrays,
+        money.cents_array(salaries, count=len(salaries)),
+        np.asarray(hours, dtype=np.float64),
+    )
+
+    assert cents == exact, "integer cents disagree with Decimal"
+    off = [
+        abs(Decimal(repr(value)) - expected)
+        for value, expected in zip(floats, exact)
+        if Decimal(repr(value)) != expected
+    ]
+    float_total = Decimal(repr(sum(floats)))
+    exact_total = sum(exact)
+    print(f"float payslips off by a cent or more: {len(off)}")
+    print(f"total net: exact {exact_total}, float {float_total} "
+          f"(off by {float_total - exact_total})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Login throughput benchmark for password verification.
+
+Verifies bcrypt hashes the way the login handler does, first inline on the
+event loop (the old behaviour) and then on hashing pools of increasing size,
+and reports verifications per second together with the worst stall of a
+concurrent 10 ms heartbeat task, i.e. how long other requests would wait.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_password_hashing --logins 64
+    BCRYPT_ROUNDS=10 python -m benchmarks.bench_password_hashing
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from auth import get_password_hash, verify_password
+from config import settings
+
+HEARTBEAT_INTERVAL = 0.01
+
+
+async def heartbeat(stop: asyncio.Event, stalls: list) -> None:
+    """Record how late a 10 ms timer fires while logins are running."""
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        stalls.append(time.perf_counter() - expected)
+
+
+async def run(logins: int, hashed: str, workers: Optional[int]) -> tuple:
+    stop = asyncio.Event()
+    stalls: list = []
+    monitor = asyncio.create_task(heartbeat(stop, stalls))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    if workers is None:
+        for _ in range(logins):
+            verify_password("correct horse", hashed)
+            await asyncio.sleep(0)
+    else:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, verify_password, "correct horse", hashed)
+                for _ in range(logins)
+            ))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    return logins / elapsed, max(stalls, default=0.0) * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    hashed = get_password_hash("correct horse")
+    cores = os.cpu_count() or 1
+    pool_sizes = sorted({n for n in (1, 2, 4, 8) if n <= cores} | {cores})
+
+    print(f"bcrypt rounds={settings.BCRYPT_ROUNDS}, cores={cores}, logins={args.logins}")
+    print(f"{'mode':<12} {'logins/s':>9} {'max loop stall ms':>18}")
+    throughput, stall = await run(args.logins, hashed, None)
+    print(f"{'inline':<12} {throughput:>9.1f} {stall:>18.0f}")
+    for workers in pool_sizes:
+        throughput, stall = await run(args.logins, hashed, workers)
+        print(f"{f'pool={workers}':<12} {throughput:>9.1f} {stall:>18.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
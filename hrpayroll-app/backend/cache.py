@@ -0,0 +1,146 @@
+"""
+Caching primitives.
+
+TTLCache is an in-process LRU cache with per-entry expiry. CacheBackend is
+the interface for an optional shared store (e.g. Redis) so that several
+workers see the same entries; RedisCacheBackend implements it on Redis, and
+InMemoryCacheBackend in-process, standing in for a real shared store in tests
+and single-worker setups. CACHE_BACKEND selects the shared store of the
+principal and result caches. Invalidation increments counters atomically
+(incr) rather than rewriting entries, so it never races with a writer.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import settings
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # Optional, only needed for CACHE_BACKEND=redis
+    redis_asyncio = None
+
+class TTLCache:
+    """In-process LRU cache whose entries expire `ttl` seconds after being set."""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Delete every entry whose key matches the predicate."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CacheBackend:
+    """Interface of a shared cache store holding string values."""
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """
+        Atomically increment the integer counter at key (created at 1) and
+        return its new value; the counter expires `ttl` seconds later.
+        """
+        raise NotImplementedError
+
+class InMemoryCacheBackend(CacheBackend):
+    """In-process CacheBackend, used as a fake shared store in tests."""
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._entries[key] = (time.monotonic() + ttl, str(value))
+        return value
+
+class RedisCacheBackend(CacheBackend):
+    """CacheBackend on a Redis server shared by all workers (redis package)."""
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        self.client = redis_asyncio.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _milliseconds(ttl: float) -> int:
+        return max(1, int(ttl * 1000))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(key, value, px=self._milliseconds(ttl))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        async with self.client.pipeline(transaction=True) as pipeline:
+            pipeline.incr(key)
+            pipeline.pexpire(key, self._milliseconds(ttl))
+            value, _ = await pipeline.execute()
+        return int(value)
+
+def create_cache_backend(name: str) -> Optional[CacheBackend]:
+    """The shared store selected by CACHE_BACKEND, or None for "none"."""
+    if name == "none":
+        return None
+    if name == "memory":
+        return InMemoryCacheBackend()
+    if name == "redis":
+        return RedisCacheBackend(settings.CACHE_REDIS_URL)
+    raise ValueError(f"Unknown cache backend '{name}'")
+
+# Shared store of the principal and result caches
+shared_backend = create_cache_backend(settings.CACHE_BACKEND)
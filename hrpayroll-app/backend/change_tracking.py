@@ -0,0 +1,151 @@
+"""
+Per-table change versions.
+
+Shared versions: every session commit that wrote to one of VERSIONED_TABLES,
+through the ORM or Core statements, increments the table's row in
+table_versions, so all workers see the same versions. Writers need no extra
+calls; get_table_versions reads them, e.g. to derive HTTP validators or check
+cached results. Writes derived from a table without writing it (rebuilt
+summaries) are counted with mark_written.
+
+All writers of a table update the same row, which PostgreSQL locks until the
+end of the updating transaction. The increment therefore runs in its own
+short transaction on the same connection right after the commit, rather
+than in the writer's transaction, where it would serialize the writers of a
+table for the whole of their transactions (see
+benchmarks/bench_attendance_ingest.py --writers). A read in between sees
+the write under the old versions; results cached then are recomputed once
+the increment lands.
+
+In-process journal: crud and the bulk writers call changes.bump() after
+committing rows of a table, which increments the table's local version and
+journals the ids written. In-process caches compare versions to tell whether
+a table changed and ask for the ids changed since the version they hold to
+refresh incrementally. Local versions are per worker process: with several
+workers, readers also check the shared state periodically.
+"""
+import logging
+from collections import defaultdict, deque
+from itertools import chain
+from typing import Deque, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Tables whose committed writes increment their table_versions row
+VERSIONED_TABLES = frozenset({"users", "departments", "employees", "payrolls", "attendances"})
+
+# Bumps journaled per table; readers further behind reload fully
+JOURNAL_SIZE = 1000
+
+class ChangeTracker:
+    def __init__(self, journal_size: int = JOURNAL_SIZE):
+        self.journal_size = journal_size
+        self._versions: Dict[str, int] = defaultdict(int)
+        # (version, ids written by the bump to that version)
+        self._journal: Dict[str, Deque[Tuple[int, frozenset]]] = defaultdict(
+            lambda: deque(maxlen=self.journal_size)
+        )
+
+    def version(self, table_name: str) -> int:
+        return self._versions[table_name]
+
+    def bump(self, table_name: str, ids: Iterable[int] = ()) -> int:
+        """Record a committed write of the given row ids; returns the new version."""
+        self._versions[table_name] += 1
+        version = self._versions[table_name]
+        self._journal[table_name].append((version, frozenset(ids)))
+        return version
+
+    def changed_since(self, table_name: str, version: int) -> Optional[Set[int]]:
+        """
+        Ids written after `version`, or None if the journal no longer reaches
+        back that far.
+        """
+        journal = self._journal[table_name]
+        if version >= self._versions[table_name]:
+            return set()
+        if not journal or journal[0][0] > version + 1:
+            return None
+        changed: Set[int] = set()
+        for bumped_version, ids in journal:
+            if bumped_version > version:
+                changed.update(ids)
+        return changed
+
+changes = ChangeTracker()
+
+def _written_tables(session: Session) -> Set[str]:
+    return session.info.setdefault("written_tables", set())
+
+def mark_written(db: AsyncSession, *table_names: str) -> None:
+    """Count tables as written by the next commit of the session."""
+    _written_tables(db.sync_session).update(table_names)
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_objects(session, flush_context):
+    written = _written_tables(session)
+    for instance in chain(session.new, session.dirty, session.deleted):
+        table = getattr(instance, "__table__", None)
+        if table is not None and (instance not in session.dirty or session.is_modified(instance)):
+            written.add(table.name)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _written_tables(orm_execute_state.session).add(table.name)
+
+@event.listens_for(Session, "before_commit")
+def _collect_written_tables(session):
+    # Flush first, so writes flushed by the commit itself are tracked
+    session.flush()
+    written = _written_tables(session) & VERSIONED_TABLES
+    session.info.pop("written_tables", None)
+    if written:
+        # The connection of the commit, reused by _increment_table_versions
+        session.info["committed_tables"] = (session.connection(), written)
+
+@event.listens_for(Session, "after_commit")
+def _increment_table_versions(session):
+    connection, written = session.info.pop("committed_tables", (None, ()))
+    if not written:
+        return
+
+    from models import TableVersion
+    dialect_insert = (
+        postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    )
+    # Rows in name order, so concurrent bumps lock them in the same order
+    statement = dialect_insert(TableVersion).values([
+        {"table_name": table_name, "version": 1} for table_name in sorted(written)
+    ])
+    try:
+        with connection.begin():
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=["table_name"],
+                set_={"version": TableVersion.version + 1}
+            ))
+    except Exception:
+        # The write is committed: readers may serve results cached before it
+        # until the next write of these tables
+        logger.exception(f"Could not increment the versions of {', '.join(sorted(written))}")
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_tables(session):
+    session.info.pop("written_tables", None)
+    session.info.pop("committed_tables", None)
+
+async def get_table_versions(db: AsyncSession, table_names: Sequence[str]) -> Dict[str, int]:
+    """Shared versions of the given tables; tables never written are at 0."""
+    from models import TableVersion
+    versions = dict((await db.execute(
+        select(TableVersion.table_name, TableVersion.version)
+        .where(TableVersion.table_name.in_(table_names))
+    )).all())
+    return {table_name: versions.get(table_name, 0) for table_name in table_names}
@@ -1,10 +1,12 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, or_, func, select
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Dict, Any, Sequence
 from datetime import date, datetime
 from fastapi import HTTPException, status
 
-from models import User, Employee, Department, Payroll, Attendance
+from models import User, Employee, Department, Payroll, PayrollStatus, Attendance
 from schemas import (
     UserCreate, UserUpdate,
     EmployeeCreate, EmployeeUpdate,
@@ -12,12 +14,30 @@ from schemas import (
     PayrollCreate, PayrollUpdate,
     AttendanceCreate, AttendanceUpdate
 )
-from auth import get_password_hash
+from auth import get_password_hash_async
+from principal_cache import principal_cache
+from change_tracking import changes
+from result_cache import result_cache
+from pagination import CountMode, apply_page, count_rows
+from payroll_periods import is_overlap_violation, overlaps_period
+from search import search_filters, search_order
+from summaries import (
+    SummaryDelta, dialect_insert, employee_department_id,
+    move_employee_payrolls, payroll_amounts, remove_employee_records
+)
+
+# Employee fields that feed the dashboard summaries
+EMPLOYEE_SUMMARY_FIELDS = ("department_id", "base_salary", "hire_date")
+
+# Loader options for employees serialized as EmployeeResponse, which nests the
+# department. Many-to-one, so a join loads it in the same query without
+# multiplying rows; without it each employee costs one extra SELECT.
+EMPLOYEE_RESPONSE_LOADERS = (joinedload(Employee.department),)
 
 # User CRUD operations
-def create_user(db: Session, user: UserCreate) -> User:
+async def create_user(db: AsyncSession, user: UserCreate) -> User:
     """Create a new user."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -25,306 +45,630 @@ def create_user(db: Session, user: UserCreate) -> User:
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def get_user(db: Session, user_id: int) -> Optional[User]:
+async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     """Get a user by ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.scalar(select(User).where(User.id == user_id))
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get a user by email."""
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).where(User.email == email))
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get a user by username."""
-    return db.query(User).filter(User.username == username).first()
+    return await db.scalar(select(User).where(User.username == username))
 
-def get_users(
-    db: Session,
+async def get_users(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None
 ) -> List[User]:
-    """Get list of users with optional search."""
-    query = db.query(User)
+    """Get list of users with optional search over username and email."""
+    query = select(User)
     if search:
-        search_filter = or_(
-            User.username.ilike(f"%{search}%"),
-            User.email.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(*search_filters(db.bind.dialect.name, User, search))
+    result = await db.scalars(query.offset(skip).limit(limit))
+    return list(result)
 
-def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[User]:
-    """Update a user."""
-    db_user = get_user(db, user_id)
+async def update_user(
+    db: AsyncSession,
+    user_id: int,
+    user_update: UserUpdate
+) -> Optional[User]:
+    """Update a user. Cached principals of the user are invalidated."""
+    db_user = await get_user(db, user_id)
     if not db_user:
         return None
-    
+
+    subject = db_user.username
     update_data = user_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_user, field, value)
-    
-    db.commit()
-    db.refresh(db_user)
+
+    await db.commit()
+    await principal_cache.invalidate(subject)
+    await db.refresh(db_user)
+    return db_user
+
+async def update_user_password(
+    db: AsyncSession,
+    user_id: int,
+    hashed_password: str
+) -> Optional[User]:
+    """Set a new password hash for a user."""
+    db_user = await get_user(db, user_id)
+    if not db_user:
+        return None
+
+    db_user.hashed_password = hashed_password
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def delete_user(db: Session, user_id: int) -> bool:
-    """Delete a user."""
-    db_user = get_user(db, user_id)
+async def delete_user(db: AsyncSession, user_id: int) -> bool:
+    """Delete a user. Cached principals of the user are invalidated."""
+    db_user = await get_user(db, user_id)
     if not db_user:
         return False
-    
-    db.delete(db_user)
-    db.commit()
+
+    await db.delete(db_user)
+    await db.commit()
+    await principal_cache.invalidate(db_user.username)
     return True
 
 # Employee CRUD operations
-def create_employee(db: Session, employee: EmployeeCreate) -> Employee:
+async def create_employee(db: AsyncSession, employee: EmployeeCreate) -> Employee:
     """Create a new employee."""
     db_employee = Employee(**employee.model_dump())
     db.add(db_employee)
-    db.commit()
-    db.refresh(db_employee)
-    return db_employee
+    delta = SummaryDelta()
+    delta.employee(db_employee)
+    await delta.apply(db)
+    await db.commit()
+    changes.bump(Employee.__tablename__, [db_employee.id])
+    await result_cache.invalidate(Employee.__tablename__)
+    # Reload with the department relationship, which the response serializes
+    return await get_employee(db, db_employee.id, refresh=True)
+
+async def get_employee(
+    db: AsyncSession,
+    employee_id: int,
+    options: Sequence = EMPLOYEE_RESPONSE_LOADERS,
+    refresh: bool = False
+) -> Optional[Employee]:
+    """
+    Get an employee by ID. By default the department is loaded for the
+    response; pass options=() when only checking that the employee exists.
+    """
+    query = (
+        select(Employee)
+        .options(*options)
+        .where(Employee.id == employee_id)
+    )
+    if refresh:
+        query = query.execution_options(populate_existing=True)
+    return await db.scalar(query)
+
+async def get_employee_by_user_id(db: AsyncSession, user_id: int) -> Optional[Employee]:
+    """Get the employee associated with a user account."""
+    return await db.scalar(select(Employee).where(Employee.user_id == user_id))
+
+def _employee_filters(
+    dialect_name: str,
+    search: Optional[str] = None,
+    department_id: Optional[int] = None
+) -> list:
+    """WHERE clauses shared by employee listing and counting."""
+    filters = []
+    if search:
+        filters.extend(search_filters(dialect_name, Employee, search))
 
-def get_employee(db: Session, employee_id: int) -> Optional[Employee]:
-    """Get an employee by ID."""
-    return db.query(Employee).filter(Employee.id == employee_id).first()
+    if department_id:
+        filters.append(Employee.department_id == department_id)
+    return filters
 
-def get_employees(
-    db: Session,
+async def get_employees(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    department_id: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[Employee]:
+    """Get a page of employees ordered by id, with optional search and department filter."""
+    query = (
+        select(Employee)
+        .options(*EMPLOYEE_RESPONSE_LOADERS)
+        .where(*_employee_filters(db.bind.dialect.name, search, department_id))
+    )
+    query = apply_page(query, [Employee.id], limit, skip, cursor)
+    result = await db.scalars(query)
+    return list(result)
+
+async def search_employees(
+    db: AsyncSession,
+    term: str,
+    limit: int = 20,
     department_id: Optional[int] = None
 ) -> List[Employee]:
-    """Get list of employees with optional search and department filter."""
-    query = db.query(Employee)
-    
-    if search:
-        search_filter = or_(
-            Employee.first_name.ilike(f"%{search}%"),
-            Employee.last_name.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
-    
-    if department_id:
-        query = query.filter(Employee.department_id == department_id)
-    
-    return query.offset(skip).limit(limit).all()
+    """Get the employees best matching a name search, best match first."""
+    dialect_name = db.bind.dialect.name
+    query = (
+        select(Employee)
+        .options(*EMPLOYEE_RESPONSE_LOADERS)
+        .where(*_employee_filters(dialect_name, term, department_id))
+        .order_by(*search_order(dialect_name, Employee, term))
+        .limit(limit)
+    )
+    result = await db.scalars(query)
+    return list(result)
+
+async def count_employees(
+    db: AsyncSession,
+    search: Optional[str] = None,
+    department_id: Optional[int] = None,
+    mode: CountMode = CountMode.EXACT
+) -> Optional[int]:
+    """Count employees matching the same filters as get_employees."""
+    filters = _employee_filters(db.bind.dialect.name, search, department_id)
+    return await count_rows(
+        db,
+        select(Employee.id).where(*filters),
+        mode,
+        estimate_table=None if filters else Employee.__tablename__
+    )
 
-def update_employee(
-    db: Session,
+async def update_employee(
+    db: AsyncSession,
     employee_id: int,
     employee_update: EmployeeUpdate
 ) -> Optional[Employee]:
     """Update an employee."""
-    db_employee = get_employee(db, employee_id)
+    db_employee = await get_employee(db, employee_id, options=())
     if not db_employee:
         return None
-    
+
+    delta = SummaryDelta()
+    before = Employee(**{
+        field: getattr(db_employee, field) for field in EMPLOYEE_SUMMARY_FIELDS
+    })
     update_data = employee_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_employee, field, value)
-    
-    db.commit()
-    db.refresh(db_employee)
-    return db_employee
 
-def delete_employee(db: Session, employee_id: int) -> bool:
+    if any(
+        getattr(before, field) != getattr(db_employee, field)
+        for field in EMPLOYEE_SUMMARY_FIELDS
+    ):
+        delta.employee(before, sign=-1)
+        delta.employee(db_employee)
+    if before.department_id != db_employee.department_id:
+        await move_employee_payrolls(
+            delta, db, employee_id, before.department_id, db_employee.department_id
+        )
+    await delta.apply(db)
+    await db.commit()
+    changes.bump(Employee.__tablename__, [employee_id])
+    await result_cache.invalidate(Employee.__tablename__)
+    return await get_employee(db, employee_id, refresh=True)
+
+async def delete_employee(db: AsyncSession, employee_id: int) -> bool:
     """Delete an employee."""
-    db_employee = get_employee(db, employee_id)
+    db_employee = await get_employee(db, employee_id, options=())
     if not db_employee:
         return False
-    
-    db.delete(db_employee)
-    db.commit()
+
+    delta = SummaryDelta()
+    delta.departure(db_employee, date.today())
+    await remove_employee_records(delta, db, db_employee)
+    await db.delete(db_employee)
+    await delta.apply(db)
+    await db.commit()
+    changes.bump(Employee.__tablename__, [employee_id])
+    await result_cache.invalidate(
+        Employee.__tablename__, Payroll.__tablename__, Attendance.__tablename__
+    )
     return True
 
 # Department CRUD operations
-def create_department(db: Session, department: DepartmentCreate) -> Department:
+async def create_department(db: AsyncSession, department: DepartmentCreate) -> Department:
     """Create a new department."""
     db_department = Department(**department.model_dump())
     db.add(db_department)
-    db.commit()
-    db.refresh(db_department)
+    await db.commit()
+    await result_cache.invalidate(Department.__tablename__)
+    await db.refresh(db_department)
     return db_department
 
-def get_department(db: Session, department_id: int) -> Optional[Department]:
+async def get_department(db: AsyncSession, department_id: int) -> Optional[Department]:
     """Get a department by ID."""
-    return db.query(Department).filter(Department.id == department_id).first()
+    return await db.scalar(select(Department).where(Department.id == department_id))
+
+async def get_department_by_name(db: AsyncSession, name: str) -> Optional[Department]:
+    """Get a department by name."""
+    return await db.scalar(select(Department).where(Department.name == name))
+
+async def get_departments_by_ids(db: AsyncSession, department_ids: Sequence[int]) -> List[Department]:
+    """Get the departments among the given IDs."""
+    result = await db.scalars(select(Department).where(Department.id.in_(department_ids)))
+    return list(result)
+
+async def department_has_employees(db: AsyncSession, department_id: int) -> bool:
+    """Check whether any employee belongs to the department."""
+    query = select(Employee.id).where(Employee.department_id == department_id)
+    return bool(await db.scalar(select(query.exists())))
+
+def _department_filters(dialect_name: str, search: Optional[str] = None) -> list:
+    """WHERE clauses shared by department listing and counting."""
+    if search:
+        return search_filters(dialect_name, Department, search)
+    return []
 
-def get_departments(
-    db: Session,
+async def get_departments(
+    db: AsyncSession,
     skip: int = 0,
     limit: int = 100,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
 ) -> List[Department]:
-    """Get list of departments with optional search."""
-    query = db.query(Department)
-    if search:
-        query = query.filter(Department.name.ilike(f"%{search}%"))
-    return query.offset(skip).limit(limit).all()
+    """Get a page of departments ordered by id, with optional search."""
+    query = select(Department).where(*_department_filters(db.bind.dialect.name, search))
+    query = apply_page(query, [Department.id], limit, skip, cursor)
+    result = await db.scalars(query)
+    return list(result)
 
-def update_department(
-    db: Session,
+async def count_departments(
+    db: AsyncSession,
+    search: Optional[str] = None,
+    mode: CountMode = CountMode.EXACT
+) -> Optional[int]:
+    """Count departments matching the same filters as get_departments."""
+    filters = _department_filters(db.bind.dialect.name, search)
+    return await count_rows(
+        db,
+        select(Department.id).where(*filters),
+        mode,
+        estimate_table=None if filters else Department.__tablename__
+    )
+
+async def update_department(
+    db: AsyncSession,
     department_id: int,
     department_update: DepartmentUpdate
 ) -> Optional[Department]:
     """Update a department."""
-    db_department = get_department(db, department_id)
+    db_department = await get_department(db, department_id)
     if not db_department:
         return None
-    
+
     update_data = department_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_department, field, value)
-    
-    db.commit()
-    db.refresh(db_department)
+
+    await db.commit()
+    await result_cache.invalidate(Department.__tablename__)
+    await db.refresh(db_department)
     return db_department
 
-def delete_department(db: Session, department_id: int) -> bool:
+async def delete_department(db: AsyncSession, department_id: int) -> bool:
     """Delete a department."""
-    db_department = get_department(db, department_id)
+    db_department = await get_department(db, department_id)
     if not db_department:
         return False
-    
-    db.delete(db_department)
-    db.commit()
+
+    await db.delete(db_department)
+    await db.commit()
+    await result_cache.invalidate(Department.__tablename__)
     return True
 
 # Payroll CRUD operations
-def create_payroll(db: Session, payroll: PayrollCreate) -> Payroll:
-    """Create a new payroll record."""
+async def create_payroll(db: AsyncSession, payroll: PayrollCreate) -> Payroll:
+    """
+    Create a new payroll record. A period overlapping another payroll of the
+    employee is rejected by the database's overlap constraint (400).
+    """
     db_payroll = Payroll(**payroll.model_dump())
+    delta = SummaryDelta()
+    delta.payroll(
+        db_payroll.pay_period_start,
+        await employee_department_id(db, db_payroll.employee_id),
+        payroll_amounts(db_payroll)
+    )
     db.add(db_payroll)
-    db.commit()
-    db.refresh(db_payroll)
+    try:
+        await db.flush()
+        await delta.apply(db)
+        await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        if is_overlap_violation(exc):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Payroll record already exists for this period"
+            )
+        raise
+    await result_cache.invalidate(Payroll.__tablename__)
+    await db.refresh(db_payroll)
     return db_payroll
 
-def get_payroll(db: Session, payroll_id: int) -> Optional[Payroll]:
+async def get_payroll(db: AsyncSession, payroll_id: int) -> Optional[Payroll]:
     """Get a payroll record by ID."""
-    return db.query(Payroll).filter(Payroll.id == payroll_id).first()
+    return await db.scalar(select(Payroll).where(Payroll.id == payroll_id))
 
-def get_payrolls(
-    db: Session,
-    skip: int = 0,
-    limit: int = 100,
+async def get_overlapping_payroll(
+    db: AsyncSession,
+    employee_id: int,
+    start_date: date,
+    end_date: date
+) -> Optional[Payroll]:
+    """Get a payroll record of the employee whose period overlaps the given one."""
+    query = select(Payroll).where(
+        overlaps_period(db.bind.dialect.name, employee_id, start_date, end_date)
+    )
+    return await db.scalar(query.limit(1))
+
+def _payroll_filters(
     employee_id: Optional[int] = None,
     start_date: Optional[date] = None,
-    end_date: Optional[date] = None
-) -> List[Payroll]:
-    """Get list of payroll records with optional filters."""
-    query = db.query(Payroll)
-    
+    end_date: Optional[date] = None,
+    status: Optional[PayrollStatus] = None
+) -> list:
+    """WHERE clauses shared by payroll listing and counting."""
+    filters = []
+    if status:
+        filters.append(Payroll.status == status)
+
     if employee_id:
-        query = query.filter(Payroll.employee_id == employee_id)
-    
+        filters.append(Payroll.employee_id == employee_id)
+
     if start_date:
-        query = query.filter(Payroll.pay_period_start >= start_date)
-    
+        filters.append(Payroll.pay_period_start >= start_date)
+
     if end_date:
-        query = query.filter(Payroll.pay_period_end <= end_date)
-    
-    return query.offset(skip).limit(limit).all()
+        filters.append(Payroll.pay_period_end <= end_date)
+    return filters
+
+async def get_payrolls(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    employee_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[PayrollStatus] = None,
+    cursor: Optional[str] = None
+) -> List[Payroll]:
+    """Get a page of payroll records ordered by id, with optional filters."""
+    query = select(Payroll).where(
+        *_payroll_filters(employee_id, start_date, end_date, status)
+    )
+    query = apply_page(query, [Payroll.id], limit, skip, cursor)
+    result = await db.scalars(query)
+    return list(result)
 
-def update_payroll(
-    db: Session,
+async def count_payrolls(
+    db: AsyncSession,
+    employee_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[PayrollStatus] = None,
+    mode: CountMode = CountMode.EXACT
+) -> Optional[int]:
+    """Count payroll records matching the same filters as get_payrolls."""
+    filters = _payroll_filters(employee_id, start_date, end_date, status)
+    return await count_rows(
+        db,
+        select(Payroll.id).where(*filters),
+        mode,
+        estimate_table=None if filters else Payroll.__tablename__
+    )
+
+async def update_payroll(
+    db: AsyncSession,
     payroll_id: int,
     payroll_update: PayrollUpdate
 ) -> Optional[Payroll]:
     """Update a payroll record."""
-    db_payroll = get_payroll(db, payroll_id)
+    db_payroll = await get_payroll(db, payroll_id)
     if not db_payroll:
         return None
-    
+
+    before = payroll_amounts(db_payroll)
     update_data = payroll_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_payroll, field, value)
-    
-    db.commit()
-    db.refresh(db_payroll)
+
+    if before != payroll_amounts(db_payroll):
+        department_id = await employee_department_id(db, db_payroll.employee_id)
+        delta = SummaryDelta()
+        delta.payroll(db_payroll.pay_period_start, department_id, before, sign=-1)
+        delta.payroll(db_payroll.pay_period_start, department_id, payroll_amounts(db_payroll))
+        await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Payroll.__tablename__)
+    await db.refresh(db_payroll)
     return db_payroll
 
-def delete_payroll(db: Session, payroll_id: int) -> bool:
+async def delete_payroll(db: AsyncSession, payroll_id: int) -> bool:
     """Delete a payroll record."""
-    db_payroll = get_payroll(db, payroll_id)
+    db_payroll = await get_payroll(db, payroll_id)
     if not db_payroll:
         return False
-    
-    db.delete(db_payroll)
-    db.commit()
+
+    delta = SummaryDelta()
+    delta.payroll(
+        db_payroll.pay_period_start,
+        await employee_department_id(db, db_payroll.employee_id),
+        payroll_amounts(db_payroll),
+        sign=-1
+    )
+    await db.delete(db_payroll)
+    await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Payroll.__tablename__)
     return True
 
 # Attendance CRUD operations
-def create_attendance(db: Session, attendance: AttendanceCreate) -> Attendance:
-    """Create a new attendance record."""
-    db_attendance = Attendance(**attendance.model_dump())
-    if db_attendance.check_in and db_attendance.check_out:
-        db_attendance.calculate_work_hours()
-    
-    db.add(db_attendance)
-    db.commit()
-    db.refresh(db_attendance)
-    return db_attendance
+async def create_attendance(db: AsyncSession, attendance: AttendanceCreate) -> Attendance:
+    """
+    Create an attendance record, or replace the employee's record for the same
+    date (INSERT ... ON CONFLICT on uq_attendances_employee_date), so retried
+    posts do not create duplicates.
+    """
+    new_attendance = Attendance(**attendance.model_dump())
+    if new_attendance.check_in and new_attendance.check_out:
+        new_attendance.calculate_work_hours()
 
-def get_attendance(db: Session, attendance_id: int) -> Optional[Attendance]:
+    values = attendance.model_dump()
+    values["work_hours"] = new_attendance.work_hours
+    delta = SummaryDelta()
+    existing = await get_attendance_by_date(db, attendance.employee_id, attendance.date)
+    if existing:
+        delta.attendance(existing, sign=-1)
+    delta.attendance(new_attendance)
+
+    table = Attendance.__table__
+    statement = dialect_insert(db)(table).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=["employee_id", "date"],
+        set_={
+            **{
+                column: statement.excluded[column]
+                for column in values
+                if column not in ("employee_id", "date")
+            },
+            "updated_at": func.now(),
+        }
+    ).returning(table.c.id)
+    attendance_id = await db.scalar(statement)
+    await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Attendance.__tablename__)
+    return await get_attendance(db, attendance_id, refresh=True)
+
+async def get_attendance(
+    db: AsyncSession,
+    attendance_id: int,
+    refresh: bool = False
+) -> Optional[Attendance]:
     """Get an attendance record by ID."""
-    return db.query(Attendance).filter(Attendance.id == attendance_id).first()
+    query = select(Attendance).where(Attendance.id == attendance_id)
+    if refresh:
+        query = query.execution_options(populate_existing=True)
+    return await db.scalar(query)
 
-def get_attendances(
-    db: Session,
-    skip: int = 0,
-    limit: int = 100,
+async def get_attendance_by_date(
+    db: AsyncSession,
+    employee_id: int,
+    day: date
+) -> Optional[Attendance]:
+    """Get the attendance record of an employee for a date."""
+    return await db.scalar(
+        select(Attendance).where(
+            Attendance.employee_id == employee_id,
+            Attendance.date == day
+        )
+    )
+
+def attendance_page_keys(employee_id: Optional[int] = None) -> tuple:
+    """
+    Keyset of attendance pages. Within one employee the date is unique, so
+    pages are read in order straight from uq_attendances_employee_date; across
+    employees the id breaks ties between records of the same date.
+    """
+    return ("date",) if employee_id else ("date", "id")
+
+def _attendance_filters(
     employee_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
-) -> List[Attendance]:
-    """Get list of attendance records with optional filters."""
-    query = db.query(Attendance)
-    
+) -> list:
+    """WHERE clauses shared by attendance listing and counting."""
+    filters = []
     if employee_id:
-        query = query.filter(Attendance.employee_id == employee_id)
-    
+        filters.append(Attendance.employee_id == employee_id)
+
     if start_date:
-        query = query.filter(Attendance.date >= start_date)
-    
+        filters.append(Attendance.date >= start_date)
+
     if end_date:
-        query = query.filter(Attendance.date <= end_date)
-    
-    return query.offset(skip).limit(limit).all()
+        filters.append(Attendance.date <= end_date)
+    return filters
 
-def update_attendance(
-    db: Session,
+async def get_attendances(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    employee_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None
+) -> List[Attendance]:
+    """Get a page of attendance records ordered by date, with optional filters."""
+    query = select(Attendance).where(
+        *_attendance_filters(employee_id, start_date, end_date)
+    )
+    key_columns = [getattr(Attendance, key) for key in attendance_page_keys(employee_id)]
+    query = apply_page(query, key_columns, limit, skip, cursor)
+    result = await db.scalars(query)
+    return list(result)
+
+async def count_attendances(
+    db: AsyncSession,
+    employee_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    mode: CountMode = CountMode.EXACT
+) -> Optional[int]:
+    """Count attendance records matching the same filters as get_attendances."""
+    filters = _attendance_filters(employee_id, start_date, end_date)
+    return await count_rows(
+        db,
+        select(Attendance.id).where(*filters),
+        mode,
+        estimate_table=None if filters else Attendance.__tablename__
+    )
+
+async def update_attendance(
+    db: AsyncSession,
     attendance_id: int,
     attendance_update: AttendanceUpdate
 ) -> Optional[Attendance]:
     """Update an attendance record."""
-    db_attendance = get_attendance(db, attendance_id)
+    db_attendance = await get_attendance(db, attendance_id)
     if not db_attendance:
         return None
-    
+
+    delta = SummaryDelta()
+    delta.attendance(db_attendance, sign=-1)
     update_data = attendance_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_attendance, field, value)
-    
+
     if db_attendance.check_in and db_attendance.check_out:
         db_attendance.calculate_work_hours()
-    
-    db.commit()
-    db.refresh(db_attendance)
+
+    delta.attendance(db_attendance)
+    await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Attendance.__tablename__)
+    await db.refresh(db_attendance)
     return db_attendance
 
-def delete_attendance(db: Session, attendance_id: int) -> bool:
+async def delete_attendance(db: AsyncSession, attendance_id: int) -> bool:
     """Delete an attendance record."""
-    db_attendance = get_attendance(db, attendance_id)
+    db_attendance = await get_attendance(db, attendance_id)
     if not db_attendance:
         return False
-    
-    db.delete(db_attendance)
-    db.commit()
+
+    delta = SummaryDelta()
+    delta.attendance(db_attendance, sign=-1)
+    await db.delete(db_attendance)
+    await delta.apply(db)
+    await db.commit()
+    await result_cache.invalidate(Attendance.__tablename__)
     return True
@@ -1,10 +1,33 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from config import settings
+import change_tracking  # Counts committed writes per table in table_versions
+
+# Drivers used for the async engine, keyed by the scheme of DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url() -> str:
+    """
+    Get the URL for the async engine.
+    Uses ASYNC_DATABASE_URL when set, otherwise swaps the driver of DATABASE_URL
+    (asyncpg for PostgreSQL, aiosqlite for SQLite test databases).
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    scheme, _, rest = settings.DATABASE_URL.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{dialect}' databases")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
 
 # Create SQLAlchemy engine
 engine = create_engine(
@@ -14,9 +37,28 @@ engine = create_engine(
     max_overflow=10  # Maximum number of connections that can be created beyond pool_size
 )
 
+# Create async SQLAlchemy engine used by the API routes.
+# aiosqlite (tests) does not pool connections, so pool sizing only applies to
+# server databases.
+ASYNC_DATABASE_URL = get_async_database_url()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    **({} if ASYNC_DATABASE_URL.startswith("sqlite") else {"pool_size": 5, "max_overflow": 10})
+)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class. Objects are not expired on commit so they can
+# still be serialized after the session is closed without implicit IO.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class for declarative models
 Base = declarative_base()
 
@@ -36,6 +78,19 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    FastAPI dependency providing an async database session per request.
+    Queries are awaited, so a slow query no longer blocks the event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
 def init_db() -> None:
     """
     Initialize database by creating all tables.
@@ -44,8 +99,21 @@ def init_db() -> None:
     try:
         # Import all models here to ensure they are registered with Base
         from models import Employee, User, Department, Payroll, Attendance  # These will be created next
-        
+        from models import (  # Dashboard summary tables
+            DepartmentHeadcount, MonthlyHeadcountChange,
+            MonthlyPayrollSummary, DailyAttendanceSummary
+        )
+        from models import TableVersion  # Change counters behind HTTP validators
+        from models import Job  # Background job queue
+        from models import PayrollRuleSet  # Versions of the payroll tax and deduction rules
+        import search  # Creates the search indexes after the tables
+
         Base.metadata.create_all(bind=engine)
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
+
+async def dispose_engines() -> None:
+    """Close all pooled connections. Called on application shutdown."""
+    await async_engine.dispose()
+    engine.dispose()
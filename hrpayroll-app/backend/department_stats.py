@@ -0,0 +1,161 @@
+"""
+Department salary statistics computed in the database.
+
+One grouped query returns, per department, the employee count and the sum,
+average, minimum, maximum and percentiles of base salaries; a second grouped
+query returns the headcount by position. No Employee rows are loaded, so the
+cost no longer grows with the memory needed for a department's employees, and
+statistics for every department take the same two queries as for one.
+
+PostgreSQL computes percentiles with percentile_cont. SQLite has no ordered-set
+aggregates, so salaries are ranked with window functions and the two ranks
+around each percentile are picked in the same grouped query and interpolated
+like percentile_cont.
+"""
+import math
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, case, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Department, Employee
+
+# Reported salary percentiles, as fractions
+SALARY_PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+def _percentile_label(fraction: float) -> str:
+    return f"p{round(fraction * 100)}"
+
+def _ranked_salaries(department_id: Optional[int]):
+    """Salaries with their 0-based rank and the headcount of their department."""
+    query = select(
+        Employee.department_id,
+        Employee.base_salary,
+        (
+            func.row_number().over(
+                partition_by=Employee.department_id,
+                order_by=Employee.base_salary
+            ) - 1
+        ).label("rank"),
+        func.count().over(partition_by=Employee.department_id).label("headcount")
+    )
+    if department_id is not None:
+        query = query.where(Employee.department_id == department_id)
+    return query.subquery()
+
+def _statistics_query(dialect_name: str, department_id: Optional[int]):
+    """
+    Grouped query with one row per department: id, name, created_at,
+    updated_at, count, sum, avg, min, max and the percentile columns.
+    """
+    if dialect_name == "postgresql":
+        salaries = Employee.__table__
+        salary = salaries.c.base_salary
+        percentile_columns = [
+            func.percentile_cont(fraction).within_group(salary)
+            for fraction in SALARY_PERCENTILES
+        ]
+    else:
+        salaries = _ranked_salaries(department_id)
+        salary = salaries.c.base_salary
+        percentile_columns = []
+        for fraction in SALARY_PERCENTILES:
+            # Salaries at floor(position) and the rank after it; interpolated
+            # in _interpolate() since SQLite has no floor/ceil before 3.35
+            lower_rank = cast(fraction * (salaries.c.headcount - 1), Integer)
+            percentile_columns += [
+                func.max(case((salaries.c.rank == lower_rank, salary))),
+                func.max(case((salaries.c.rank == lower_rank + 1, salary))),
+            ]
+
+    query = (
+        select(
+            Department.id,
+            Department.name,
+            Department.created_at,
+            Department.updated_at,
+            func.count(salary),
+            func.coalesce(func.sum(salary), 0),
+            func.avg(salary),
+            func.min(salary),
+            func.max(salary),
+            *percentile_columns
+        )
+        .outerjoin(salaries, salaries.c.department_id == Department.id)
+        .group_by(Department.id)
+        .order_by(Department.id)
+    )
+    if department_id is not None:
+        query = query.where(Department.id == department_id)
+    return query
+
+def _interpolate(fraction: float, headcount: int, lower: float, upper: Optional[float]) -> float:
+    """Linear interpolation between ranks, as percentile_cont does."""
+    lower = float(lower)
+    position = fraction * (headcount - 1)
+    weight = position - math.floor(position)
+    if upper is None or weight == 0:
+        return lower
+    return lower + (float(upper) - lower) * weight
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
+
+async def get_department_statistics(
+    db: AsyncSession,
+    department_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Salary statistics and headcount by position of one department, or of
+    every department when department_id is None.
+    """
+    dialect_name = db.bind.dialect.name
+    rows = (await db.execute(_statistics_query(dialect_name, department_id))).all()
+
+    positions_query = (
+        select(Employee.department_id, Employee.position, func.count(Employee.id))
+        .group_by(Employee.department_id, Employee.position)
+        .order_by(Employee.department_id, Employee.position)
+    )
+    if department_id is not None:
+        positions_query = positions_query.where(Employee.department_id == department_id)
+    headcount_by_position: Dict[int, Dict[str, int]] = {}
+    for row_department_id, position, headcount in await db.execute(positions_query):
+        headcount_by_position.setdefault(row_department_id, {})[position] = headcount
+
+    statistics = []
+    for row in rows:
+        (
+            row_department_id, name, created_at, updated_at,
+            headcount, total, average, minimum, maximum, *percentile_values
+        ) = row
+        if not headcount:
+            percentiles = {_percentile_label(fraction): None for fraction in SALARY_PERCENTILES}
+        elif dialect_name == "postgresql":
+            percentiles = {
+                _percentile_label(fraction): _round(value)
+                for fraction, value in zip(SALARY_PERCENTILES, percentile_values)
+            }
+        else:
+            percentiles = {
+                _percentile_label(fraction): _round(_interpolate(
+                    fraction, headcount, *percentile_values[2 * index:2 * index + 2]
+                ))
+                for index, fraction in enumerate(SALARY_PERCENTILES)
+            }
+
+        statistics.append({
+            "department_id": row_department_id,
+            "department_name": name,
+            "total_employees": headcount,
+            "total_salary": _round(total),
+            "average_salary": _round(average) or 0.0,
+            "min_salary": _round(minimum),
+            "max_salary": _round(maximum),
+            "median_salary": percentiles[_percentile_label(0.5)],
+            "salary_percentiles": percentiles,
+            "headcount_by_position": headcount_by_position.get(row_department_id, {}),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        })
+    return statistics
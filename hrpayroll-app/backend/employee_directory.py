@@ -0,0 +1,236 @@
+"""
+In-process employee directory for type-ahead and dropdowns.
+
+Holds the id, full name, department and position of every employee in
+column arrays ordered by id (ids and department ids in typed arrays,
+positions interned), plus a sorted index of lowercased names, each employee
+under "first last" and "last first", for prefix lookups with bisect.
+
+Before serving, the directory reads the shared version of the employees
+table (table_versions, see change_tracking.py), which every committed write
+increments, whichever worker made it, and does nothing if it is the version
+it was synced at. When the version moved by as many writes as the change
+tracker journaled in this worker since, it reloads only the employees those
+wrote, with one query; otherwise, after writes through other workers or
+when the journal no longer reaches back, it reloads everything. Rendered
+responses are cached per directory version and carry a strong ETag
+of their body.
+"""
+import asyncio
+import hashlib
+import json
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from change_tracking import changes, get_table_versions
+from models import Employee
+
+# Stored for employees without a department
+NO_DEPARTMENT = 0
+
+# Rendered responses kept per directory version, and for how long
+RENDER_CACHE_SIZE = 64
+RENDER_CACHE_TTL_SECONDS = 300.0
+
+DIRECTORY_COLUMNS = (
+    Employee.id, Employee.first_name, Employee.last_name,
+    Employee.department_id, Employee.position,
+)
+
+class EmployeeDirectory:
+    def __init__(self):
+        # Incremented whenever the contents change
+        self.version = 0
+        # Change tracker and shared versions of the employees table last synced
+        self._synced_version: Optional[int] = None
+        self._shared_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._rendered = TTLCache(RENDER_CACHE_SIZE, RENDER_CACHE_TTL_SECONDS)
+        self._clear()
+
+    def _clear(self) -> None:
+        self.ids = array("q")
+        self.department_ids = array("q")
+        self.first_names: List[str] = []
+        self.last_names: List[str] = []
+        self.positions: List[str] = []
+        # Sorted lowercased names and, at the same index, the employee id
+        self._name_keys: List[str] = []
+        self._name_ids = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Maintenance
+    @staticmethod
+    def _keys(first_name: str, last_name: str) -> Tuple[str, str]:
+        return (f"{first_name} {last_name}".lower(), f"{last_name} {first_name}".lower())
+
+    def _row(self, employee_id: int) -> Optional[int]:
+        row = bisect_left(self.ids, employee_id)
+        if row < len(self.ids) and self.ids[row] == employee_id:
+            return row
+        return None
+
+    def _index_name(self, key: str, employee_id: int) -> None:
+        position = bisect_left(self._name_keys, key)
+        self._name_keys.insert(position, key)
+        self._name_ids.insert(position, employee_id)
+
+    def _unindex_name(self, key: str, employee_id: int) -> None:
+        position = bisect_left(self._name_keys, key)
+        while self._name_ids[position] != employee_id:
+            position += 1
+        del self._name_keys[position]
+        del self._name_ids[position]
+
+    def _remove(self, employee_id: int) -> None:
+        row = self._row(employee_id)
+        if row is None:
+            return
+        for key in self._keys(self.first_names[row], self.last_names[row]):
+            self._unindex_name(key, employee_id)
+        del self.ids[row]
+        del self.department_ids[row]
+        del self.first_names[row]
+        del self.last_names[row]
+        del self.positions[row]
+
+    def _add(self, employee_id, first_name, last_name, department_id, position) -> None:
+        row = len(self.ids)
+        if row and self.ids[-1] > employee_id:
+            row = bisect_left(self.ids, employee_id)
+        self.ids.insert(row, employee_id)
+        self.department_ids.insert(row, department_id or NO_DEPARTMENT)
+        self.first_names.insert(row, first_name)
+        self.last_names.insert(row, last_name)
+        self.positions.insert(row, sys.intern(position))
+        for key in self._keys(first_name, last_name):
+            self._index_name(key, employee_id)
+
+    async def _load_all(self, db: AsyncSession) -> None:
+        self._clear()
+        name_entries = []
+        result = await db.execute(select(*DIRECTORY_COLUMNS).order_by(Employee.id))
+        for employee_id, first_name, last_name, department_id, position in result:
+            self.ids.append(employee_id)
+            self.department_ids.append(department_id or NO_DEPARTMENT)
+            self.first_names.append(first_name)
+            self.last_names.append(last_name)
+            self.positions.append(sys.intern(position))
+            for key in self._keys(first_name, last_name):
+                name_entries.append((key, employee_id))
+        name_entries.sort()
+        self._name_keys = [key for key, _ in name_entries]
+        self._name_ids = array("q", (employee_id for _, employee_id in name_entries))
+
+    async def _load_changed(self, db: AsyncSession, employee_ids: Iterable[int]) -> None:
+        employee_ids = list(employee_ids)
+        rows = (await db.execute(
+            select(*DIRECTORY_COLUMNS).where(Employee.id.in_(employee_ids))
+        )).all()
+        for employee_id in employee_ids:
+            self._remove(employee_id)
+        for row in rows:
+            self._add(*row)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """Bring the directory up to date with the committed employee writes."""
+        async with self._lock:
+            # Read before querying, so the rows are at least this recent
+            tracked_version = changes.version(Employee.__tablename__)
+            shared_version = (
+                await get_table_versions(db, (Employee.__tablename__,))
+            )[Employee.__tablename__]
+            if shared_version == self._shared_version:
+                return
+
+            changed = None
+            if (
+                self._synced_version is not None
+                and shared_version - self._shared_version == tracked_version - self._synced_version
+            ):
+                # Only writes through this worker
+                changed = changes.changed_since(Employee.__tablename__, self._synced_version)
+
+            if changed is None:
+                await self._load_all(db)
+            else:
+                await self._load_changed(db, changed)
+            self._synced_version = tracked_version
+            self._shared_version = shared_version
+            self.version += 1
+
+    # Lookups
+    def lookup(
+        self,
+        prefix: Optional[str] = None,
+        department_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[int]:
+        """
+        Rows of the employees whose first or last name starts with `prefix`,
+        in name order, or of all employees in id order without a prefix.
+        """
+        if not prefix:
+            rows = range(len(self.ids))
+            if department_id:
+                rows = (row for row in rows if self.department_ids[row] == department_id)
+            selected = []
+            for row in rows:
+                if limit is not None and len(selected) >= limit:
+                    break
+                selected.append(row)
+            return selected
+
+        prefix = " ".join(prefix.lower().split())
+        selected, seen = [], set()
+        position = bisect_left(self._name_keys, prefix)
+        while position < len(self._name_keys) and self._name_keys[position].startswith(prefix):
+            employee_id = self._name_ids[position]
+            position += 1
+            if employee_id in seen:
+                continue
+            row = self._row(employee_id)
+            if department_id and self.department_ids[row] != department_id:
+                continue
+            seen.add(employee_id)
+            selected.append(row)
+            if limit is not None and len(selected) >= limit:
+                break
+        return selected
+
+    def entries(self, rows: Iterable[int]) -> List[dict]:
+        return [
+            {
+                "id": self.ids[row],
+                "name": f"{self.first_names[row]} {self.last_names[row]}",
+                "department_id": self.department_ids[row] or None,
+                "position": self.positions[row],
+            }
+            for row in rows
+        ]
+
+    def render(
+        self,
+        prefix: Optional[str] = None,
+        department_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[str, bytes]:
+        """JSON body of a lookup and its strong ETag, cached per version."""
+        key = (self.version, prefix, department_id, limit)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            items = self.entries(self.lookup(prefix, department_id, limit))
+            body = json.dumps({"items": items}, separators=(",", ":")).encode()
+            rendered = (f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body)
+            self._rendered.set(key, rendered)
+        return rendered
+
+employee_directory = EmployeeDirectory()
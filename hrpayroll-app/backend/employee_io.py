@@ -0,0 +1,157 @@
+"""
+Bulk employee import and export.
+
+Imports read records from a streamed CSV/NDJSON upload and process them in
+chunks of IMPORT_CHUNK_SIZE: rows are validated against EmployeeCreate, the
+department and user foreign keys of the whole chunk are resolved with one
+query each, and the valid rows are written with one multi-row INSERT and
+committed together with their dashboard summary deltas. Invalid rows are
+reported by row number and do not stop the import; chunks committed before a
+failure stay committed.
+"""
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from change_tracking import changes
+from models import Department, Employee, User
+from result_cache import result_cache
+from schemas import EmployeeCreate
+from summaries import SummaryDelta
+
+# Records validated, resolved and inserted per round trip
+IMPORT_CHUNK_SIZE = 1000
+
+# Columns of an export, which can be imported again (id is ignored)
+EXPORT_COLUMNS = (
+    "id", "user_id", "department_id", "first_name", "last_name",
+    "date_of_birth", "gender", "phone", "address", "hire_date",
+    "position", "base_salary",
+)
+
+# EmployeeCreate fields that accept None and may be left out of a record
+NULLABLE_FIELDS = tuple(
+    name for name, model_field in EmployeeCreate.model_fields.items()
+    if type(None) in getattr(model_field.annotation, "__args__", ())
+)
+
+@dataclass
+class ImportReport:
+    total_rows: int = 0
+    created: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    def fail(self, row: int, errors: List[str]) -> None:
+        self.errors.append({"row": row, "errors": errors})
+
+def _validate(record: Dict[str, Any]) -> Tuple[Optional[EmployeeCreate], List[str]]:
+    if "__error__" in record:
+        return None, [record["__error__"]]
+    try:
+        values = {name: None for name in NULLABLE_FIELDS}
+        values.update(record)
+        return EmployeeCreate.model_validate(values), []
+    except ValidationError as exc:
+        return None, [
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        ]
+
+async def _import_chunk(
+    db: AsyncSession,
+    chunk: List[Tuple[int, Dict[str, Any]]],
+    report: ImportReport,
+    claimed_user_ids: Set[int]
+) -> None:
+    valid = []
+    for row, record in chunk:
+        employee, errors = _validate(record)
+        if errors:
+            report.fail(row, errors)
+        else:
+            valid.append((row, employee))
+
+    department_ids = {employee.department_id for _, employee in valid}
+    existing_departments = set()
+    if department_ids:
+        existing_departments = set(await db.scalars(
+            select(Department.id).where(Department.id.in_(department_ids))
+        ))
+
+    # user id -> id of the employee already linked to the user, or None
+    user_ids = {employee.user_id for _, employee in valid if employee.user_id}
+    linked_employees = {}
+    if user_ids:
+        linked_employees = dict((await db.execute(
+            select(User.id, Employee.id)
+            .outerjoin(Employee, Employee.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )).all())
+
+    rows = []
+    delta = SummaryDelta()
+    for row, employee in valid:
+        errors = []
+        if employee.department_id not in existing_departments:
+            errors.append("department_id: Department not found")
+        if employee.user_id:
+            if employee.user_id not in linked_employees:
+                errors.append("user_id: User not found")
+            elif (
+                linked_employees[employee.user_id] is not None
+                or employee.user_id in claimed_user_ids
+            ):
+                errors.append("user_id: User is already associated with an employee")
+        if errors:
+            report.fail(row, errors)
+            continue
+
+        if employee.user_id:
+            claimed_user_ids.add(employee.user_id)
+        values = employee.model_dump()
+        rows.append(values)
+        delta.employee(Employee(**values))
+
+    if rows:
+        created_ids = (await db.scalars(insert(Employee).returning(Employee.id), rows)).all()
+        await delta.apply(db)
+        await db.commit()
+        changes.bump(Employee.__tablename__, created_ids)
+        await result_cache.invalidate(Employee.__tablename__)
+        report.created += len(rows)
+
+async def import_employees(
+    db: AsyncSession,
+    records: AsyncIterator[Dict[str, Any]]
+) -> ImportReport:
+    """Create employees from parsed records; rows are numbered from 1."""
+    report = ImportReport()
+    claimed_user_ids: Set[int] = set()
+    chunk = []
+    async for record in records:
+        report.total_rows += 1
+        chunk.append((report.total_rows, record))
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            await _import_chunk(db, chunk, report, claimed_user_ids)
+            chunk = []
+    if chunk:
+        await _import_chunk(db, chunk, report, claimed_user_ids)
+    report.errors.sort(key=lambda error: error["row"])
+    return report
+
+def export_query(department_id: Optional[int] = None):
+    """Column query behind the employee export, ordered by id."""
+    query = (
+        select(*(getattr(Employee, column) for column in EXPORT_COLUMNS))
+        .order_by(Employee.id)
+    )
+    if department_id:
+        query = query.where(Employee.department_id == department_id)
+    return query
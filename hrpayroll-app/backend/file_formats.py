@@ -0,0 +1,185 @@
+"""
+Streaming CSV and NDJSON reading and writing for bulk imports and exports.
+
+Uploads are parsed incrementally from the request body stream, a record at a
+time, so an import never holds the whole file. Exports run the query with a
+server-side cursor (AsyncSession.stream with yield_per) and encode each
+fetched partition as it arrives, optionally gzip-compressed, so memory stays
+constant and the first bytes are sent before the query has finished. Money
+(Numeric) values are written as the API returns them: whole cents, as JSON
+numbers in NDJSON and with two decimals in CSV.
+"""
+import codecs
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+import money
+
+# Rows fetched from the server-side cursor per partition
+EXPORT_PARTITION_SIZE = 1000
+
+class FileFormat(str, enum.Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    FileFormat.CSV: "text/csv",
+    FileFormat.NDJSON: "application/x-ndjson",
+}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # As the Money schema serializes it
+        return float(money.quantize(value))
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(money.quantize(value))
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream as UTF-8 and split it into lines, keeping line ends."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        # The last piece is an incomplete line
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_records(
+    chunks: AsyncIterator[bytes],
+    file_format: FileFormat
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse an uploaded CSV (with a header row) or NDJSON byte stream into one
+    dict per record. Empty CSV cells become None; blank lines are skipped.
+    Malformed records are yielded as {"__error__": message}.
+    """
+    if file_format == FileFormat.NDJSON:
+        async for line in _iter_lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield {"__error__": f"Invalid JSON: {exc}"}
+                continue
+            if not isinstance(record, dict):
+                record = {"__error__": "Each line must be a JSON object"}
+            yield record
+        return
+
+    header = None
+    record_text = ""
+    async for line in _iter_lines(chunks):
+        # A quoted cell may span lines; a record is complete once its quotes balance
+        record_text += line
+        if record_text.count('"') % 2:
+            continue
+        text, record_text = record_text, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield {"__error__": f"Expected {len(header)} columns, got {len(values)}"}
+            continue
+        yield {name: value if value != "" else None for name, value in zip(header, values)}
+    if record_text.strip():
+        yield {"__error__": "Unterminated quoted field"}
+
+def encode_rows(
+    rows: Sequence[Sequence[Any]],
+    columns: Sequence[str],
+    file_format: FileFormat,
+    header: bool = False
+) -> str:
+    """Encode rows of values as CSV lines (optionally with the header) or NDJSON."""
+    if file_format == FileFormat.NDJSON:
+        return "".join(
+            json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+            for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+async def stream_query(
+    db: AsyncSession,
+    query: Select,
+    columns: Sequence[str],
+    file_format: FileFormat,
+    compress: bool = False,
+    on_partition: Optional[Callable[[int], Awaitable[None]]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Run a column query on a server-side cursor and yield it encoded as
+    CSV or NDJSON, one partition of EXPORT_PARTITION_SIZE rows at a time.
+    `on_partition` is awaited with the row count of each partition.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        if compressor is None:
+            return data
+        # Sync-flush each partition so compressed bytes go out as rows arrive
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if file_format == FileFormat.CSV:
+        yield encode(encode_rows([], columns, file_format, header=True))
+
+    result = await db.stream(
+        query.execution_options(yield_per=EXPORT_PARTITION_SIZE)
+    )
+    async for partition in result.partitions():
+        data = encode(encode_rows(partition, columns, file_format))
+        if data:
+            yield data
+        if on_partition is not None:
+            await on_partition(len(partition))
+
+    if compressor:
+        yield compressor.flush()
+
+def export_media_type(file_format: FileFormat, compress: bool) -> str:
+    return "application/gzip" if compress else MEDIA_TYPES[file_format]
+
+def export_filename(name: str, file_format: FileFormat, compress: bool) -> str:
+    """File name of an export, e.g. employees.csv.gz."""
+    return f"{name}.{file_format.value}" + (".gz" if compress else "")
+
+def export_headers(filename: str, file_format: FileFormat, compress: bool) -> Dict[str, str]:
+    """Content-Disposition of a file download, e.g. employees.csv.gz."""
+    filename = export_filename(filename, file_format, compress)
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
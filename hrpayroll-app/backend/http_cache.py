@@ -0,0 +1,120 @@
+"""
+HTTP validators and Cache-Control for read endpoints.
+
+Each GET route listed in CACHE_POLICIES declares the tables its response is
+derived from and a Cache-Control header. Before such a request runs, the
+middleware reads the shared versions of those tables and of users (one
+query, see change_tracking.py) and derives a strong ETag from them, the route,
+the query string and the bearer token. A matching If-None-Match is answered
+with 304 without running the endpoint or its serializer; otherwise the ETag
+and Cache-Control are added to the 200 response.
+
+The token is part of the ETag and only 200 responses get one, so a 304 is
+only given to the same, still valid, token that was allowed to read the
+response; role or account changes bump the users version.
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Optional, Sequence
+
+from jose import JWTError, jwt
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+from starlette.routing import Match
+
+from change_tracking import get_table_versions
+from config import settings
+from database import AsyncSessionLocal
+
+@dataclass(frozen=True)
+class CachePolicy:
+    tables: Sequence[str]
+    cache_control: str = "private, no-cache"
+
+# Responses that change rarely may be reused briefly without revalidation
+SHORT_LIVED = "private, max-age=30"
+
+CACHE_POLICIES: Dict[str, CachePolicy] = {
+    f"{settings.API_V1_PREFIX}{path}": policy
+    for path, policy in {
+        "/employees/": CachePolicy(("employees", "departments")),
+        "/employees/search": CachePolicy(("employees", "departments")),
+        "/employees/{employee_id}": CachePolicy(("employees", "departments")),
+        "/employees/{employee_id}/attendance": CachePolicy(("attendances",)),
+        "/departments/": CachePolicy(("departments",)),
+        "/departments/statistics": CachePolicy(("departments", "employees")),
+        "/departments/{department_id}": CachePolicy(("departments",)),
+        "/departments/{department_id}/employees": CachePolicy(("departments", "employees")),
+        "/departments/{department_id}/statistics": CachePolicy(("departments", "employees")),
+        "/payroll/": CachePolicy(("payrolls",)),
+        "/payroll/summary": CachePolicy(("payrolls", "employees"), SHORT_LIVED),
+        "/payroll/{payroll_id}": CachePolicy(("payrolls",)),
+        "/attendance/summary": CachePolicy(("attendances", "employees"), SHORT_LIVED),
+        "/dashboard/stats": CachePolicy(
+            ("departments", "employees", "payrolls", "attendances"), SHORT_LIVED
+        ),
+        "/dashboard/charts": CachePolicy(
+            ("departments", "employees", "payrolls", "attendances"), SHORT_LIVED
+        ),
+        "/dashboard/activities": CachePolicy(("employees", "payrolls"), SHORT_LIVED),
+    }.items()
+}
+
+def _route_path(request) -> Optional[str]:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+def _valid_token(authorization: str) -> bool:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return False
+    return True
+
+def compute_etag(request, route_path: str, versions: Dict[str, int]) -> str:
+    parts = [
+        request.app.version,
+        # Summaries are relative to the current date
+        date.today().isoformat(),
+        route_path,
+        request.url.path,
+        "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items())),
+        request.headers.get("authorization", ""),
+        ",".join(f"{table}:{version}" for table, version in sorted(versions.items())),
+    ]
+    digest = hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class HttpCacheMiddleware(BaseHTTPMiddleware):
+    """Answer conditional GETs of CACHE_POLICIES routes and add validators."""
+    async def dispatch(self, request, call_next):
+        if request.method != "GET":
+            return await call_next(request)
+        route_path = _route_path(request)
+        policy = CACHE_POLICIES.get(route_path)
+        authorization = request.headers.get("authorization", "")
+        if policy is None or not _valid_token(authorization):
+            return await call_next(request)
+
+        async with AsyncSessionLocal() as db:
+            versions = await get_table_versions(db, (*policy.tables, "users"))
+        etag = compute_etag(request, route_path, versions)
+        headers = {"ETag": etag, "Cache-Control": policy.cache_control}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
@@ -6,6 +6,8 @@ CREATE DATABASE hrpayroll;
 
 -- Create extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Create custom types
 DO $$
@@ -21,6 +23,10 @@ BEGIN
     IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'attendance_type') THEN
         CREATE TYPE attendance_type AS ENUM ('present', 'absent', 'leave', 'half_day');
     END IF;
+    
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'job_status') THEN
+        CREATE TYPE job_status AS ENUM ('queued', 'running', 'succeeded', 'failed', 'cancelled');
+    END IF;
 END$$;
 
 -- Create tables
@@ -89,6 +95,79 @@ CREATE TABLE IF NOT EXISTS attendances (
     updated_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Dashboard summary tables, maintained by the application (see summaries.py)
+CREATE TABLE IF NOT EXISTS department_headcounts (
+    department_id INTEGER PRIMARY KEY,  -- 0: employees without a department
+    employee_count INTEGER NOT NULL DEFAULT 0,
+    total_base_salary DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS monthly_headcount_changes (
+    month DATE PRIMARY KEY,
+    hires INTEGER NOT NULL DEFAULT 0,
+    departures INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS monthly_payroll_summaries (
+    month DATE NOT NULL,
+    department_id INTEGER NOT NULL,
+    payroll_count INTEGER NOT NULL DEFAULT 0,
+    total_base_salary DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_overtime_pay DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_deductions DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_tax DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_net_salary DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, department_id)
+);
+
+CREATE TABLE IF NOT EXISTS daily_attendance_summaries (
+    date DATE PRIMARY KEY,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    leave_count INTEGER NOT NULL DEFAULT 0,
+    half_day_count INTEGER NOT NULL DEFAULT 0,
+    total_work_hours DECIMAL(12,2) NOT NULL DEFAULT 0
+);
+
+-- Versions of the payroll tax and deduction rules; the latest applies (see payroll_rules.py)
+CREATE TABLE IF NOT EXISTS payroll_rule_sets (
+    version SERIAL PRIMARY KEY,
+    rules JSON NOT NULL,
+    description VARCHAR(255),
+    created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Change counters per table, incremented by every committed write (see change_tracking.py)
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(255) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Background job queue (see jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    params JSON NOT NULL,
+    status job_status NOT NULL DEFAULT 'queued',
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER,
+    message VARCHAR(255),
+    result JSON,
+    result_path VARCHAR(255),
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    worker VARCHAR(255),
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
@@ -96,8 +175,24 @@ CREATE INDEX IF NOT EXISTS idx_employees_user_id ON employees(user_id);
 CREATE INDEX IF NOT EXISTS idx_employees_department_id ON employees(department_id);
 CREATE INDEX IF NOT EXISTS idx_payrolls_employee_id ON payrolls(employee_id);
 CREATE INDEX IF NOT EXISTS idx_payrolls_period ON payrolls(pay_period_start, pay_period_end);
-CREATE INDEX IF NOT EXISTS idx_attendances_employee_id ON attendances(employee_id);
+CREATE INDEX IF NOT EXISTS idx_payrolls_status_period ON payrolls(status, pay_period_start);
 CREATE INDEX IF NOT EXISTS idx_attendances_date ON attendances(date);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_attendances_employee_date ON attendances(employee_id, date);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after);
+
+-- Trigram indexes on the lowercased search documents (see search.py)
+CREATE INDEX IF NOT EXISTS idx_employees_search ON employees USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_search ON users USING gin (lower(username || ' ' || email) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_departments_search ON departments USING gin (lower(name) gin_trgm_ops);
+
+-- Reject payrolls whose period overlaps another payroll of the same employee
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'excl_payrolls_employee_period') THEN
+        ALTER TABLE payrolls ADD CONSTRAINT excl_payrolls_employee_period
+            EXCLUDE USING gist (employee_id WITH =, daterange(pay_period_start, pay_period_end, '[]') WITH &&);
+    END IF;
+END $$;
 
 -- Create triggers for updated_at columns
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -0,0 +1,607 @@
+"""
+Background jobs.
+
+Operations that can outlast a request (payroll runs, exports, payslip
+archives, summary rebuilds) are submitted as rows of the jobs table and
+answered with 202 and the job; clients poll GET /jobs/{id} for its state and
+progress and download the file it produced from GET /jobs/{id}/result.
+
+Job runners claim the oldest due queued job with a single UPDATE ...
+RETURNING (FOR UPDATE SKIP LOCKED on PostgreSQL), so any number of them
+share the queue: the worker processes started by `python -m jobs` and, with
+JOB_RUNNER_ENABLED, one in each API process, each running
+JOB_RUNNER_CONCURRENCY jobs at a time. Result files are written off the
+event loop to JOB_RESULTS_PATH, which the API processes read them from to
+serve downloads, so it must be shared by workers and API. While a job
+runs, its runner refreshes the job's heartbeat every poll; a job whose
+heartbeat is older than JOB_LEASE_SECONDS, e.g. because its worker died, is
+queued again. A failed attempt is retried after JOB_RETRY_DELAY_SECONDS,
+doubled per attempt, until the job's max_attempts. Cancelling a queued job
+takes effect immediately and a running one is cancelled by its runner at the
+next heartbeat. A runner that shuts down puts its running jobs back in the
+queue.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import AsyncSessionLocal
+from models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+class JobContext:
+    """Handed to a job handler to report progress and name its result file."""
+    def __init__(self, job_id: int, session_factory=AsyncSessionLocal):
+        self.job_id = job_id
+        self.session_factory = session_factory
+        self.result_file: Optional[Dict[str, str]] = None
+
+    async def progress(
+        self,
+        done: int,
+        total: Optional[int] = None,
+        message: Optional[str] = None
+    ) -> None:
+        """Record how much of the job is done (and its size, once known)."""
+        values: Dict[str, Any] = {"progress_done": done}
+        if total is not None:
+            values["progress_total"] = total
+        if message is not None:
+            values["message"] = message
+        async with self.session_factory() as db:
+            await db.execute(update(Job).where(Job.id == self.job_id).values(**values))
+            await db.commit()
+
+    def result_path(self, filename: str, media_type: str) -> str:
+        """
+        Path to write the job's result file to (with open_result_file),
+        offered for download as `filename`.
+        """
+        path = os.path.join(settings.JOB_RESULTS_PATH, f"job-{self.job_id}-{filename}")
+        self.result_file = {"path": path, "filename": filename, "media_type": media_type}
+        return path
+
+def _create_result_file(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+@asynccontextmanager
+async def open_result_file(path: str) -> AsyncIterator[Callable[[bytes], Awaitable[Any]]]:
+    """
+    Create a result file and yield an async function writing to it. Opening,
+    writes and closing run in a thread, off the event loop.
+    """
+    file = await asyncio.to_thread(_create_result_file, path)
+    try:
+        yield lambda data: asyncio.to_thread(file.write, data)
+    finally:
+        await asyncio.to_thread(file.close)
+
+# A handler runs a job of its kind: it gets the job's context, a session and
+# the job's parameters, and returns the JSON result of the job
+JobHandler = Callable[[JobContext, AsyncSession, Dict[str, Any]], Awaitable[Optional[dict]]]
+
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+def job_handler(kind: str):
+    """Register the decorated coroutine as the handler of a job kind."""
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _update_job(job_id: int, *criteria):
+    return (
+        update(Job)
+        .where(Job.id == job_id, *criteria)
+        .execution_options(synchronize_session=False)
+    )
+
+class JobRunner:
+    def __init__(
+        self,
+        concurrency: int,
+        poll_interval: float,
+        lease: float,
+        session_factory=AsyncSessionLocal
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.session_factory = session_factory
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = False
+        self._jobs: Dict[int, asyncio.Task] = {}
+        # Why a job's task was cancelled: "cancel", "lost" or "shutdown"
+        self._cancelled: Dict[int, str] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # Lifecycle
+    async def start(self) -> None:
+        self.running = True
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and put the running ones back in the queue."""
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for job_id, task in list(self._jobs.items()):
+            self._cancelled[job_id] = "shutdown"
+            task.cancel()
+        await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+
+    def wake(self) -> None:
+        """Look for due jobs now rather than at the next poll."""
+        self._wakeup.set()
+
+    def cancel_local(self, job_id: int) -> bool:
+        """Cancel a job if this runner is running it."""
+        task = self._jobs.get(job_id)
+        if task is None:
+            return False
+        self._cancelled[job_id] = "cancel"
+        task.cancel()
+        return True
+
+    # Queue operations
+    async def _claim(self, db: AsyncSession) -> Optional[Job]:
+        now = _now()
+        due = (
+            select(Job.id)
+            .where(Job.status == JobStatus.QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(1)
+        )
+        if db.bind.dialect.name == "postgresql":
+            due = due.with_for_update(skip_locked=True)
+        claimed = (await db.execute(
+            update(Job)
+            .where(Job.id == due.scalar_subquery(), Job.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                worker=self.name,
+                attempts=Job.attempts + 1,
+                started_at=now,
+                heartbeat_at=now
+            )
+            .returning(Job.id, Job.kind, Job.params, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        )).first()
+        await db.commit()
+        return claimed
+
+    async def _heartbeat(self, db: AsyncSession) -> None:
+        """Keep this runner's jobs alive and cancel those cancelled or lost."""
+        if not self._jobs:
+            return
+        alive = dict((await db.execute(
+            update(Job)
+            .where(
+                Job.id.in_(list(self._jobs)),
+                Job.worker == self.name,
+                Job.status == JobStatus.RUNNING
+            )
+            .values(heartbeat_at=_now())
+            .returning(Job.id, Job.cancel_requested)
+            .execution_options(synchronize_session=False)
+        )).all())
+        await db.commit()
+        for job_id, task in list(self._jobs.items()):
+            if job_id not in alive:
+                # Queued again after a missed heartbeat, maybe running elsewhere
+                self._cancelled[job_id] = "lost"
+                task.cancel()
+            elif alive[job_id]:
+                self._cancelled[job_id] = "cancel"
+                task.cancel()
+
+    async def _requeue_expired(self, db: AsyncSession) -> None:
+        """Queue again the jobs of workers that stopped sending heartbeats."""
+        expired = (
+            Job.status == JobStatus.RUNNING,
+            Job.heartbeat_at < _now() - timedelta(seconds=self.lease)
+        )
+        await db.execute(
+            update(Job)
+            .where(*expired, Job.attempts < Job.max_attempts, Job.cancel_requested.is_(False))
+            .values(status=JobStatus.QUEUED, worker=None, run_after=_now())
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            update(Job)
+            .where(*expired)
+            .values(
+                status=JobStatus.FAILED,
+                worker=None,
+                error="Worker stopped responding",
+                finished_at=_now()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    await self._heartbeat(db)
+                    await self._requeue_expired(db)
+                    while len(self._jobs) < self.concurrency:
+                        claimed = await self._claim(db)
+                        if claimed is None:
+                            break
+                        job_id = claimed.id
+                        self._jobs[job_id] = asyncio.create_task(self._run(*claimed))
+            except Exception as exc:
+                logger.error(f"Job runner poll failed: {exc}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # Running jobs
+    async def _finish(self, job_id: int, **values) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                _update_job(job_id, Job.worker == self.name, Job.status == JobStatus.RUNNING)
+                .values(worker=None, **values)
+            )
+            await db.commit()
+
+    async def _run(
+        self,
+        job_id: int,
+        kind: str,
+        params: Dict[str, Any],
+        attempts: int,
+        max_attempts: int
+    ) -> None:
+        context = JobContext(job_id, self.session_factory)
+        try:
+            handler = JOB_HANDLERS.get(kind)
+            if handler is None:
+                await self._finish(
+                    job_id, status=JobStatus.FAILED,
+                    error=f"Unknown job kind {kind!r}", finished_at=_now()
+                )
+                return
+            try:
+                async with self.session_factory() as db:
+                    result = await handler(context, db, params)
+            except asyncio.CancelledError:
+                reason = self._cancelled.pop(job_id, "shutdown")
+                if reason == "cancel":
+                    await self._finish(job_id, status=JobStatus.CANCELLED, finished_at=_now())
+                elif reason == "shutdown":
+                    # Interrupted rather than failed: the attempt does not count
+                    await self._finish(
+                        job_id, status=JobStatus.QUEUED,
+                        attempts=Job.attempts - 1, run_after=_now()
+                    )
+                return
+            except Exception as exc:
+                logger.exception(f"Job {job_id} ({kind}) failed on attempt {attempts}")
+                error = str(exc) or type(exc).__name__
+                if attempts < max_attempts:
+                    delay = settings.JOB_RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+                    await self._finish(
+                        job_id, status=JobStatus.QUEUED, error=error,
+                        run_after=_now() + timedelta(seconds=delay)
+                    )
+                else:
+                    await self._finish(
+                        job_id, status=JobStatus.FAILED, error=error, finished_at=_now()
+                    )
+                return
+
+            values: Dict[str, Any] = {
+                "status": JobStatus.SUCCEEDED,
+                "result": jsonable_encoder(result),
+                "error": None,
+                "finished_at": _now(),
+            }
+            if context.result_file is not None:
+                values["result_path"] = context.result_file["path"]
+                values["result"] = {
+                    **(values["result"] or {}),
+                    "filename": context.result_file["filename"],
+                    "media_type": context.result_file["media_type"],
+                }
+            await self._finish(job_id, **values)
+        except Exception as exc:
+            logger.error(f"Could not record the outcome of job {job_id}: {exc}")
+        finally:
+            self._jobs.pop(job_id, None)
+            self._cancelled.pop(job_id, None)
+            self.wake()
+
+job_runner = JobRunner(
+    concurrency=settings.JOB_RUNNER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    lease=settings.JOB_LEASE_SECONDS
+)
+
+# Submitting and managing jobs
+async def submit_job(
+    db: AsyncSession,
+    kind: str,
+    params: Dict[str, Any],
+    created_by: Optional[int] = None,
+    max_attempts: Optional[int] = None
+) -> Job:
+    """Queue a job and return it."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = Job(
+        kind=kind,
+        params=jsonable_encoder(params),
+        status=JobStatus.QUEUED,
+        created_by=created_by,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_after=_now()
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    if job_runner.running:
+        job_runner.wake()
+    return job
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[Job]:
+    return await db.scalar(select(Job).where(Job.id == job_id))
+
+async def get_jobs(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[JobStatus] = None,
+    kind: Optional[str] = None
+) -> list:
+    """Jobs, newest first, optionally of one status or kind."""
+    query = select(Job)
+    if status:
+        query = query.where(Job.status == status)
+    if kind:
+        query = query.where(Job.kind == kind)
+    result = await db.scalars(query.order_by(Job.id.desc()).offset(skip).limit(limit))
+    return list(result)
+
+async def count_jobs(
+    db: AsyncSession,
+    status: Optional[JobStatus] = None,
+    kind: Optional[str] = None
+) -> int:
+    query = select(func.count(Job.id))
+    if status:
+        query = query.where(Job.status == status)
+    if kind:
+        query = query.where(Job.kind == kind)
+    return await db.scalar(query)
+
+async def cancel_job(db: AsyncSession, job_id: int) -> Optional[Job]:
+    """
+    Cancel a queued job, or ask the runner of a running one to cancel it.
+    Finished jobs are left as they are.
+    """
+    cancelled = await db.execute(
+        _update_job(job_id, Job.status == JobStatus.QUEUED)
+        .values(status=JobStatus.CANCELLED, finished_at=_now())
+    )
+    if not cancelled.rowcount:
+        await db.execute(
+            _update_job(job_id, Job.status == JobStatus.RUNNING)
+            .values(cancel_requested=True)
+        )
+    await db.commit()
+    job_runner.cancel_local(job_id)
+    return await db.scalar(
+        select(Job).where(Job.id == job_id).execution_options(populate_existing=True)
+    )
+
+def job_location(job: Job) -> str:
+    """URL of a job's state, the Location of the 202 response submitting it."""
+    return f"{settings.API_V1_PREFIX}/jobs/{job.id}"
+
+# Job kinds
+def _date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+@job_handler("payroll_run")
+async def run_payroll(context: JobContext, db: AsyncSession, params: Dict[str, Any]) -> dict:
+    """Compute and save the payroll run of a period."""
+    import payroll_run
+    run = await payroll_run.compute_payroll_run(
+        db,
+        _date(params["pay_period_start"]),
+        _date(params["pay_period_end"]),
+        params.get("department_id")
+    )
+    await context.progress(0, run.total_employees, "Saving payroll records")
+    created = await payroll_run.save_payroll_run(db, run)
+    await context.progress(run.total_employees, message=f"Created {created} payroll records")
+    return {**run.summary(), "created": created}
+
+async def _export(
+    context: JobContext,
+    db: AsyncSession,
+    name: str,
+    query,
+    columns,
+    params: Dict[str, Any]
+) -> dict:
+    """Write a query export to the job's result file, counting rows as progress."""
+    from file_formats import FileFormat, export_filename, export_media_type, stream_query
+    file_format = FileFormat(params.get("format", FileFormat.CSV))
+    compress = bool(params.get("gzip", False))
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    await context.progress(0, total, "Exporting")
+    rows = 0
+
+    async def exported(count: int) -> None:
+        nonlocal rows
+        rows += count
+        await context.progress(rows)
+
+    path = context.result_path(
+        export_filename(name, file_format, compress),
+        export_media_type(file_format, compress)
+    )
+    async with open_result_file(path) as write:
+        async for chunk in stream_query(
+            db, query, columns, file_format, compress=compress, on_partition=exported
+        ):
+            await write(chunk)
+    return {"rows": rows}
+
+@job_handler("employee_export")
+async def export_employees(context: JobContext, db: AsyncSession, params: Dict[str, Any]) -> dict:
+    """Export all employees, or those of a department, to a file."""
+    import employee_io
+    return await _export(
+        context, db, "employees",
+        employee_io.export_query(params.get("department_id")),
+        employee_io.EXPORT_COLUMNS,
+        params
+    )
+
+@job_handler("attendance_export")
+async def export_attendance(context: JobContext, db: AsyncSession, params: Dict[str, Any]) -> dict:
+    """Export attendance records to a file."""
+    import attendance_export
+    return await _export(
+        context, db, "attendance",
+        attendance_export.export_query(
+            _date(params.get("start_date")),
+            _date(params.get("end_date")),
+            params.get("department_id")
+        ),
+        attendance_export.EXPORT_COLUMNS,
+        params
+    )
+
+# Payslips added to an archive between progress updates
+PAYSLIP_PROGRESS_INTERVAL = 256
+
+@job_handler("payslip_archive")
+async def archive_payslips(context: JobContext, db: AsyncSession, params: Dict[str, Any]) -> dict:
+    """Write the ZIP archive of the payslips of a pay period to a file."""
+    import payslips
+    pay_period_start = _date(params["pay_period_start"])
+    pay_period_end = _date(params["pay_period_end"])
+    department_id = params.get("department_id")
+    file_format = payslips.PayslipFormat(params.get("format", payslips.PayslipFormat.PDF))
+    query = payslips.run_query(pay_period_start, pay_period_end, department_id)
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    await context.progress(0, total, "Rendering payslips")
+
+    filename = f"payslips-{pay_period_start.isoformat()}-{pay_period_end.isoformat()}.zip"
+    path = context.result_path(filename, "application/zip")
+    # Every archive chunk but the last is one payslip
+    added = 0
+    async with open_result_file(path) as write:
+        async for chunk in payslips.stream_run_archive(
+            db, pay_period_start, pay_period_end, file_format, department_id
+        ):
+            await write(chunk)
+            added = min(added + 1, total)
+            if added % PAYSLIP_PROGRESS_INTERVAL == 0:
+                await context.progress(added)
+    await context.progress(total)
+    return {"payslips": total}
+
+@job_handler("rebuild_summaries")
+async def rebuild_dashboard_summaries(context: JobContext, db: AsyncSession, params: Dict[str, Any]) -> None:
+    """Recompute the dashboard summary tables from the source tables."""
+    import summaries
+    from result_cache import result_cache
+    await context.progress(0, 1, "Rebuilding summaries")
+    await summaries.rebuild_summaries(db)
+    await result_cache.invalidate("departments", "employees", "payrolls", "attendances")
+    await context.progress(1)
+
+# Worker processes
+def _serve(concurrency: int) -> None:
+    """Run a job runner in this process until it is sent SIGTERM or SIGINT."""
+    from database import dispose_engines
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    async def serve() -> None:
+        runner = JobRunner(
+            concurrency=concurrency,
+            poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+            lease=settings.JOB_LEASE_SECONDS
+        )
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+        await runner.start()
+        logger.info(f"Job runner {runner.name} started")
+        await stopping.wait()
+        await runner.stop()
+        await dispose_engines()
+        logger.info(f"Job runner {runner.name} stopped")
+
+    asyncio.run(serve())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background jobs outside the API processes.")
+    parser.add_argument(
+        "--processes", type=int, default=1,
+        help="worker processes to start (default: 1)"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.JOB_RUNNER_CONCURRENCY,
+        help="jobs run at a time by each process (default: JOB_RUNNER_CONCURRENCY)"
+    )
+    args = parser.parse_args()
+    if args.processes == 1:
+        _serve(args.concurrency)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_serve, args=(args.concurrency,), name=f"job-worker-{number}")
+        for number in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def forward(signum, frame) -> None:
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for worker in workers:
+        worker.join()
+
+if __name__ == "__main__":
+    # Dedicated job workers, sharing JOB_RESULTS_PATH with the API:
+    # python -m jobs --processes 4
+    main()
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
@@ -6,8 +7,15 @@ from contextlib import asynccontextmanager
 import logging
 
 from config import settings
-from database import init_db
+from database import init_db, dispose_engines
+from auth import password_hash_executor
 from routes import api_router
+from query_budget import QueryBudgetMiddleware
+from http_cache import HttpCacheMiddleware
+from punch_queue import punch_queue
+from result_cache import result_cache
+from payslips import payslip_executor
+from jobs import job_runner
 
 # Configure logging
 logging.basicConfig(
@@ -32,10 +40,27 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error initializing database: {e}")
         raise
     
+    if settings.PUNCH_QUEUE_ENABLED:
+        try:
+            await punch_queue.start()
+        except (OSError, RuntimeError) as e:
+            # e.g. an unwritable spool, or one locked by another worker
+            logger.error(f"Punch queue not started, punches are written directly: {e}")
+    
+    if settings.JOB_RUNNER_ENABLED:
+        await job_runner.start()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    if punch_queue.running:
+        await punch_queue.stop()
+    if job_runner.running:
+        await job_runner.stop()
+    await dispose_engines()
+    password_hash_executor.shutdown(wait=False)
+    payslip_executor.shutdown(wait=False, cancel_futures=True)
 
 # Create FastAPI application
 app = FastAPI(
@@ -54,13 +79,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ETags, conditional GETs and Cache-Control for read endpoints
+if settings.HTTP_CACHE_ENABLED:
+    app.add_middleware(HttpCacheMiddleware)
+
+# Check SQL statements per request against endpoint budgets
+if settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware)
+
 # Global exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     """Handle validation errors."""
     return JSONResponse(
         status_code=422,
-        content={"detail": exc.errors()}
+        content={"detail": jsonable_encoder(exc.errors())}
     )
 
 @app.exception_handler(HTTPException)
@@ -68,7 +101,8 @@ async def http_exception_handler(request, exc):
     """Handle HTTP exceptions."""
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -89,11 +123,12 @@ app.include_router(
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    """Health check endpoint to verify API is running."""
+    """Health check endpoint to verify API is running, with result cache hits and misses."""
     return {
         "status": "healthy",
         "version": app.version,
-        "api_prefix": settings.API_V1_PREFIX
+        "api_prefix": settings.API_V1_PREFIX,
+        "result_cache": result_cache.metrics()
     }
 
 if __name__ == "__main__":
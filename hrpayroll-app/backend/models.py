@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Date, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Date, Enum, Index, DDL, event, literal_column, JSON, Numeric
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -51,7 +52,7 @@ class Employee(Base):
     address = Column(String)
     hire_date = Column(Date, nullable=False)
     position = Column(String, nullable=False)
-    base_salary = Column(Float, nullable=False)
+    base_salary = Column(Numeric(10, 2), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -66,6 +67,16 @@ class PayrollStatus(str, enum.Enum):
     PROCESSED = "processed"
     PAID = "paid"
 
+# Outcome of a record in a batch payroll status transition
+class TransitionOutcome(str, enum.Enum):
+    UPDATED = "updated"
+    NOT_FOUND = "not_found"
+    INVALID_STATUS = "invalid_status"
+
+class DeductionType(str, enum.Enum):
+    FIXED = "fixed"            # An amount per pay period
+    PERCENTAGE = "percentage"  # A rate of gross pay, optionally capped
+
 class Payroll(Base):
     __tablename__ = "payrolls"
 
@@ -73,11 +84,11 @@ class Payroll(Base):
     employee_id = Column(Integer, ForeignKey("employees.id"))
     pay_period_start = Column(Date, nullable=False)
     pay_period_end = Column(Date, nullable=False)
-    base_salary = Column(Float, nullable=False)
-    overtime_pay = Column(Float, default=0.0)
-    deductions = Column(Float, default=0.0)
-    tax = Column(Float, default=0.0)
-    net_salary = Column(Float, nullable=False)
+    base_salary = Column(Numeric(10, 2), nullable=False)
+    overtime_pay = Column(Numeric(10, 2), default=0)
+    deductions = Column(Numeric(10, 2), default=0)
+    tax = Column(Numeric(10, 2), default=0)
+    net_salary = Column(Numeric(10, 2), nullable=False)
     status = Column(Enum(PayrollStatus), default=PayrollStatus.PENDING)
     payment_date = Column(Date)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -86,12 +97,71 @@ class Payroll(Base):
     # Relationships
     employee = relationship("Employee", back_populates="payrolls")
 
+    __table_args__ = (
+        # Serves status-filtered payroll lists, e.g. pending payrolls of a period
+        Index("idx_payrolls_status_period", "status", "pay_period_start"),
+        # No two payrolls of an employee may have overlapping (inclusive) periods.
+        # PostgreSQL enforces this with a GiST index on the period's daterange;
+        # SQLite, which has no exclusion constraints, uses the trigger below.
+        ExcludeConstraint(
+            (employee_id, "="),
+            (func.daterange(pay_period_start, pay_period_end, literal_column("'[]'")), "&&"),
+            name="excl_payrolls_employee_period",
+            using="gist"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_payrolls_employee_period", "employee_id", "pay_period_start", "pay_period_end"
+        ).ddl_if(dialect="sqlite"),
+    )
+
+# btree_gist provides the GiST "=" operator on employee_id used by the exclusion
+event.listen(
+    Payroll.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql")
+)
+event.listen(
+    Payroll.__table__,
+    "after_create",
+    DDL("""
+        CREATE TRIGGER IF NOT EXISTS excl_payrolls_employee_period
+        BEFORE INSERT ON payrolls
+        WHEN EXISTS (
+            SELECT 1 FROM payrolls
+            WHERE employee_id = NEW.employee_id
+              AND pay_period_start <= NEW.pay_period_end
+              AND pay_period_end >= NEW.pay_period_start
+        )
+        BEGIN
+            SELECT RAISE(ABORT, 'excl_payrolls_employee_period: overlapping pay period');
+        END
+    """).execute_if(dialect="sqlite")
+)
+
+class PayrollRuleSet(Base):
+    """
+    A version of the payroll tax and deduction rules (see payroll_rules.py).
+    Versions are never modified: saving rules adds a version, and the latest
+    version applies.
+    """
+    __tablename__ = "payroll_rule_sets"
+
+    version = Column(Integer, primary_key=True)
+    rules = Column(JSON, nullable=False)
+    description = Column(String)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class AttendanceType(str, enum.Enum):
     PRESENT = "present"
     ABSENT = "absent"
     LEAVE = "leave"
     HALF_DAY = "half_day"
 
+class PunchDirection(str, enum.Enum):
+    IN = "in"
+    OUT = "out"
+
 class Attendance(Base):
     __tablename__ = "attendances"
 
@@ -109,8 +179,111 @@ class Attendance(Base):
     # Relationships
     employee = relationship("Employee", back_populates="attendances")
 
+    __table_args__ = (
+        # One record per employee and day; batch ingestion upserts on it
+        Index("uq_attendances_employee_date", "employee_id", "date", unique=True),
+    )
+
     def calculate_work_hours(self):
         """Calculate work hours if both check_in and check_out are present"""
         if self.check_in and self.check_out:
             delta = self.check_out - self.check_in
             self.work_hours = delta.total_seconds() / 3600  # Convert to hours
+
+# Dashboard summary tables. Maintained incrementally by crud writes (see
+# summaries.py) so dashboard endpoints never scan the base tables.
+class DepartmentHeadcount(Base):
+    __tablename__ = "department_headcounts"
+
+    # 0 collects employees without a department
+    department_id = Column(Integer, primary_key=True)
+    employee_count = Column(Integer, nullable=False, default=0)
+    total_base_salary = Column(Numeric(14, 2), nullable=False, default=0)
+
+class MonthlyHeadcountChange(Base):
+    __tablename__ = "monthly_headcount_changes"
+
+    month = Column(Date, primary_key=True)
+    hires = Column(Integer, nullable=False, default=0)
+    departures = Column(Integer, nullable=False, default=0)
+
+class MonthlyPayrollSummary(Base):
+    __tablename__ = "monthly_payroll_summaries"
+
+    month = Column(Date, primary_key=True)
+    department_id = Column(Integer, primary_key=True)
+    payroll_count = Column(Integer, nullable=False, default=0)
+    total_base_salary = Column(Numeric(14, 2), nullable=False, default=0)
+    total_overtime_pay = Column(Numeric(14, 2), nullable=False, default=0)
+    total_deductions = Column(Numeric(14, 2), nullable=False, default=0)
+    total_tax = Column(Numeric(14, 2), nullable=False, default=0)
+    total_net_salary = Column(Numeric(14, 2), nullable=False, default=0)
+
+class DailyAttendanceSummary(Base):
+    __tablename__ = "daily_attendance_summaries"
+
+    date = Column(Date, primary_key=True)
+    present_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    leave_count = Column(Integer, nullable=False, default=0)
+    half_day_count = Column(Integer, nullable=False, default=0)
+    total_work_hours = Column(Float, nullable=False, default=0.0)
+
+class TableVersion(Base):
+    """
+    Change counter of a table, incremented right after every committed write
+    to it (see change_tracking.py). HTTP validators are derived from it.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class Job(Base):
+    """
+    A background job (see jobs.py): what to run, its state and progress, and
+    its outcome. Workers claim queued jobs by updating their status.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer)
+    message = Column(String)
+    result = Column(JSON)
+    # File produced by the job, downloaded from GET /jobs/{id}/result
+    result_path = Column(String)
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=1)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    # Worker running the job, and when it last reported the job alive
+    worker = Column(String)
+    heartbeat_at = Column(DateTime(timezone=True))
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Serves claiming the next due job and listing jobs by status
+        Index("idx_jobs_status_run_after", "status", "run_after"),
+    )
+
+    @property
+    def progress(self):
+        """Share of the job done, between 0 and 1, when its size is known."""
+        if not self.progress_total:
+            return None
+        return min(self.progress_done / self.progress_total, 1.0)
@@ -0,0 +1,203 @@
+"""
+Exact money arithmetic.
+
+Amounts are stored in NUMERIC(10,2) columns and read as Decimal. Payroll
+computations work on integer cents instead: a Python int for one amount, an
+int64 numpy array for a whole payroll run, so that additions and sums are
+exact and batch arithmetic stays vectorized. Multiplying by a rate, a number
+of hours or any other non-integer factor is done on exact fractions: the
+factor is written as a ratio of integers, the amount is multiplied by the
+numerator and divided by the denominator, and the quotient is rounded once,
+with the configured rounding policy (MONEY_ROUNDING). Splitting an amount
+in shares (allocate) hands out the cents lost to rounding by largest
+remainder, so the shares always add up to the amount.
+"""
+import enum
+from decimal import ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP, Decimal
+from fractions import Fraction
+from typing import Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import settings
+
+class RoundingPolicy(str, enum.Enum):
+    HALF_UP = "half_up"      # Halves away from zero (commercial rounding)
+    HALF_EVEN = "half_even"  # Halves to the even cent (banker's rounding)
+    DOWN = "down"            # Toward zero (truncation)
+    UP = "up"                # Away from zero
+    FLOOR = "floor"          # Toward negative infinity
+    CEILING = "ceiling"      # Toward positive infinity
+
+DECIMAL_ROUNDING = {
+    RoundingPolicy.HALF_UP: ROUND_HALF_UP,
+    RoundingPolicy.HALF_EVEN: ROUND_HALF_EVEN,
+    RoundingPolicy.DOWN: ROUND_DOWN,
+    RoundingPolicy.UP: ROUND_UP,
+    RoundingPolicy.FLOOR: ROUND_FLOOR,
+    RoundingPolicy.CEILING: ROUND_CEILING,
+}
+
+CENTS_PER_UNIT = 100
+CENT = Decimal("0.01")
+
+# Largest magnitude an int64 intermediate product may reach
+INT64_MAX = np.iinfo(np.int64).max
+
+Amount = Union[Decimal, int, float, str]
+Factor = Union[Fraction, Decimal, int, float, str]
+
+def default_policy() -> RoundingPolicy:
+    return RoundingPolicy(settings.MONEY_ROUNDING)
+
+def to_decimal(value: Amount) -> Decimal:
+    """Decimal of an amount; floats are taken at their shortest repr (0.1 -> 0.1)."""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+def quantize(value: Amount, policy: Optional[RoundingPolicy] = None) -> Decimal:
+    """An amount rounded to whole cents."""
+    policy = policy or default_policy()
+    return to_decimal(value).quantize(CENT, rounding=DECIMAL_ROUNDING[policy])
+
+def to_cents(value: Optional[Amount], policy: Optional[RoundingPolicy] = None) -> int:
+    """Integer cents of an amount, rounded to the cent; None counts as 0."""
+    if value is None:
+        return 0
+    return int(quantize(value, policy).scaleb(2))
+
+def from_cents(cents: int) -> Decimal:
+    """Decimal amount of a number of cents, e.g. 123456 -> Decimal('1234.56')."""
+    return Decimal(int(cents)).scaleb(-2)
+
+def cents_array(values: Iterable[Optional[Amount]], count: int = -1) -> np.ndarray:
+    """int64 array of the cents of amounts, e.g. a column of query results."""
+    policy = default_policy()
+    return np.fromiter((to_cents(value, policy) for value in values), dtype=np.int64, count=count)
+
+def decimals(cents: np.ndarray) -> list:
+    """Decimal amounts of an array of cents, e.g. for a bulk insert."""
+    return [from_cents(value) for value in cents.tolist()]
+
+def ratio(factor: Factor) -> Tuple[int, int]:
+    """A factor as (numerator, denominator) integers, denominator positive."""
+    if not isinstance(factor, Fraction):
+        factor = Fraction(to_decimal(factor))
+    return factor.numerator, factor.denominator
+
+def divide(
+    numerator: np.ndarray,
+    denominator: int,
+    policy: Optional[RoundingPolicy] = None
+) -> np.ndarray:
+    """Integer quotients of an array by a positive integer, rounded by policy."""
+    policy = policy or default_policy()
+    numerator = np.asarray(numerator)
+    # Floor division (object arrays of Python ints have no divmod ufunc);
+    # the remainder is in [0, denominator)
+    quotient = numerator // denominator
+    remainder = numerator - quotient * denominator
+    inexact = remainder != 0
+    if policy == RoundingPolicy.FLOOR:
+        adjust = np.zeros_like(inexact)
+    elif policy == RoundingPolicy.CEILING:
+        adjust = inexact
+    elif policy == RoundingPolicy.DOWN:
+        adjust = inexact & (numerator < 0)
+    elif policy == RoundingPolicy.UP:
+        adjust = inexact & (numerator > 0)
+    else:
+        twice = remainder * 2
+        half = twice == denominator
+        if policy == RoundingPolicy.HALF_UP:
+            tie = half & (numerator > 0)
+        else:
+            tie = half & (quotient % 2 == 1)
+        adjust = (twice > denominator) | tie
+    return quotient + adjust.astype(quotient.dtype)
+
+def allocate(cents: int, weights: Sequence[int]) -> np.ndarray:
+    """
+    Split an amount of cents in proportion to non-negative integer weights.
+    Each share is rounded toward zero, then the cents left over go one each
+    to the shares with the largest remainders (the first ones on ties), so
+    the shares add up to the amount exactly.
+    """
+    weights = [int(weight) for weight in weights]
+    if any(weight < 0 for weight in weights) or sum(weights) <= 0:
+        raise ValueError("Weights must be non-negative with a positive total")
+    total = sum(weights)
+    amount = abs(int(cents))
+    # Python integers: amount * weight may not fit in int64
+    shares = [amount * weight // total for weight in weights]
+    remainders = [amount * weight - share * total for weight, share in zip(weights, shares)]
+    leftover = amount - sum(shares)
+    for index in sorted(range(len(weights)), key=lambda index: -remainders[index])[:leftover]:
+        shares[index] += 1
+    sign = -1 if cents < 0 else 1
+    return np.array([sign * share for share in shares], dtype=np.int64)
+
+def multiply(
+    cents: np.ndarray,
+    factor: Factor,
+    policy: Optional[RoundingPolicy] = None
+) -> np.ndarray:
+    """
+    Cents times a factor (a rate, hours, ...), rounded once by policy. Falls
+    back to Python integers when the intermediate product could overflow int64.
+    """
+    numerator, denominator = ratio(factor)
+    cents = np.asarray(cents, dtype=np.int64)
+    largest = int(np.abs(cents).max()) if cents.size else 0
+    if largest * abs(numerator) > INT64_MAX:
+        product = cents.astype(object) * numerator
+        return divide(product, denominator, policy).astype(np.int64)
+    return divide(cents * numerator, denominator, policy)
+
+def multiply_arrays(
+    cents: np.ndarray,
+    units: np.ndarray,
+    scale: int,
+    factor: Factor = 1,
+    policy: Optional[RoundingPolicy] = None
+) -> np.ndarray:
+    """
+    Cents times per-element quantities given as integers of 1/scale units
+    (e.g. hundredths of an hour), times a common factor, rounded once.
+    """
+    numerator, denominator = ratio(factor)
+    cents = np.asarray(cents, dtype=np.int64)
+    units = np.asarray(units, dtype=np.int64)
+    largest = (
+        int(np.abs(cents).max()) * int(np.abs(units).max()) * abs(numerator)
+        if cents.size else 0
+    )
+    if largest > INT64_MAX:
+        product = cents.astype(object) * units.astype(object) * numerator
+        return divide(product, denominator * scale, policy).astype(np.int64)
+    return divide(cents * units * numerator, denominator * scale, policy)
+
+def weighted_sum(
+    cents: np.ndarray,
+    weights: np.ndarray,
+    denominator: int,
+    policy: Optional[RoundingPolicy] = None
+) -> np.ndarray:
+    """
+    Row sums of a (rows, columns) array of cents times integer weights over
+    denominator, rounded once per row (e.g. tax on the parts of pay in each
+    bracket). Falls back to Python integers when the sums could overflow int64.
+    """
+    cents = np.asarray(cents, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    largest = (
+        int(np.abs(cents).max()) * int(np.abs(weights).sum(axis=-1).max())
+        if cents.size else 0
+    )
+    if largest > INT64_MAX:
+        total = (cents.astype(object) * weights.astype(object)).sum(axis=-1)
+        return divide(total, denominator, policy).astype(np.int64)
+    return divide((cents * weights).sum(axis=-1), denominator, policy)
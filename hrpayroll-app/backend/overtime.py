@@ -0,0 +1,79 @@
+"""
+Overtime calculation from attendance work hours.
+
+Work hours are summed per employee and per day (or ISO week) in the database,
+the part above the configured threshold is summed per employee, and the pay is
+computed for all employees at once, in exact cents, from Employee.base_salary.
+"""
+from datetime import date
+from fractions import Fraction
+
+import numpy as np
+from sqlalchemy import Integer, case, cast, func, literal, select
+from sqlalchemy.sql import Subquery
+
+from config import settings
+import money
+from models import Attendance
+
+# julianday() of 1970-01-01 00:00 in SQLite
+SQLITE_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+def _days_since_epoch(dialect_name: str, column):
+    """SQL expression for the number of days between 1970-01-01 and a date column."""
+    if dialect_name == "sqlite":
+        return cast(func.julianday(column) - SQLITE_UNIX_EPOCH_JULIAN_DAY, Integer)
+    return column - literal(date(1970, 1, 1))
+
+def overtime_hours_subquery(
+    dialect_name: str,
+    pay_period_start: date,
+    pay_period_end: date
+) -> Subquery:
+    """
+    Grouped query returning (employee_id, overtime_hours) for a pay period.
+    Hours above OVERTIME_DAILY_HOURS per day, or OVERTIME_WEEKLY_HOURS per
+    Monday-based week when OVERTIME_PERIOD is "weekly", count as overtime.
+    """
+    if settings.OVERTIME_PERIOD == "weekly":
+        # 1970-01-01 was a Thursday; shifting by 3 days aligns buckets to Mondays
+        bucket = (_days_since_epoch(dialect_name, Attendance.date) + 3) // 7
+        threshold = settings.OVERTIME_WEEKLY_HOURS
+    else:
+        bucket = Attendance.date
+        threshold = settings.OVERTIME_DAILY_HOURS
+
+    per_bucket = (
+        select(
+            Attendance.employee_id,
+            func.coalesce(func.sum(Attendance.work_hours), 0.0).label("hours")
+        )
+        .where(
+            Attendance.date >= pay_period_start,
+            Attendance.date <= pay_period_end
+        )
+        .group_by(Attendance.employee_id, bucket)
+        .subquery()
+    )
+    excess = per_bucket.c.hours - threshold
+    return (
+        select(
+            per_bucket.c.employee_id,
+            func.sum(case((excess > 0, excess), else_=0.0)).label("overtime_hours")
+        )
+        .group_by(per_bucket.c.employee_id)
+        .subquery()
+    )
+
+def overtime_pay(base_salary: np.ndarray, overtime_hours: np.ndarray) -> np.ndarray:
+    """
+    Overtime pay in cents for arrays of monthly base salaries in cents and
+    overtime hours. The hourly rate is the base salary over
+    STANDARD_MONTHLY_HOURS; hours count to the hundredth and the pay is
+    rounded once, to the cent.
+    """
+    hundredths = np.rint(np.asarray(overtime_hours, dtype=np.float64) * 100).astype(np.int64)
+    factor = Fraction(money.to_decimal(settings.OVERTIME_MULTIPLIER)) / Fraction(
+        money.to_decimal(settings.STANDARD_MONTHLY_HOURS)
+    )
+    return money.multiply_arrays(base_salary, hundredths, 100, factor)
@@ -0,0 +1,124 @@
+"""
+Keyset pagination and total counts for list endpoints.
+
+Pages are ordered by a unique key, e.g. (id) or (date, id). The key of the
+last item of a page is returned as an opaque next_cursor token; the next page
+is fetched with `WHERE key > cursor`, which uses the index instead of
+skipping over all previous rows like OFFSET does.
+"""
+import base64
+import enum
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+class CountMode(str, enum.Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the key values of the last row of a page as a cursor token."""
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, date) else value for value in values]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _cursor_value(value: Any, column) -> Any:
+    """A decoded cursor value as the Python type of its key column."""
+    python_type = column.type.python_type
+    if python_type in (date, datetime):
+        if not isinstance(value, str):
+            raise TypeError("expected an ISO date")
+        return python_type.fromisoformat(value)
+    # bool is an int subclass, but never a valid integer key
+    if isinstance(value, bool) and python_type is not bool:
+        raise TypeError("unexpected boolean")
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise TypeError(f"expected {python_type.__name__}")
+    return value
+
+def decode_cursor(token: str, key_columns: Sequence) -> list:
+    """
+    Decode a cursor token into key values typed like the key columns.
+    Tokens that do not decode, or whose values do not match the key column
+    types, are rejected with 400.
+    """
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination cursor"
+    )
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise invalid_cursor
+        return [_cursor_value(value, column) for value, column in zip(values, key_columns)]
+    except (ValueError, TypeError):
+        raise invalid_cursor
+
+def apply_page(
+    query: Select,
+    key_columns: Sequence,
+    limit: int,
+    skip: int = 0,
+    cursor: Optional[str] = None
+) -> Select:
+    """
+    Order the query by its key and restrict it to one page.
+    With a cursor the page starts after the cursor's key; otherwise `skip`
+    rows are skipped.
+    """
+    query = query.order_by(*key_columns).limit(limit)
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        if len(key_columns) == 1:
+            return query.where(key_columns[0] > values[0])
+        return query.where(tuple_(*key_columns) > tuple_(*values))
+    return query.offset(skip)
+
+def next_cursor(items: List[Any], limit: int, key_attributes: Sequence[str]) -> Optional[str]:
+    """Cursor for the page after `items`, or None if this was the last page."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor([getattr(last, attribute) for attribute in key_attributes])
+
+async def count_rows(
+    db: AsyncSession,
+    query: Select,
+    mode: CountMode = CountMode.EXACT,
+    estimate_table: Optional[str] = None
+) -> Optional[int]:
+    """
+    Count the rows matched by a query.
+
+    ESTIMATED reads the planner's row estimate for `estimate_table` on
+    PostgreSQL instead of scanning; callers pass the table only when the query
+    is unfiltered. Otherwise, or when no estimate is available, the exact
+    count is returned. NONE skips counting.
+    """
+    if mode == CountMode.NONE:
+        return None
+
+    if (
+        mode == CountMode.ESTIMATED
+        and estimate_table
+        and db.bind.dialect.name == "postgresql"
+    ):
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": estimate_table}
+        )
+        if estimate is not None and estimate >= 0:
+            return estimate
+
+    count_query = select(func.count()).select_from(query.order_by(None).subquery())
+    return await db.scalar(count_query)
@@ -0,0 +1,44 @@
+"""
+Pay period overlap checks.
+
+Overlapping payrolls of an employee are rejected by the database itself:
+PostgreSQL has the excl_payrolls_employee_period exclusion constraint on
+(employee_id, daterange(pay_period_start, pay_period_end, '[]')), backed by a
+GiST index, and SQLite a trigger of the same name over the
+idx_payrolls_employee_period index. Writers insert and handle the violation
+instead of checking first, which is one query less and free of races.
+"""
+from datetime import date
+
+from sqlalchemy import and_, func, literal_column
+from sqlalchemy.exc import IntegrityError
+
+from models import Payroll
+
+OVERLAP_CONSTRAINT = "excl_payrolls_employee_period"
+
+def period_range(start, end):
+    """Inclusive PostgreSQL daterange of a pay period."""
+    return func.daterange(start, end, literal_column("'[]'"))
+
+def overlaps_period(dialect_name: str, employee_id, start: date, end: date):
+    """
+    Condition for payrolls of `employee_id` (a value or a column) overlapping
+    the period, in the form the dialect's overlap index serves.
+    """
+    if dialect_name == "postgresql":
+        return and_(
+            Payroll.employee_id == employee_id,
+            period_range(Payroll.pay_period_start, Payroll.pay_period_end).op("&&")(
+                period_range(start, end)
+            )
+        )
+    return and_(
+        Payroll.employee_id == employee_id,
+        Payroll.pay_period_start <= end,
+        Payroll.pay_period_end >= start
+    )
+
+def is_overlap_violation(exc: IntegrityError) -> bool:
+    """Whether an IntegrityError was raised by the overlap constraint."""
+    return OVERLAP_CONSTRAINT in str(exc.orig)
@@ -0,0 +1,317 @@
+"""
+Payroll tax and deduction rules.
+
+A rule set is data, saved as a version of PayrollRuleSet (POST
+/payroll/rules). It has deductions, which are fixed amounts per period or
+rates of gross pay with an optional cap. It has progressive tax brackets,
+applied to gross pay less deductions. It can also have overrides that
+replace the brackets or the deductions for a department, a position or both.
+
+compile_rules turns a rule set into a RulePlan. The default profile and
+each override become one row of padded numpy arrays. A payroll run maps
+each employee to a row once per distinct department and position, then
+computes every amount column-wise in exact cents (see money.py). Saved
+versions never change, so compiled plans are cached by version. Without any
+saved rule set, the flat PAYROLL_DEDUCTION_RATE and PAYROLL_TAX_RATE
+settings apply. The net salary of a record is always computed, in cents, from
+its other amounts.
+"""
+import math
+from dataclasses import dataclass
+from decimal import Decimal
+from fractions import Fraction
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from config import settings
+import money
+from models import DeductionType, Employee, PayrollRuleSet
+from schemas import DeductionRule, PayrollCreate, PayrollRules, PayrollRuleSetCreate, TaxBracket
+from summaries import UNASSIGNED_DEPARTMENT
+
+# Compiled plans kept per process; a saved version never changes
+PLAN_CACHE_SIZE = 16
+_plans = TTLCache(maxsize=PLAN_CACHE_SIZE, ttl=math.inf)
+
+@dataclass
+class RulePlan:
+    """
+    A compiled rule set. Row 0 of every array is the default profile and row
+    i the profile of the i-th override. Rates are integer numerators over a
+    common denominator. Padding brackets and deductions have rate 0.
+    """
+    version: int
+    # (department_id, casefolded position, row) of each override, in order
+    matchers: List[Tuple[Optional[int], Optional[str], int]]
+    fixed_deductions: np.ndarray  # (rows,) cents per period
+    deduction_rates: np.ndarray   # (rows, percentage deductions)
+    deduction_caps: np.ndarray    # (rows, percentage deductions) cents
+    deduction_denominator: int
+    bracket_floors: np.ndarray    # (rows, brackets) cents
+    bracket_widths: np.ndarray    # (rows, brackets) cents
+    bracket_rates: np.ndarray     # (rows, brackets)
+    tax_denominator: int
+
+    def profile(self, department_id: int, position: str) -> int:
+        """Row of the first override matching an employee, 0 if none does."""
+        position = position.casefold()
+        for override_department, override_position, row in self.matchers:
+            if override_department is not None and override_department != department_id:
+                continue
+            if override_position is not None and override_position != position:
+                continue
+            return row
+        return 0
+
+    def profiles(self, department_ids: np.ndarray, positions: Sequence[str]) -> np.ndarray:
+        """Row of each employee, resolved once per distinct department and position."""
+        count = len(department_ids)
+        if not self.matchers or not count:
+            return np.zeros(count, dtype=np.intp)
+        position_keys, position_index = np.unique(
+            np.asarray(positions, dtype=object), return_inverse=True
+        )
+        department_keys, department_index = np.unique(department_ids, return_inverse=True)
+        pairs, pair_index = np.unique(
+            department_index * len(position_keys) + position_index, return_inverse=True
+        )
+        rows = np.fromiter(
+            (
+                self.profile(
+                    int(department_keys[pair // len(position_keys)]),
+                    position_keys[pair % len(position_keys)]
+                )
+                for pair in pairs.tolist()
+            ),
+            dtype=np.intp,
+            count=len(pairs)
+        )
+        return rows[pair_index]
+
+    def deductions(
+        self,
+        gross: np.ndarray,
+        profiles: np.ndarray,
+        policy: Optional[money.RoundingPolicy] = None
+    ) -> np.ndarray:
+        """
+        Total deductions in cents on gross pay in cents. Each percentage
+        deduction is rounded and capped on its own. The total never exceeds
+        the gross pay.
+        """
+        gross = np.asarray(gross, dtype=np.int64)
+        percentage = money.multiply_arrays(
+            gross[:, np.newaxis],
+            self.deduction_rates[profiles],
+            self.deduction_denominator,
+            policy=policy
+        )
+        percentage = np.minimum(percentage, self.deduction_caps[profiles])
+        return np.minimum(self.fixed_deductions[profiles] + percentage.sum(axis=1), gross)
+
+    def tax(
+        self,
+        taxable: np.ndarray,
+        profiles: np.ndarray,
+        policy: Optional[money.RoundingPolicy] = None
+    ) -> np.ndarray:
+        """Progressive tax in cents on taxable pay in cents, rounded once."""
+        taxable = np.asarray(taxable, dtype=np.int64)
+        portions = np.clip(
+            taxable[:, np.newaxis] - self.bracket_floors[profiles],
+            0,
+            self.bracket_widths[profiles]
+        )
+        return money.weighted_sum(portions, self.bracket_rates[profiles], self.tax_denominator, policy)
+
+def _denominator(rates: Iterable[money.Factor]) -> int:
+    """Least common denominator of rates."""
+    return math.lcm(1, *(Fraction(money.to_decimal(rate)).denominator for rate in rates))
+
+def _numerator(rate: money.Factor, denominator: int) -> int:
+    return int(Fraction(money.to_decimal(rate)) * denominator)
+
+def compile_rules(version: int, rules: PayrollRules) -> RulePlan:
+    """Compile a rule set into arrays with one row per profile."""
+    profiles = [(rules.tax_brackets, rules.deductions)]
+    matchers = []
+    for override in rules.overrides:
+        position = override.position.casefold() if override.position else None
+        matchers.append((override.department_id, position, len(profiles)))
+        profiles.append((
+            rules.tax_brackets if override.tax_brackets is None else override.tax_brackets,
+            rules.deductions if override.deductions is None else override.deductions,
+        ))
+
+    percentages = [
+        [deduction for deduction in deductions if deduction.type == DeductionType.PERCENTAGE]
+        for _, deductions in profiles
+    ]
+    deduction_denominator = _denominator(
+        deduction.rate for row in percentages for deduction in row
+    )
+    tax_denominator = _denominator(
+        bracket.rate for brackets, _ in profiles for bracket in brackets
+    )
+    # At least one (zero-rate) column, so that empty profiles evaluate to 0
+    deduction_columns = max(1, *(len(row) for row in percentages))
+    bracket_columns = max(1, *(len(brackets) for brackets, _ in profiles))
+
+    fixed_deductions = np.zeros(len(profiles), dtype=np.int64)
+    deduction_rates = np.zeros((len(profiles), deduction_columns), dtype=np.int64)
+    deduction_caps = np.full((len(profiles), deduction_columns), money.INT64_MAX, dtype=np.int64)
+    bracket_floors = np.zeros((len(profiles), bracket_columns), dtype=np.int64)
+    bracket_widths = np.zeros((len(profiles), bracket_columns), dtype=np.int64)
+    bracket_rates = np.zeros((len(profiles), bracket_columns), dtype=np.int64)
+    for row, (brackets, deductions) in enumerate(profiles):
+        fixed_deductions[row] = sum(
+            money.to_cents(deduction.amount)
+            for deduction in deductions if deduction.type == DeductionType.FIXED
+        )
+        for column, deduction in enumerate(percentages[row]):
+            deduction_rates[row, column] = _numerator(deduction.rate, deduction_denominator)
+            if deduction.cap is not None:
+                deduction_caps[row, column] = money.to_cents(deduction.cap)
+        floors = [money.to_cents(bracket.above) for bracket in brackets]
+        for column, bracket in enumerate(brackets):
+            bracket_floors[row, column] = floors[column]
+            # The top bracket is unbounded
+            bracket_widths[row, column] = (
+                floors[column + 1] - floors[column] if column + 1 < len(floors)
+                else money.INT64_MAX
+            )
+            bracket_rates[row, column] = _numerator(bracket.rate, tax_denominator)
+
+    return RulePlan(
+        version=version,
+        matchers=matchers,
+        fixed_deductions=fixed_deductions,
+        deduction_rates=deduction_rates,
+        deduction_caps=deduction_caps,
+        deduction_denominator=deduction_denominator,
+        bracket_floors=bracket_floors,
+        bracket_widths=bracket_widths,
+        bracket_rates=bracket_rates,
+        tax_denominator=tax_denominator,
+    )
+
+def settings_rules() -> PayrollRules:
+    """The flat settings rates as a rule set (version 0)."""
+    deductions = []
+    if settings.PAYROLL_DEDUCTION_RATE:
+        deductions.append(DeductionRule(
+            name="deductions",
+            type=DeductionType.PERCENTAGE,
+            rate=money.to_decimal(settings.PAYROLL_DEDUCTION_RATE)
+        ))
+    tax_brackets = []
+    if settings.PAYROLL_TAX_RATE:
+        tax_brackets.append(TaxBracket(above=0, rate=money.to_decimal(settings.PAYROLL_TAX_RATE)))
+    return PayrollRules(tax_brackets=tax_brackets, deductions=deductions)
+
+async def get_rule_set(db: AsyncSession, version: int) -> Optional[PayrollRuleSet]:
+    return await db.get(PayrollRuleSet, version)
+
+async def get_latest_rule_set(db: AsyncSession) -> Optional[PayrollRuleSet]:
+    return await db.scalar(
+        select(PayrollRuleSet).order_by(PayrollRuleSet.version.desc()).limit(1)
+    )
+
+async def create_rule_set(
+    db: AsyncSession,
+    rule_set: PayrollRuleSetCreate,
+    created_by: Optional[int] = None
+) -> PayrollRuleSet:
+    """Save rules as a new version, which applies from now on."""
+    db_rule_set = PayrollRuleSet(
+        rules=rule_set.model_dump(mode="json", exclude={"description"}),
+        description=rule_set.description,
+        created_by=created_by
+    )
+    db.add(db_rule_set)
+    await db.commit()
+    await db.refresh(db_rule_set)
+    return db_rule_set
+
+async def get_rule_plan(db: AsyncSession) -> RulePlan:
+    """Plan of the latest rule set, compiled on first use of its version."""
+    version = await db.scalar(select(func.max(PayrollRuleSet.version)))
+    if version is None:
+        return compile_rules(0, settings_rules())
+    plan = _plans.get(version)
+    if plan is None:
+        rule_set = await get_rule_set(db, version)
+        plan = compile_rules(version, PayrollRules.model_validate(rule_set.rules))
+        _plans.set(version, plan)
+    return plan
+
+def net_salary(
+    given: Optional[money.Amount],
+    base_salary: Optional[money.Amount],
+    overtime_pay: Optional[money.Amount],
+    deductions: Optional[money.Amount],
+    tax: Optional[money.Amount]
+) -> Decimal:
+    """
+    Base salary plus overtime less deductions and tax, computed in cents
+    (missing amounts count as 0). A given net salary must be equal to it.
+    """
+    cents = (
+        money.to_cents(base_salary) + money.to_cents(overtime_pay)
+        - money.to_cents(deductions) - money.to_cents(tax)
+    )
+    if given is not None and money.to_cents(given) != cents:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                "net_salary must equal base_salary + overtime_pay - deductions - tax "
+                f"({money.from_cents(cents)})"
+            )
+        )
+    return money.from_cents(cents)
+
+async def fill_payroll_amounts(
+    db: AsyncSession,
+    payroll: PayrollCreate,
+    employee: Employee
+) -> PayrollCreate:
+    """
+    The payroll with deductions and tax left out computed from the rules,
+    and its net salary computed from the amounts.
+    """
+    amounts = {"deductions": payroll.deductions, "tax": payroll.tax}
+    if payroll.deductions is None or payroll.tax is None:
+        plan = await get_rule_plan(db)
+        profiles = plan.profiles(
+            np.array([employee.department_id or UNASSIGNED_DEPARTMENT], dtype=np.int64),
+            [employee.position]
+        )
+        gross = np.array(
+            [money.to_cents(payroll.base_salary) + money.to_cents(payroll.overtime_pay)],
+            dtype=np.int64
+        )
+        if payroll.deductions is None:
+            deductions = plan.deductions(gross, profiles)
+        else:
+            deductions = np.array([money.to_cents(payroll.deductions)], dtype=np.int64)
+        if payroll.tax is None:
+            tax = plan.tax(gross - deductions, profiles)
+        else:
+            tax = np.array([money.to_cents(payroll.tax)], dtype=np.int64)
+        amounts = {
+            "deductions": money.from_cents(deductions[0]),
+            "tax": money.from_cents(tax[0]),
+        }
+    amounts["net_salary"] = net_salary(
+        payroll.net_salary,
+        payroll.base_salary,
+        payroll.overtime_pay,
+        amounts["deductions"],
+        amounts["tax"]
+    )
+    return payroll.model_copy(update=amounts)
@@ -0,0 +1,261 @@
+"""
+Payroll run engine.
+
+Computes payroll for every eligible employee in a pay period at once: one
+query loads the employees together with an overlap flag (anti-join against
+existing payrolls, served by the payroll period overlap index) and their
+overtime hours, the amounts are computed on whole numpy arrays of integer
+cents (see money.py), so totals are exact, with deductions and tax from the
+compiled payroll rules (see payroll_rules.py), and the results are inserted
+in batches inside a single transaction together with the dashboard payroll
+summaries.
+
+Base salaries are monthly. Pay periods may be any range of days: each
+calendar month of the period pays the monthly salary in proportion to the
+days of that month the employee was employed (from the hire date), so a
+whole calendar month pays it exactly, a half month or a mid-month hire about
+half of it, and a two-month period twice.
+"""
+import math
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import money
+from models import Employee, Payroll, PayrollStatus
+from overtime import overtime_hours_subquery, overtime_pay
+from payroll_periods import is_overlap_violation, overlaps_period
+from payroll_rules import get_rule_plan
+from result_cache import result_cache
+from summaries import UNASSIGNED_DEPARTMENT, SummaryDelta
+
+# Number of payroll rows sent per multi-row INSERT
+INSERT_BATCH_SIZE = 1000
+
+@dataclass
+class PayrollRun:
+    """
+    Column-oriented result of a payroll run; one array element per employee.
+    Amounts are int64 arrays of cents.
+    """
+    pay_period_start: date
+    pay_period_end: date
+    employee_ids: np.ndarray
+    department_ids: np.ndarray
+    base_salary: np.ndarray
+    overtime_hours: np.ndarray
+    overtime_pay: np.ndarray
+    deductions: np.ndarray
+    tax: np.ndarray
+    net_salary: np.ndarray
+    skipped_employees: int = 0
+    rule_set_version: int = 0
+
+    @property
+    def total_employees(self) -> int:
+        return len(self.employee_ids)
+
+    def summary(self) -> dict:
+        """Totals of the run, as returned by the preview and process endpoints."""
+        return {
+            "pay_period_start": self.pay_period_start,
+            "pay_period_end": self.pay_period_end,
+            "total_employees": self.total_employees,
+            "skipped_employees": self.skipped_employees,
+            "total_salary": money.from_cents(self.base_salary.sum()),
+            "total_overtime_hours": round(float(self.overtime_hours.sum()), 2),
+            "total_overtime": money.from_cents(self.overtime_pay.sum()),
+            "total_deductions": money.from_cents(self.deductions.sum()),
+            "total_tax": money.from_cents(self.tax.sum()),
+            "net_payable": money.from_cents(self.net_salary.sum()),
+            "rule_set_version": self.rule_set_version,
+        }
+
+    def summary_delta(self) -> SummaryDelta:
+        """Per-department totals of the run, for the dashboard payroll summaries."""
+        delta = SummaryDelta()
+        departments, index = np.unique(self.department_ids, return_inverse=True)
+        counts = np.bincount(index, minlength=len(departments))
+        amounts = {}
+        for column, values in (
+            ("base_salary", self.base_salary),
+            ("overtime_pay", self.overtime_pay),
+            ("deductions", self.deductions),
+            ("tax", self.tax),
+            ("net_salary", self.net_salary),
+        ):
+            # Integer sums; bincount would sum in floating point
+            totals = np.zeros(len(departments), dtype=np.int64)
+            np.add.at(totals, index, values)
+            amounts[column] = totals
+        for position, department_id in enumerate(departments.tolist()):
+            delta.payroll(
+                self.pay_period_start,
+                department_id,
+                {column: money.from_cents(totals[position]) for column, totals in amounts.items()},
+                count=int(counts[position])
+            )
+        return delta
+
+    def rows(self, status: PayrollStatus) -> List[dict]:
+        """Payroll rows ready for a bulk insert."""
+        return [
+            {
+                "employee_id": employee_id,
+                "pay_period_start": self.pay_period_start,
+                "pay_period_end": self.pay_period_end,
+                "base_salary": base_salary,
+                "overtime_pay": overtime_pay,
+                "deductions": deductions,
+                "tax": tax,
+                "net_salary": net_salary,
+                "status": status,
+            }
+            for employee_id, base_salary, overtime_pay, deductions, tax, net_salary in zip(
+                self.employee_ids.tolist(),
+                money.decimals(self.base_salary),
+                money.decimals(self.overtime_pay),
+                money.decimals(self.deductions),
+                money.decimals(self.tax),
+                money.decimals(self.net_salary),
+            )
+        ]
+
+def prorated_base_salary(
+    base_salary: np.ndarray,
+    hire_dates: np.ndarray,
+    pay_period_start: date,
+    pay_period_end: date
+) -> np.ndarray:
+    """
+    Base salary earned in a pay period, in cents, for arrays of monthly base
+    salaries in cents and hire dates (as date ordinals). Days employed in
+    each calendar month of the period count as fractions of that month; the
+    pay is rounded once, to the cent.
+    """
+    months = []
+    start = pay_period_start
+    while start <= pay_period_end:
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        end = min(next_month - timedelta(days=1), pay_period_end)
+        months.append((start.toordinal(), end.toordinal(), (next_month - start.replace(day=1)).days))
+        start = next_month
+    # Days weighted by 1/month length, as integers of 1/scale
+    scale = math.lcm(*(length for _, _, length in months))
+    units = np.zeros(len(hire_dates), dtype=np.int64)
+    for first_day, last_day, length in months:
+        days = np.clip(last_day - np.maximum(hire_dates, first_day) + 1, 0, None)
+        units += days * (scale // length)
+    return money.multiply_arrays(base_salary, units, scale)
+
+async def compute_payroll_run(
+    db: AsyncSession,
+    pay_period_start: date,
+    pay_period_end: date,
+    department_id: Optional[int] = None
+) -> PayrollRun:
+    """
+    Compute payroll for all employees hired by the end of the period, with
+    base salaries prorated to the days employed in the period. Employees that already have a payroll overlapping the period are skipped.
+    Overtime is derived from the attendance work hours of the period, and
+    deductions and tax from the latest payroll rules. Nothing is written to
+    the database.
+    """
+    dialect_name = db.bind.dialect.name
+    has_payroll = (
+        select(Payroll.id)
+        .where(overlaps_period(dialect_name, Employee.id, pay_period_start, pay_period_end))
+        .exists()
+    )
+    overtime = overtime_hours_subquery(dialect_name, pay_period_start, pay_period_end)
+    query = (
+        select(
+            Employee.id,
+            Employee.department_id,
+            Employee.base_salary,
+            has_payroll,
+            func.coalesce(overtime.c.overtime_hours, 0.0),
+            Employee.position,
+            Employee.hire_date
+        )
+        .outerjoin(overtime, overtime.c.employee_id == Employee.id)
+        .where(Employee.hire_date <= pay_period_end)
+        .order_by(Employee.id)
+    )
+    if department_id:
+        query = query.where(Employee.department_id == department_id)
+
+    rows = (await db.execute(query)).all()
+    employee_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    department_ids = np.fromiter(
+        (row[1] or UNASSIGNED_DEPARTMENT for row in rows), dtype=np.int64, count=len(rows)
+    )
+    base_salary = money.cents_array((row[2] for row in rows), count=len(rows))
+    already_paid = np.fromiter((bool(row[3]) for row in rows), dtype=bool, count=len(rows))
+    overtime_hours = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+    positions = np.array([row[5] for row in rows], dtype=object)
+    hire_dates = np.fromiter((row[6].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+
+    eligible = ~already_paid
+    employee_ids = employee_ids[eligible]
+    department_ids = department_ids[eligible]
+    base_salary = base_salary[eligible]
+    overtime_hours = overtime_hours[eligible]
+    positions = positions[eligible]
+    hire_dates = hire_dates[eligible]
+
+    plan = await get_rule_plan(db)
+    profiles = plan.profiles(department_ids, positions)
+    # Overtime is paid at the hourly rate of the monthly salary
+    overtime = overtime_pay(base_salary, overtime_hours)
+    base_salary = prorated_base_salary(base_salary, hire_dates, pay_period_start, pay_period_end)
+    gross = base_salary + overtime
+    deductions = plan.deductions(gross, profiles)
+    tax = plan.tax(gross - deductions, profiles)
+    net_salary = gross - deductions - tax
+
+    return PayrollRun(
+        pay_period_start=pay_period_start,
+        pay_period_end=pay_period_end,
+        employee_ids=employee_ids,
+        department_ids=department_ids,
+        base_salary=base_salary,
+        overtime_hours=overtime_hours,
+        overtime_pay=overtime,
+        deductions=deductions,
+        tax=tax,
+        net_salary=net_salary,
+        skipped_employees=int(already_paid.sum()),
+        rule_set_version=plan.version,
+    )
+
+async def save_payroll_run(db: AsyncSession, run: PayrollRun) -> int:
+    """
+    Insert the payroll records of a run as processed, in batches of
+    INSERT_BATCH_SIZE rows within one transaction, and add the run to the
+    dashboard summaries. Returns the number of rows. If payroll was created for
+    one of the employees since the run was computed, the overlap constraint
+    rejects the whole run (409) and it can be computed again.
+    """
+    rows = run.rows(PayrollStatus.PROCESSED)
+    try:
+        for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+            await db.execute(insert(Payroll), rows[offset:offset + INSERT_BATCH_SIZE])
+        await run.summary_delta().apply(db)
+        await db.commit()
+    except Exception as exc:
+        await db.rollback()
+        if isinstance(exc, IntegrityError) and is_overlap_violation(exc):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Payroll was created for some employees of this period meanwhile, please retry"
+            )
+        raise
+    await result_cache.invalidate(Payroll.__tablename__)
+    return len(rows)
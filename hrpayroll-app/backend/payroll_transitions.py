@@ -0,0 +1,143 @@
+"""
+Batch payroll status transitions.
+
+Processing (pending -> processed, net salary recomputed from its components)
+and paying (processed -> paid, payment date set) are applied to a whole set of
+payroll records, chosen by id or by pay period and department, with a single
+UPDATE ... WHERE status = <from> RETURNING, so records whose status changed
+meanwhile are left alone and the database reports exactly which records moved.
+The net salary is computed by the database in the same statement. Processing
+first reads the previous net salaries of the records (locking them on
+PostgreSQL) so the dashboard payroll summaries can be adjusted in the same
+transaction. Requested ids that did not move are reported as not found or
+as having the wrong status.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Employee, Payroll, PayrollStatus, TransitionOutcome
+from result_cache import result_cache
+from summaries import SummaryDelta
+
+# Status a record must have to move to each target status
+TRANSITIONS = {
+    PayrollStatus.PROCESSED: PayrollStatus.PENDING,
+    PayrollStatus.PAID: PayrollStatus.PROCESSED,
+}
+
+def net_salary_expression():
+    """Net salary of a payroll row, computed by the database."""
+    return (
+        Payroll.base_salary
+        + func.coalesce(Payroll.overtime_pay, 0)
+        - func.coalesce(Payroll.deductions, 0)
+        - func.coalesce(Payroll.tax, 0)
+    )
+
+def _selection(
+    payroll_ids: Optional[Sequence[int]],
+    pay_period_start: Optional[date],
+    pay_period_end: Optional[date],
+    department_id: Optional[int]
+) -> list:
+    criteria = []
+    if payroll_ids is not None:
+        criteria.append(Payroll.id.in_(payroll_ids))
+    if pay_period_start is not None:
+        criteria.append(Payroll.pay_period_start == pay_period_start)
+    if pay_period_end is not None:
+        criteria.append(Payroll.pay_period_end == pay_period_end)
+    if department_id:
+        criteria.append(Payroll.employee_id.in_(
+            select(Employee.id).where(Employee.department_id == department_id)
+        ))
+    return criteria
+
+async def transition_payrolls(
+    db: AsyncSession,
+    target: PayrollStatus,
+    payroll_ids: Optional[Sequence[int]] = None,
+    pay_period_start: Optional[date] = None,
+    pay_period_end: Optional[date] = None,
+    department_id: Optional[int] = None,
+    payment_date: Optional[date] = None
+) -> List[dict]:
+    """
+    Move the selected payroll records to `target` (processed or paid) and
+    commit. Returns one outcome per record moved and, when ids are given,
+    per requested id that was not.
+    """
+    source = TRANSITIONS[target]
+    criteria = _selection(payroll_ids, pay_period_start, pay_period_end, department_id)
+    values = {"status": target}
+    if target == PayrollStatus.PROCESSED:
+        values["net_salary"] = net_salary_expression()
+    else:
+        values["payment_date"] = payment_date or date.today()
+
+    previous: Dict[int, tuple] = {}
+    if target == PayrollStatus.PROCESSED:
+        # Net salaries before processing, for the summary adjustment
+        rows = await db.execute(
+            select(Payroll.id, Payroll.pay_period_start, Employee.department_id, Payroll.net_salary)
+            .join(Employee, Employee.id == Payroll.employee_id)
+            .where(*criteria, Payroll.status == source)
+            .with_for_update(of=Payroll)
+        )
+        previous = {row[0]: tuple(row[1:]) for row in rows}
+
+    moved = (await db.execute(
+        update(Payroll)
+        .where(*criteria, Payroll.status == source)
+        .values(**values)
+        .returning(Payroll.id, Payroll.net_salary, Payroll.payment_date)
+        .execution_options(synchronize_session=False)
+    )).all()
+
+    if previous:
+        delta = SummaryDelta()
+        for payroll_id, net_salary, _ in moved:
+            if payroll_id not in previous:
+                continue
+            pay_period_start, employee_department, previous_net = previous[payroll_id]
+            change = (net_salary or 0) - (previous_net or 0)
+            if change:
+                delta.payroll(pay_period_start, employee_department, {"net_salary": change}, count=0)
+        await delta.apply(db)
+
+    outcomes = [
+        {
+            "id": payroll_id,
+            "outcome": TransitionOutcome.UPDATED,
+            "status": target,
+            "net_salary": net_salary,
+            "payment_date": paid_on,
+        }
+        for payroll_id, net_salary, paid_on in moved
+    ]
+    if payroll_ids is not None:
+        missing = set(payroll_ids) - {outcome["id"] for outcome in outcomes}
+        current = {}
+        if missing:
+            current = dict((await db.execute(
+                select(Payroll.id, Payroll.status).where(Payroll.id.in_(missing))
+            )).all())
+        outcomes.extend(
+            {
+                "id": payroll_id,
+                "outcome": (
+                    TransitionOutcome.INVALID_STATUS if payroll_id in current
+                    else TransitionOutcome.NOT_FOUND
+                ),
+                "status": current.get(payroll_id),
+            }
+            for payroll_id in sorted(missing)
+        )
+
+    await db.commit()
+    if moved:
+        await result_cache.invalidate(Payroll.__tablename__)
+    return outcomes
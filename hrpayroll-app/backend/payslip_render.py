@@ -0,0 +1,173 @@
+"""
+Payslip rendering.
+
+Pure functions from a PayslipData to the bytes of an HTML page or a one-page
+PDF. They depend on the standard library only, so the rendering processes of
+payslips.py import little, and produce identical bytes for identical inputs
+(no timestamps), so rendered files can be stored under a hash of the inputs.
+The PDF is written directly: one page, the standard Helvetica fonts and a
+compressed content stream, with Courier for right-aligned amounts.
+"""
+import html
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
+
+# Bump when the layout changes, so stored payslips are rendered again
+TEMPLATE_VERSION = 1
+
+@dataclass(frozen=True)
+class PayslipData:
+    payroll_id: int
+    employee_id: int
+    first_name: str
+    last_name: str
+    position: str
+    department: Optional[str]
+    pay_period_start: date
+    pay_period_end: date
+    payment_date: Optional[date]
+    status: str
+    base_salary: Decimal
+    overtime_pay: Decimal
+    deductions: Decimal
+    tax: Decimal
+    net_salary: Decimal
+
+    @property
+    def employee_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+
+def _money(amount: Optional[Decimal]) -> str:
+    return f"{amount or 0:,.2f}"
+
+def _details(data: PayslipData) -> List[Tuple[str, str]]:
+    return [
+        ("Employee", data.employee_name),
+        ("Employee ID", str(data.employee_id)),
+        ("Position", data.position),
+        ("Department", data.department or "Unassigned"),
+        ("Pay period", f"{data.pay_period_start.isoformat()} to {data.pay_period_end.isoformat()}"),
+        ("Payment date", data.payment_date.isoformat() if data.payment_date else "Not scheduled"),
+        ("Status", data.status.capitalize()),
+    ]
+
+def _amounts(data: PayslipData) -> List[Tuple[str, str, bool]]:
+    """(label, amount, is total) rows of the earnings and deductions table."""
+    gross = (data.base_salary or 0) + (data.overtime_pay or 0)
+    return [
+        ("Base salary", _money(data.base_salary), False),
+        ("Overtime pay", _money(data.overtime_pay), False),
+        ("Gross pay", _money(gross), True),
+        ("Deductions", "-" + _money(data.deductions), False),
+        ("Tax", "-" + _money(data.tax), False),
+        ("Net pay", _money(data.net_salary), True),
+    ]
+
+def render_html(data: PayslipData, company: str) -> bytes:
+    details = "".join(
+        f"<tr><th>{html.escape(label)}</th><td>{html.escape(value)}</td></tr>"
+        for label, value in _details(data)
+    )
+    amounts = "".join(
+        ('<tr class="total">' if total else "<tr>")
+        + f"<th>{html.escape(label)}</th><td>{amount}</td></tr>"
+        for label, amount, total in _amounts(data)
+    )
+    return (
+        "<!DOCTYPE html>\n"
+        f'<html lang="en"><head><meta charset="utf-8">'
+        f"<title>Payslip {data.payroll_id}</title>"
+        "<style>body{font-family:Helvetica,Arial,sans-serif;margin:2em}"
+        "table{border-collapse:collapse;margin-bottom:1.5em}th{text-align:left;padding-right:2em}"
+        ".amounts td{text-align:right;font-family:monospace}.total{font-weight:bold}</style>"
+        "</head><body>"
+        f"<h1>{html.escape(company)}</h1><h2>Payslip</h2>"
+        f"<table>{details}</table>"
+        f'<table class="amounts">{amounts}</table>'
+        "</body></html>\n"
+    ).encode()
+
+def _pdf_text(text: str) -> str:
+    text = text.encode("cp1252", errors="replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _pdf_document(objects: Sequence[bytes]) -> bytes:
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref
+    )
+    return bytes(out)
+
+def render_pdf(data: PayslipData, company: str) -> bytes:
+    left, right, top = 50, 545, 790
+    ops = []
+
+    def text(x: float, y: float, value: str, font: str = "F1", size: int = 10) -> None:
+        ops.append(f"BT /{font} {size} Tf {x:.2f} {y} Td ({_pdf_text(value)}) Tj ET")
+
+    def rule(y: float) -> None:
+        ops.append(f"0.5 w {left} {y} m {right} {y} l S")
+
+    text(left, top, company, "F2", 16)
+    text(left, top - 24, "Payslip", "F2", 12)
+    rule(top - 34)
+    y = top - 54
+    for label, value in _details(data):
+        text(left, y, label, "F2")
+        text(left + 110, y, value)
+        y -= 16
+    rule(y + 4)
+    y -= 16
+    for label, amount, total in _amounts(data):
+        if total:
+            rule(y + 12)
+        text(left, y, label, "F2" if total else "F1")
+        # Courier glyphs are 0.6 em wide, so amounts can be right-aligned
+        text(right - 0.6 * 10 * len(amount), y, amount, "F3")
+        y -= 18 if total else 16
+
+    content = zlib.compress("\n".join(ops).encode("latin-1"), 9)
+    return _pdf_document([
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R /F2 5 0 R /F3 6 0 R >> >> /Contents 7 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content)
+        + content + b"\nendstream",
+    ])
+
+RENDERERS = {"pdf": render_pdf, "html": render_html}
+
+def render_to_store(
+    items: Sequence[Tuple[str, PayslipData]],
+    file_format: str,
+    company: str
+) -> int:
+    """
+    Render payslips and write each to its store path, atomically. Runs in a
+    rendering process; returns the number written.
+    """
+    render = RENDERERS[file_format]
+    for path, data in items:
+        content = render(data, company)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(content)
+        os.replace(temporary, path)
+    return len(items)
@@ -0,0 +1,216 @@
+"""
+Payslip generation and storage.
+
+Payslips are rendered from a payroll record and its employee by
+payslip_render.py, as PDF or HTML, on a pool of PAYSLIP_RENDER_WORKERS
+processes so that month-end batches use every core. Rendered files are stored
+under PAYSLIP_STORE_PATH, named by a hash of everything they are rendered
+from (the template version, the company name and the payslip data), so a
+payslip is rendered once and downloading it again only reads the file; when
+the payroll or the employee changes, the hash changes and it is rendered
+anew.
+
+The payslips of a whole run are streamed as a ZIP archive: payroll rows are
+read from a server-side cursor a partition at a time, each partition is
+rendered on the pool while the previous one is written to the archive, and
+archive bytes are sent as each file is added, so neither the payslips nor the
+archive are held in memory.
+"""
+import asyncio
+import enum
+import hashlib
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import date
+from typing import AsyncIterator, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models import Department, Employee, Payroll
+from payslip_render import TEMPLATE_VERSION, PayslipData, render_to_store
+
+class PayslipFormat(str, enum.Enum):
+    PDF = "pdf"
+    HTML = "html"
+
+MEDIA_TYPES = {
+    PayslipFormat.PDF: "application/pdf",
+    PayslipFormat.HTML: "text/html",
+}
+
+# Payslips sent to a rendering process at a time
+RENDER_CHUNK_SIZE = 32
+
+# Payroll rows fetched from the server-side cursor per archive partition
+ARCHIVE_PARTITION_SIZE = 512
+
+# Bytes read from a stored payslip at a time when adding it to an archive
+ARCHIVE_READ_SIZE = 64 * 1024
+
+# Spawned rather than forked: the server process runs threads and an event loop
+payslip_executor = ProcessPoolExecutor(
+    max_workers=settings.PAYSLIP_RENDER_WORKERS or os.cpu_count(),
+    mp_context=multiprocessing.get_context("spawn")
+)
+
+PAYSLIP_COLUMNS = (
+    Payroll.id, Employee.id, Employee.first_name, Employee.last_name,
+    Employee.position, Department.name, Payroll.pay_period_start,
+    Payroll.pay_period_end, Payroll.payment_date, Payroll.status,
+    Payroll.base_salary, Payroll.overtime_pay, Payroll.deductions,
+    Payroll.tax, Payroll.net_salary,
+)
+
+def payslip_query():
+    return (
+        select(*PAYSLIP_COLUMNS)
+        .join(Employee, Employee.id == Payroll.employee_id)
+        .outerjoin(Department, Department.id == Employee.department_id)
+    )
+
+def _payslip(row) -> PayslipData:
+    values = list(row)
+    # Status column
+    values[9] = values[9].value
+    return PayslipData(*values)
+
+def run_query(pay_period_start: date, pay_period_end: date, department_id: Optional[int] = None):
+    """The payslips of the payroll records of one pay period, in id order."""
+    query = payslip_query().where(
+        Payroll.pay_period_start == pay_period_start,
+        Payroll.pay_period_end == pay_period_end
+    )
+    if department_id:
+        query = query.where(Employee.department_id == department_id)
+    return query.order_by(Payroll.id)
+
+async def get_payslip(db: AsyncSession, payroll_id: int) -> Optional[PayslipData]:
+    row = (await db.execute(payslip_query().where(Payroll.id == payroll_id))).first()
+    return _payslip(row) if row else None
+
+async def run_exists(
+    db: AsyncSession,
+    pay_period_start: date,
+    pay_period_end: date,
+    department_id: Optional[int] = None
+) -> bool:
+    query = run_query(pay_period_start, pay_period_end, department_id)
+    return bool(await db.scalar(select(query.exists())))
+
+def payslip_digest(data: PayslipData, file_format: PayslipFormat) -> str:
+    inputs = [TEMPLATE_VERSION, file_format.value, settings.PROJECT_NAME, asdict(data)]
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=20).hexdigest()
+
+def store_path(data: PayslipData, file_format: PayslipFormat) -> str:
+    digest = payslip_digest(data, file_format)
+    return os.path.join(
+        settings.PAYSLIP_STORE_PATH, digest[:2], f"{digest}.{file_format.value}"
+    )
+
+async def render_payslips(
+    payslips: Sequence[PayslipData],
+    file_format: PayslipFormat
+) -> List[str]:
+    """
+    Store paths of the given payslips, rendering those not stored yet on the
+    process pool, RENDER_CHUNK_SIZE per task.
+    """
+    paths = [store_path(data, file_format) for data in payslips]
+    missing = list({
+        path: data for path, data in zip(paths, payslips) if not os.path.exists(path)
+    }.items())
+    if missing:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(
+                payslip_executor,
+                render_to_store,
+                missing[offset:offset + RENDER_CHUNK_SIZE],
+                file_format.value,
+                settings.PROJECT_NAME
+            )
+            for offset in range(0, len(missing), RENDER_CHUNK_SIZE)
+        ))
+    return paths
+
+def payslip_filename(data: PayslipData, file_format: PayslipFormat) -> str:
+    return f"payslip-{data.payroll_id}.{file_format.value}"
+
+class _ArchiveBuffer:
+    """Write-only stream collecting the bytes zipfile writes until drained."""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _archive_payslips(
+    archive: zipfile.ZipFile,
+    buffer: _ArchiveBuffer,
+    payslips: Sequence[PayslipData],
+    paths: Sequence[str],
+    file_format: PayslipFormat
+) -> Iterator[bytes]:
+    """Add stored payslips to an archive, yielding the bytes written for each."""
+    for data, path in zip(payslips, paths):
+        info = zipfile.ZipInfo(
+            payslip_filename(data, file_format),
+            date_time=data.pay_period_end.timetuple()[:6]
+        )
+        info.compress_type = archive.compression
+        with archive.open(info, "w") as entry, open(path, "rb") as file:
+            while chunk := file.read(ARCHIVE_READ_SIZE):
+                entry.write(chunk)
+        yield buffer.drain()
+
+async def stream_run_archive(
+    db: AsyncSession,
+    pay_period_start: date,
+    pay_period_end: date,
+    file_format: PayslipFormat,
+    department_id: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of the payslips of a pay period as it is written."""
+    buffer = _ArchiveBuffer()
+    # PDF content is already compressed
+    compression = zipfile.ZIP_STORED if file_format == PayslipFormat.PDF else zipfile.ZIP_DEFLATED
+    result = await db.stream(
+        run_query(pay_period_start, pay_period_end, department_id)
+        .execution_options(yield_per=ARCHIVE_PARTITION_SIZE)
+    )
+    with zipfile.ZipFile(buffer, "w", compression=compression) as archive:
+        pending = None
+        async for partition in result.partitions():
+            payslips = [_payslip(row) for row in partition]
+            # Render this partition while the previous one is archived
+            rendering = asyncio.ensure_future(render_payslips(payslips, file_format))
+            if pending is not None:
+                previous, previous_rendering = pending
+                for data in _archive_payslips(
+                    archive, buffer, previous, await previous_rendering, file_format
+                ):
+                    yield data
+            pending = (payslips, rendering)
+        if pending is not None:
+            previous, previous_rendering = pending
+            for data in _archive_payslips(
+                archive, buffer, previous, await previous_rendering, file_format
+            ):
+                yield data
+    yield buffer.drain()
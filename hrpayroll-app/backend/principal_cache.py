@@ -0,0 +1,96 @@
+"""
+Cache of authenticated principals.
+
+Authenticated requests used to load the user row for every call. Principals
+are cached by token subject (username), issued-at time and the subject's
+generation, first in an in-process LRU and, with CACHE_BACKEND set, in the
+shared store. crud invalidates a subject whenever the user is updated or
+deleted by incrementing its generation (atomically in the shared store), so
+entries cached under an older generation are never served again, by any
+worker, and a principal loaded before an invalidation cannot be stored
+under the new generation. Without a shared store the local TTL bounds how
+long another worker may still serve the old principal. Password hashes are
+never cached.
+"""
+from collections import Counter
+from typing import Optional
+
+from cache import CacheBackend, TTLCache, shared_backend
+from config import settings
+from schemas import UserResponse
+
+# Shared generations must outlive the entries stored under them
+GENERATION_TTL_SECONDS = 7 * 24 * 3600
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: float, backend: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+        self.backend = backend
+        # Generations of this process, used without a shared store
+        self._generations: Counter = Counter()
+
+    @staticmethod
+    def _generation_key(subject: str) -> str:
+        return f"principal-generation:{subject}"
+
+    @staticmethod
+    def _backend_key(subject: str, generation: int, issued_at: Optional[int]) -> str:
+        return f"principal:{subject}:{generation}:{issued_at}"
+
+    async def generation(self, subject: str) -> int:
+        """
+        Current generation of a subject. Read it before loading the user, and
+        pass it to get() and set().
+        """
+        if self.backend is None:
+            return self._generations[subject]
+        return int(await self.backend.get(self._generation_key(subject)) or 0)
+
+    async def get(
+        self,
+        subject: str,
+        issued_at: Optional[int],
+        generation: int
+    ) -> Optional[UserResponse]:
+        """Get the cached principal for a token, or None."""
+        local_key = (subject, generation, issued_at)
+        principal = self.local.get(local_key)
+        if principal is not None or self.backend is None:
+            return principal
+
+        raw = await self.backend.get(self._backend_key(subject, generation, issued_at))
+        if raw is None:
+            return None
+        principal = UserResponse.model_validate_json(raw)
+        self.local.set(local_key, principal)
+        return principal
+
+    async def set(
+        self,
+        subject: str,
+        issued_at: Optional[int],
+        generation: int,
+        principal: UserResponse
+    ) -> None:
+        """Cache the principal of a token, loaded under `generation`."""
+        self.local.set((subject, generation, issued_at), principal)
+        if self.backend is not None:
+            await self.backend.set(
+                self._backend_key(subject, generation, issued_at),
+                principal.model_dump_json(),
+                self.ttl
+            )
+
+    async def invalidate(self, subject: str) -> None:
+        """Stop serving every cached principal of a subject."""
+        self._generations[subject] += 1
+        self.local.delete_where(lambda key: key[0] == subject)
+        if self.backend is not None:
+            await self.backend.incr(self._generation_key(subject), GENERATION_TTL_SECONDS)
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    backend=shared_backend
+)
@@ -0,0 +1,325 @@
+"""
+Write-behind queue for single time-clock punches.
+
+Devices send one punch per request. Instead of one transaction per punch,
+each punch is appended to a local spool file and acknowledged once the spool
+has been fsynced, then written to the database in micro-batches of up to
+PUNCH_BATCH_SIZE events, or whatever arrived within
+PUNCH_FLUSH_INTERVAL_SECONDS, through attendance_ingest (one transaction per
+batch).
+
+Durability: punches arriving together share one write and fsync of the spool
+(group commit). After a batch is committed, the spool offset up to which all
+punches are in the database is saved in a checkpoint file next to the spool,
+and the spool is truncated once everything in it has been written. On
+startup, punches after the checkpoint are replayed. The attendance upsert
+keeps the earliest check-in and latest check-out, so a punch replayed after a
+crash between commit and checkpoint does not change the result.
+
+Failed batches: database errors of the connection (operational errors) are
+retried with backoff, at most PUNCH_WRITE_MAX_ATTEMPTS times per batch;
+other errors are caused by the punches themselves, so the batch is split in
+halves to write every punch but the faulty ones. Punches that cannot be
+written, and punches rejected by the ingestion (e.g. of an employee deleted
+since the punch was accepted), are appended to a dead-letter file next to the
+spool (the same NDJSON punches, which can be posted again to
+/attendance/punches) and the checkpoint moves past them, so one bad punch
+never stalls the queue. A batch whose dead-letter or checkpoint write fails
+is recorded again after a delay.
+
+Back-pressure: at most PUNCH_QUEUE_MAX_PENDING punches may be accepted but
+not yet written; further punches are answered with 429. Each worker process
+needs its own spool path, which is locked while the queue runs; a process
+that cannot open and lock its spool does not start the queue, and its
+punches are written directly.
+"""
+import asyncio
+import logging
+import os
+from typing import List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from attendance_ingest import ingest_punches
+from config import settings
+from database import AsyncSessionLocal
+from schemas import PunchEvent
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Delay before retrying a batch after a database error, doubled up to the maximum
+RETRY_DELAY_SECONDS = 0.5
+MAX_RETRY_DELAY_SECONDS = 30.0
+
+def _is_operational(exc: Exception) -> bool:
+    """Whether an error is of the database connection rather than of the punches."""
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, (OSError, asyncio.TimeoutError))
+
+class PunchQueue:
+    def __init__(
+        self,
+        spool_path: str,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        max_attempts: int,
+        session_factory=AsyncSessionLocal
+    ):
+        self.spool_path = spool_path
+        self.checkpoint_path = spool_path + ".checkpoint"
+        self.dead_letter_path = spool_path + ".dead"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self.running = False
+        # Accepted punches not yet committed to the database
+        self.pending = 0
+        self._spool_file = None
+        self._to_spool: List[Tuple[bytes, PunchEvent, asyncio.Future]] = []
+        self._spool_ready = asyncio.Event()
+        self._spool_lock = asyncio.Lock()
+        # (event, spool offset just after the event)
+        self._to_write: "asyncio.Queue[Tuple[PunchEvent, int]]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    # Spool file operations, run in a thread
+    def _open_spool(self) -> List[Tuple[PunchEvent, int]]:
+        """Open and lock the spool and return the punches after the checkpoint."""
+        directory = os.path.dirname(self.spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._spool_file = open(self.spool_path, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._spool_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._spool_file.close()
+                self._spool_file = None
+                raise RuntimeError(f"Punch spool {self.spool_path} is used by another process")
+
+        checkpoint = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = int(checkpoint_file.read().strip() or 0)
+
+        self._spool_file.seek(checkpoint)
+        replay = []
+        offset = checkpoint
+        for line in self._spool_file:
+            if not line.endswith(b"\n"):
+                # Torn write from a crash; this punch was never acknowledged
+                self._spool_file.truncate(offset)
+                break
+            offset += len(line)
+            replay.append((PunchEvent.model_validate_json(line), offset))
+        self._spool_file.seek(0, os.SEEK_END)
+        return replay
+
+    def _append(self, data: bytes) -> int:
+        """Append to the spool, fsync it and return its new size."""
+        self._spool_file.write(data)
+        self._spool_file.flush()
+        os.fsync(self._spool_file.fileno())
+        return self._spool_file.tell()
+
+    def _dead_letter(self, events: List[PunchEvent]) -> None:
+        """Append punches that cannot be written to the dead-letter file and fsync it."""
+        with open(self.dead_letter_path, "ab") as dead_letter_file:
+            dead_letter_file.write(b"".join(
+                event.model_dump_json().encode() + b"\n" for event in events
+            ))
+            dead_letter_file.flush()
+            os.fsync(dead_letter_file.fileno())
+
+    def _checkpoint(self, offset: int) -> None:
+        """Record that the spool is in the database up to `offset`."""
+        if offset == self._spool_file.tell():
+            # Everything spooled is written: start the spool afresh
+            self._spool_file.truncate(0)
+            self._spool_file.seek(0)
+            offset = 0
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            checkpoint_file.write(str(offset))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+    # Lifecycle
+    async def start(self) -> None:
+        """Open the spool, queue the punches left from a previous run and start writing."""
+        replay = await asyncio.to_thread(self._open_spool)
+        for event, offset in replay:
+            self._to_write.put_nowait((event, offset))
+        self.pending = len(replay)
+        if replay:
+            logger.info(f"Replaying {len(replay)} spooled punches")
+
+        self.running = True
+        self._tasks = [
+            asyncio.create_task(self._spool_loop()),
+            asyncio.create_task(self._write_loop()),
+        ]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop accepting punches and write the queued ones, waiting at most
+        `timeout` seconds. Punches left unwritten stay in the spool.
+        """
+        self.running = False
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.pending} punches left in the spool for the next start")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._spool_file is not None:
+            self._spool_file.close()
+            self._spool_file = None
+
+    async def _drain(self) -> None:
+        while self.pending:
+            await asyncio.sleep(0.01)
+
+    # Producers
+    async def submit(self, event: PunchEvent) -> None:
+        """Accept a punch; returns once it is durably spooled."""
+        if not self.running:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Punch queue is not running"
+            )
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many punches waiting to be recorded, please retry",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        future = asyncio.get_running_loop().create_future()
+        self._to_spool.append((event.model_dump_json().encode() + b"\n", event, future))
+        self._spool_ready.set()
+        await future
+
+    # Background tasks
+    async def _spool_loop(self) -> None:
+        """Append waiting punches to the spool with one write and fsync per group."""
+        while True:
+            await self._spool_ready.wait()
+            self._spool_ready.clear()
+            group, self._to_spool = self._to_spool, []
+            if not group:
+                continue
+
+            data = b"".join(line for line, _, _ in group)
+            try:
+                async with self._spool_lock:
+                    end = await asyncio.to_thread(self._append, data)
+            except Exception as exc:
+                logger.error(f"Failed to spool {len(group)} punches: {exc}")
+                self.pending -= len(group)
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Punch could not be recorded"
+                        ))
+                continue
+
+            offset = end - len(data)
+            for line, event, future in group:
+                offset += len(line)
+                self._to_write.put_nowait((event, offset))
+                if not future.done():
+                    future.set_result(None)
+
+    async def _next_batch(self) -> List[Tuple[PunchEvent, int]]:
+        """Wait for a punch, then collect more until the batch is full or the interval ends."""
+        batch = [await self._to_write.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._to_write.empty():
+                batch.append(self._to_write.get_nowait())
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._to_write.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, events: List[PunchEvent]) -> None:
+        """
+        Write punches to the database. Operational errors are retried, and
+        the punches dead-lettered after the last attempt. On other errors a
+        batch is written in halves and a single punch that still fails is
+        dead-lettered.
+        """
+        delay = RETRY_DELAY_SECONDS
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self.session_factory() as db:
+                    result = await ingest_punches(db, events)
+            except Exception as exc:
+                error = exc
+                if not _is_operational(exc) or attempt == self.max_attempts:
+                    break
+                logger.error(f"Failed to write {len(events)} punches, retrying: {exc}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+                continue
+            if result.rejected:
+                for rejected in result.rejected:
+                    logger.warning(f"Rejected punch {events[rejected['index']]}: {rejected['error']}")
+                await asyncio.to_thread(
+                    self._dead_letter, [events[rejected["index"]] for rejected in result.rejected]
+                )
+            return
+
+        if len(events) > 1 and not _is_operational(error):
+            middle = len(events) // 2
+            await self._write(events[:middle])
+            await self._write(events[middle:])
+            return
+        logger.error(f"Moving {len(events)} punches to {self.dead_letter_path}: {error}")
+        await asyncio.to_thread(self._dead_letter, events)
+
+    async def _write_loop(self) -> None:
+        """Write micro-batches to the database and checkpoint past each of them."""
+        while True:
+            batch = await self._next_batch()
+            delay = RETRY_DELAY_SECONDS
+            while True:
+                try:
+                    await self._write([event for event, _ in batch])
+                    async with self._spool_lock:
+                        await asyncio.to_thread(self._checkpoint, batch[-1][1])
+                    break
+                except Exception as exc:
+                    # Writing the batch again is harmless: the upsert is idempotent
+                    logger.exception(f"Failed to record {len(batch)} punches, retrying: {exc}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+            self.pending -= len(batch)
+
+punch_queue = PunchQueue(
+    spool_path=settings.PUNCH_SPOOL_PATH,
+    batch_size=settings.PUNCH_BATCH_SIZE,
+    flush_interval=settings.PUNCH_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.PUNCH_QUEUE_MAX_PENDING,
+    max_attempts=settings.PUNCH_WRITE_MAX_ATTEMPTS
+)
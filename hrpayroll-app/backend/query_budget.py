@@ -0,0 +1,107 @@
+"""
+SQL statement counting and per-endpoint query budgets.
+
+Every statement sent to the database by any engine is counted against the
+counters active in the current context, so concurrent requests are counted
+separately and nested counters all see the statements. Tests can wrap calls in count_queries(), or set
+QUERY_BUDGET_MODE to "raise" so that QueryBudgetMiddleware fails a request
+when a known endpoint issues more statements than its budget, e.g. after a
+relationship starts being lazy-loaded per row (N+1 queries).
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Maximum statements per request, keyed by (method, route path). Budgets include
+# the lookup of the authenticated user on a principal cache miss and, for
+# routes with an HTTP cache policy or cached results, the reads of the table
+# versions.
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("GET", f"{settings.API_V1_PREFIX}/employees/"): 4,
+    ("GET", f"{settings.API_V1_PREFIX}/employees/search"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/employees/directory"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/employees/{{employee_id}}"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/employees/{{employee_id}}/attendance"): 5,
+    ("GET", f"{settings.API_V1_PREFIX}/departments/"): 4,
+    ("GET", f"{settings.API_V1_PREFIX}/departments/{{department_id}}"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/departments/{{department_id}}/employees"): 5,
+    ("GET", f"{settings.API_V1_PREFIX}/departments/statistics"): 5,
+    ("GET", f"{settings.API_V1_PREFIX}/departments/{{department_id}}/statistics"): 5,
+    ("GET", f"{settings.API_V1_PREFIX}/payroll/"): 4,
+    ("GET", f"{settings.API_V1_PREFIX}/payroll/summary"): 6,
+    ("GET", f"{settings.API_V1_PREFIX}/payroll/{{payroll_id}}"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/payroll/{{payroll_id}}/payslip"): 2,
+    ("GET", f"{settings.API_V1_PREFIX}/attendance/summary"): 6,
+    ("GET", f"{settings.API_V1_PREFIX}/dashboard/stats"): 7,
+    ("GET", f"{settings.API_V1_PREFIX}/dashboard/charts"): 6,
+    ("GET", f"{settings.API_V1_PREFIX}/dashboard/activities"): 4,
+    ("GET", f"{settings.API_V1_PREFIX}/jobs/{{job_id}}"): 2,
+}
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request issues more SQL statements than its budget."""
+
+class QueryCounter:
+    """Statements executed while the counter was active."""
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+_active_counters: ContextVar[Tuple[QueryCounter, ...]] = ContextVar(
+    "query_counters", default=()
+)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Count the SQL statements executed within the block."""
+    counter = QueryCounter()
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+def check_query_budget(method: str, route_path: str, counter: QueryCounter) -> None:
+    """Raise QueryBudgetExceeded if a known endpoint went over its budget."""
+    budget = QUERY_BUDGETS.get((method, route_path))
+    if budget is not None and counter.count > budget:
+        raise QueryBudgetExceeded(
+            f"{method} {route_path} executed {counter.count} SQL statements, "
+            f"budget is {budget}:\n" + "\n".join(counter.statements)
+        )
+
+class QueryBudgetMiddleware(BaseHTTPMiddleware):
+    """
+    Count the statements of each request and check them against QUERY_BUDGETS.
+    Violations are logged in "warn" mode and raised in "raise" mode.
+    """
+    async def dispatch(self, request, call_next):
+        with count_queries() as counter:
+            response = await call_next(request)
+
+        route = request.scope.get("route")
+        if route is not None:
+            try:
+                check_query_budget(request.method, route.path, counter)
+            except QueryBudgetExceeded as exc:
+                if settings.QUERY_BUDGET_MODE == "raise":
+                    raise
+                logger.warning(str(exc).splitlines()[0])
+        return response
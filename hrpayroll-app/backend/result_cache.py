@@ -0,0 +1,98 @@
+"""
+Cache of aggregate results.
+
+Department statistics and the payroll and attendance summaries are pure
+functions of table contents. Their results are cached by endpoint and
+parameters, first in an in-process LRU and optionally in a shared
+CacheBackend (CACHE_BACKEND), and each entry records the shared versions of
+the tables it was computed from (table_versions, see change_tracking.py),
+read before computing. An entry is only served while those versions are
+unchanged, so a write committed by any process, API worker or job worker,
+is seen by the next read, consistently with the ETags of http_cache.py.
+Writers also invalidate the tags of the tables they wrote after committing
+(crud and the bulk writers), which drops local entries early. Hits and
+misses are counted per endpoint.
+"""
+import json
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import CacheBackend, TTLCache, shared_backend
+from change_tracking import get_table_versions
+from config import settings
+
+class ResultCache:
+    def __init__(self, maxsize: int, ttl: float, backend: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+        self.backend = backend
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    @staticmethod
+    def _key(endpoint: str, params: Mapping[str, Any]) -> str:
+        query = "&".join(
+            f"{name}={value}" for name, value in sorted(params.items()) if value is not None
+        )
+        return f"{endpoint}?{query}"
+
+    async def get_or_compute(
+        self,
+        db: AsyncSession,
+        endpoint: str,
+        params: Mapping[str, Any],
+        tags: Sequence[str],
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        The cached result of `endpoint` for `params`, or the result of
+        `compute()`, cached under the given tables (names of
+        change_tracking.VERSIONED_TABLES). Results are stored JSON-encoded
+        (dates as ISO strings).
+        """
+        tags = tuple(sorted(tags))
+        key = self._key(endpoint, params)
+        local_key = (key, tags)
+        versions = await get_table_versions(db, tags)
+
+        entry = self.local.get(local_key)
+        if entry is not None and entry["versions"] == versions:
+            self.hits[endpoint] += 1
+            return entry["value"]
+        if self.backend is not None:
+            raw = await self.backend.get(f"result:{key}")
+            if raw is not None:
+                entry = json.loads(raw)
+                if entry["versions"] == versions:
+                    self.hits[endpoint] += 1
+                    self.local.set(local_key, entry)
+                    return entry["value"]
+
+        self.misses[endpoint] += 1
+        # Under the versions read before computing: a result computed across
+        # a write is never served once the write is visible
+        entry = {"versions": versions, "value": jsonable_encoder(await compute())}
+        self.local.set(local_key, entry)
+        if self.backend is not None:
+            await self.backend.set(f"result:{key}", json.dumps(entry), self.ttl)
+        return entry["value"]
+
+    async def invalidate(self, *tags: str) -> None:
+        """Drop the local results computed from any of the given tables."""
+        self.local.delete_where(lambda key: not set(key[1]).isdisjoint(tags))
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Hits and misses per endpoint since the process started."""
+        return {
+            endpoint: {"hits": self.hits[endpoint], "misses": self.misses[endpoint]}
+            for endpoint in sorted(set(self.hits) | set(self.misses))
+        }
+
+result_cache = ResultCache(
+    maxsize=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    backend=shared_backend
+)
@@ -3,6 +3,9 @@ from .auth import router as auth_router
 from .employees import router as employees_router
 from .payroll import router as payroll_router
 from .departments import router as departments_router
+from .dashboard import router as dashboard_router
+from .attendance import router as attendance_router
+from .jobs import router as jobs_router
 
 # Create main router for all API routes
 api_router = APIRouter()
@@ -12,3 +15,6 @@ api_router.include_router(auth_router)
 api_router.include_router(employees_router)
 api_router.include_router(payroll_router)
 api_router.include_router(departments_router)
+api_router.include_router(dashboard_router)
+api_router.include_router(attendance_router)
+api_router.include_router(jobs_router)
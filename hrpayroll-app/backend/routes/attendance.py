@@ -0,0 +1,150 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
+
+from database import get_async_db
+from schemas import AttendanceSummary, JobResponse, PunchBatch, PunchBatchResult, PunchEvent
+from models import User
+from auth import check_hr_permission
+from config import settings
+from file_formats import FileFormat, export_headers, export_media_type, stream_query
+from result_cache import result_cache
+import attendance_export
+import attendance_ingest
+import crud
+import jobs
+import summaries
+from punch_queue import punch_queue
+
+router = APIRouter(
+    prefix="/attendance",
+    tags=["attendance"]
+)
+
+@router.get("/summary", response_model=AttendanceSummary)
+async def get_attendance_summary(
+    day: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Present, absent, on-leave and half-day counts of a day (default today),
+    as shares of the headcount, and the attendance rate of the days leading
+    up to it. Read from the summary tables and cached until attendance or
+    employees change.
+    """
+    day = day or date.today()
+    return await result_cache.get_or_compute(
+        db,
+        "attendance_summary",
+        {"day": day, "days": settings.DASHBOARD_ATTENDANCE_DAYS},
+        ("attendances", "employees"),
+        lambda: summaries.get_attendance_summary(db, day, settings.DASHBOARD_ATTENDANCE_DAYS)
+    )
+
+@router.get("/export")
+async def export_attendance(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    department_id: Optional[int] = None,
+    file_format: FileFormat = Query(FileFormat.CSV, alias="format"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Download attendance records as CSV or NDJSON, optionally gzip-compressed.
+    Rows are streamed from a server-side cursor as the query produces them.
+    """
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="End date must be after start date"
+        )
+    
+    return StreamingResponse(
+        stream_query(
+            db,
+            attendance_export.export_query(start_date, end_date, department_id),
+            attendance_export.EXPORT_COLUMNS,
+            file_format,
+            compress=gzip
+        ),
+        media_type=export_media_type(file_format, gzip),
+        headers=export_headers("attendance", file_format, gzip)
+    )
+
+@router.post("/export", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_attendance_export(
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    department_id: Optional[int] = None,
+    file_format: FileFormat = Query(FileFormat.CSV, alias="format"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Export attendance records as GET /attendance/export does, as a background
+    job. The file is downloaded from the job's result once it has succeeded.
+    """
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="End date must be after start date"
+        )
+    
+    job = await jobs.submit_job(
+        db,
+        "attendance_export",
+        {
+            "start_date": start_date,
+            "end_date": end_date,
+            "department_id": department_id,
+            "format": file_format,
+            "gzip": gzip,
+        },
+        created_by=current_user.id
+    )
+    response.headers["Location"] = jobs.job_location(job)
+    return job
+
+@router.post("/punches", response_model=PunchBatchResult)
+async def ingest_punches(
+    batch: PunchBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Record a batch of time-clock check-in/check-out events. Each employee and
+    day keeps its earliest check-in and latest check-out; work hours are
+    recomputed and the batch is committed at once. Events of unknown
+    employees are rejected.
+    """
+    return await attendance_ingest.ingest_punches(db, batch.events)
+
+@router.post("/punch", status_code=status.HTTP_202_ACCEPTED)
+async def record_punch(
+    event: PunchEvent,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Record a single time-clock event of an existing employee. The punch is
+    acknowledged once it is durably spooled and is written to the database
+    with others in a batch.
+    """
+    if not await crud.get_employee(db, event.employee_id, options=()):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Employee not found"
+        )
+    
+    if punch_queue.running:
+        await punch_queue.submit(event)
+    else:
+        await attendance_ingest.ingest_punches(db, [event])
+    return {"status": "accepted"}
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from database import get_db
+from database import get_async_db
 from schemas import Token, UserCreate, UserResponse
 from models import User
 import crud
 from auth import (
-    verify_password,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     get_current_active_user,
     check_admin_permission
@@ -23,13 +24,13 @@ router = APIRouter(
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     OAuth2 compatible token login, get an access token for future requests.
     """
-    user = crud.get_user_by_username(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await crud.get_user_by_username(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -47,14 +48,14 @@ async def login(
 @router.post("/register", response_model=UserResponse)
 async def register(
     user: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_admin_permission)
 ):
     """
     Register a new user. Only administrators can register new users.
     """
     # Check if user with same email exists
-    db_user = crud.get_user_by_email(db, user.email)
+    db_user = await crud.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -62,14 +63,14 @@ async def register(
         )
     
     # Check if user with same username exists
-    db_user = crud.get_user_by_username(db, user.username)
+    db_user = await crud.get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    return crud.create_user(db, user)
+    return await crud.create_user(db, user)
 
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
@@ -83,12 +84,14 @@ async def change_password(
     old_password: str,
     new_password: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Change the password for the current user.
     """
-    if not verify_password(old_password, current_user.hashed_password):
+    # The authenticated principal does not carry the password hash
+    db_user = await crud.get_user(db, current_user.id)
+    if not await verify_password_async(old_password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
@@ -100,7 +103,7 @@ async def change_password(
             detail="Password must be at least 8 characters long"
         )
     
-    user_update = {"password": new_password}
-    updated_user = crud.update_user(db, current_user.id, user_update)
+    hashed_password = await get_password_hash_async(new_password)
+    updated_user = await crud.update_user_password(db, current_user.id, hashed_password)
     
     return updated_user
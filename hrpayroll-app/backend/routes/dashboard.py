@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from datetime import date
+
+from database import get_async_db
+from schemas import DashboardStats, DashboardCharts, DashboardActivity, JobResponse
+from models import User
+from auth import check_admin_permission, check_hr_permission
+from config import settings
+import jobs
+import summaries
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["dashboard"]
+)
+
+@router.get("/stats", response_model=DashboardStats)
+async def get_dashboard_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Headcount, this month's payroll and the recent attendance rate, with
+    growth against the previous month. Read from the summary tables.
+    """
+    return await summaries.get_dashboard_stats(
+        db, date.today(), settings.DASHBOARD_ATTENDANCE_DAYS
+    )
+
+@router.get("/charts", response_model=DashboardCharts)
+async def get_dashboard_charts(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Employees per department, monthly payroll per department and the daily
+    attendance rate. Read from the summary tables.
+    """
+    return await summaries.get_dashboard_charts(
+        db,
+        date.today(),
+        settings.DASHBOARD_TREND_MONTHS,
+        settings.DASHBOARD_ATTENDANCE_DAYS
+    )
+
+@router.get("/activities", response_model=List[DashboardActivity])
+async def get_dashboard_activities(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Most recently added employees and payroll records, newest first.
+    """
+    return await summaries.get_recent_activities(db, limit)
+
+@router.post("/rebuild", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_dashboard_summaries(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_admin_permission)
+):
+    """
+    Recompute the dashboard summary tables from the employee, payroll and
+    attendance tables as a background job, e.g. after a data repair.
+    """
+    job = await jobs.submit_job(db, "rebuild_summaries", {}, created_by=current_user.id)
+    response.headers["Location"] = jobs.job_location(job)
+    return job
@@ -1,18 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from database import get_db
+from database import get_async_db
 from schemas import (
     DepartmentCreate,
     DepartmentUpdate,
     DepartmentResponse,
     DepartmentList,
+    DepartmentStatistics,
     EmployeeList
 )
 from models import User
 from auth import get_current_active_user, check_hr_permission
+from pagination import CountMode, next_cursor
+from result_cache import result_cache
 import crud
+import department_stats
+
+# Tables department statistics are computed from
+STATISTICS_TABLES = ("departments", "employees")
 
 router = APIRouter(
     prefix="/departments",
@@ -22,16 +29,14 @@ router = APIRouter(
 @router.post("/", response_model=DepartmentResponse)
 async def create_department(
     department: DepartmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Create a new department. Only HR and admin users can create departments.
     """
     # Check if department with same name exists
-    existing_dept = db.query(crud.Department).filter(
-        crud.Department.name == department.name
-    ).first()
+    existing_dept = await crud.get_department_by_name(db, department.name)
     
     if existing_dept:
         raise HTTPException(
@@ -39,40 +44,62 @@ async def create_department(
             detail="Department with this name already exists"
         )
     
-    return crud.create_department(db, department)
+    return await crud.create_department(db, department)
 
 @router.get("/", response_model=DepartmentList)
 async def list_departments(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     List all departments with optional search filter.
+    Pass the returned next_cursor as `cursor` to fetch the following page.
     """
-    departments = crud.get_departments(
+    departments = await crud.get_departments(
         db,
         skip=skip,
         limit=limit,
-        search=search
+        search=search,
+        cursor=cursor
     )
     return {
-        "total": len(departments),
-        "items": departments
+        "total": await crud.count_departments(db, search=search, mode=count),
+        "items": departments,
+        "next_cursor": next_cursor(departments, limit, ("id",))
     }
 
+@router.get("/statistics", response_model=List[DepartmentStatistics])
+async def list_department_statistics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Get the statistics of every department, computed in one grouped query.
+    Results are cached until departments or employees change.
+    """
+    return await result_cache.get_or_compute(
+        db,
+        "department_statistics",
+        {},
+        STATISTICS_TABLES,
+        lambda: department_stats.get_department_statistics(db)
+    )
+
 @router.get("/{department_id}", response_model=DepartmentResponse)
 async def get_department(
     department_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Get detailed information about a specific department.
     """
-    department = crud.get_department(db, department_id)
+    department = await crud.get_department(db, department_id)
     if not department:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -84,14 +111,14 @@ async def get_department(
 async def update_department(
     department_id: int,
     department_update: DepartmentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Update a department's information. Only HR and admin users can update departments.
     """
     # Verify department exists
-    existing_dept = crud.get_department(db, department_id)
+    existing_dept = await crud.get_department(db, department_id)
     if not existing_dept:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -100,42 +127,40 @@ async def update_department(
     
     # If name is being updated, check it's not already taken
     if department_update.name and department_update.name != existing_dept.name:
-        name_exists = db.query(crud.Department).filter(
-            crud.Department.name == department_update.name
-        ).first()
+        name_exists = await crud.get_department_by_name(db, department_update.name)
         if name_exists:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Department with this name already exists"
             )
     
-    updated_department = crud.update_department(db, department_id, department_update)
+    updated_department = await crud.update_department(db, department_id, department_update)
     return updated_department
 
 @router.delete("/{department_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_department(
     department_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Delete a department. Only HR and admin users can delete departments.
     """
     # Check if department has any employees
-    department = crud.get_department(db, department_id)
+    department = await crud.get_department(db, department_id)
     if not department:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Department not found"
         )
     
-    if department.employees:
+    if await crud.department_has_employees(db, department_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete department with existing employees"
         )
     
-    success = crud.delete_department(db, department_id)
+    success = await crud.delete_department(db, department_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -148,65 +173,61 @@ async def list_department_employees(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     List all employees in a specific department.
+    Pass the returned next_cursor as `cursor` to fetch the following page.
     """
     # Verify department exists
-    department = crud.get_department(db, department_id)
+    department = await crud.get_department(db, department_id)
     if not department:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Department not found"
         )
     
-    employees = crud.get_employees(
+    employees = await crud.get_employees(
         db,
         skip=skip,
         limit=limit,
         search=search,
-        department_id=department_id
+        department_id=department_id,
+        cursor=cursor
     )
     
     return {
-        "total": len(employees),
-        "items": employees
+        "total": await crud.count_employees(
+            db, search=search, department_id=department_id, mode=count
+        ),
+        "items": employees,
+        "next_cursor": next_cursor(employees, limit, ("id",))
     }
 
-@router.get("/{department_id}/statistics")
+@router.get("/{department_id}/statistics", response_model=DepartmentStatistics)
 async def get_department_statistics(
     department_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
-    Get statistics about a department including employee count, average salary, etc.
+    Get statistics about a department: employee count, salary total, average,
+    range and percentiles, and headcount by position. Results are cached
+    until departments or employees change.
     """
-    department = crud.get_department(db, department_id)
-    if not department:
+    statistics = await result_cache.get_or_compute(
+        db,
+        "department_statistics",
+        {"department_id": department_id},
+        STATISTICS_TABLES,
+        lambda: department_stats.get_department_statistics(db, department_id)
+    )
+    if not statistics:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Department not found"
         )
-    
-    # Calculate department statistics
-    employees = department.employees
-    total_employees = len(employees)
-    
-    if total_employees > 0:
-        total_salary = sum(emp.base_salary for emp in employees)
-        avg_salary = total_salary / total_employees
-    else:
-        total_salary = 0
-        avg_salary = 0
-    
-    return {
-        "department_name": department.name,
-        "total_employees": total_employees,
-        "total_salary": total_salary,
-        "average_salary": avg_salary,
-        "created_at": department.created_at,
-        "updated_at": department.updated_at
-    }
+    return statistics[0]
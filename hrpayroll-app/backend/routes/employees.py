@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import date
 
-from database import get_db
+from database import get_async_db
 from schemas import (
     EmployeeCreate,
     EmployeeUpdate,
@@ -12,11 +13,18 @@ from schemas import (
     AttendanceCreate,
     AttendanceUpdate,
     AttendanceResponse,
-    AttendanceList
+    AttendanceList,
+    ImportReport,
+    JobResponse
 )
 from models import User, Employee
 from auth import get_current_active_user, check_hr_permission
+from pagination import CountMode, next_cursor
+from file_formats import FileFormat, export_headers, export_media_type, iter_records, stream_query
+from employee_directory import employee_directory
 import crud
+import employee_io
+import jobs
 
 router = APIRouter(
     prefix="/employees",
@@ -26,14 +34,14 @@ router = APIRouter(
 @router.post("/", response_model=EmployeeResponse)
 async def create_employee(
     employee: EmployeeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Create a new employee. Only HR and admin users can create employees.
     """
     # Verify department exists
-    department = crud.get_department(db, employee.department_id)
+    department = await crud.get_department(db, employee.department_id)
     if not department:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -42,7 +50,7 @@ async def create_employee(
     
     # If user_id is provided, verify user exists
     if employee.user_id:
-        user = crud.get_user(db, employee.user_id)
+        user = await crud.get_user(db, employee.user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -50,16 +58,14 @@ async def create_employee(
             )
         
         # Check if user is already associated with an employee
-        existing_employee = db.query(Employee).filter(
-            Employee.user_id == employee.user_id
-        ).first()
+        existing_employee = await crud.get_employee_by_user_id(db, employee.user_id)
         if existing_employee:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User is already associated with an employee"
             )
     
-    return crud.create_employee(db, employee)
+    return await crud.create_employee(db, employee)
 
 @router.get("/", response_model=EmployeeList)
 async def list_employees(
@@ -67,34 +73,139 @@ async def list_employees(
     limit: int = 100,
     search: Optional[str] = None,
     department_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     List all employees with optional filtering.
+    Pass the returned next_cursor as `cursor` to fetch the following page.
     """
-    employees = crud.get_employees(
+    employees = await crud.get_employees(
         db,
         skip=skip,
         limit=limit,
         search=search,
-        department_id=department_id
+        department_id=department_id,
+        cursor=cursor
     )
     return {
-        "total": len(employees),
-        "items": employees
+        "total": await crud.count_employees(
+            db, search=search, department_id=department_id, mode=count
+        ),
+        "items": employees,
+        "next_cursor": next_cursor(employees, limit, ("id",))
     }
 
+@router.get("/search", response_model=List[EmployeeResponse])
+async def search_employees(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Type-ahead search of employees by name. Every word of `q` must occur in
+    the employee's full name; names starting with `q` are returned first.
+    """
+    return await crud.search_employees(db, q, limit=limit, department_id=department_id)
+
+@router.get("/directory")
+async def get_employee_directory(
+    request: Request,
+    prefix: Optional[str] = None,
+    department_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Compact employee list for dropdowns and type-ahead: id, name,
+    department_id and position of all employees, or of those whose first or
+    last name starts with `prefix`. Served from the in-process directory;
+    send the returned ETag as If-None-Match to get 304 when nothing changed.
+    """
+    await employee_directory.refresh(db)
+    etag, body = employee_directory.render(prefix, department_id, limit)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.post("/import", response_model=ImportReport)
+async def import_employees(
+    request: Request,
+    file_format: FileFormat = Query(FileFormat.CSV, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Bulk-create employees from a CSV (with a header row) or NDJSON request
+    body, streamed and processed in chunks. Valid rows are created even when
+    others fail; the response lists the errors of every rejected row.
+    """
+    records = iter_records(request.stream(), file_format)
+    return await employee_io.import_employees(db, records)
+
+@router.get("/export")
+async def export_employees(
+    file_format: FileFormat = Query(FileFormat.CSV, alias="format"),
+    gzip: bool = False,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Download all employees, or those of a department, as CSV or NDJSON.
+    The file is streamed from a server-side cursor; the columns match the import.
+    """
+    return StreamingResponse(
+        stream_query(
+            db,
+            employee_io.export_query(department_id),
+            employee_io.EXPORT_COLUMNS,
+            file_format,
+            compress=gzip
+        ),
+        media_type=export_media_type(file_format, gzip),
+        headers=export_headers("employees", file_format, gzip)
+    )
+
+@router.post("/export", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_employee_export(
+    response: Response,
+    file_format: FileFormat = Query(FileFormat.CSV, alias="format"),
+    gzip: bool = False,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Export employees as GET /employees/export does, as a background job.
+    The file is downloaded from the job's result once it has succeeded.
+    """
+    job = await jobs.submit_job(
+        db,
+        "employee_export",
+        {"format": file_format, "gzip": gzip, "department_id": department_id},
+        created_by=current_user.id
+    )
+    response.headers["Location"] = jobs.job_location(job)
+    return job
+
 @router.get("/{employee_id}", response_model=EmployeeResponse)
 async def get_employee(
     employee_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Get detailed information about a specific employee.
     """
-    employee = crud.get_employee(db, employee_id)
+    employee = await crud.get_employee(db, employee_id)
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -106,14 +217,14 @@ async def get_employee(
 async def update_employee(
     employee_id: int,
     employee_update: EmployeeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Update an employee's information. Only HR and admin users can update employees.
     """
     # Verify employee exists
-    existing_employee = crud.get_employee(db, employee_id)
+    existing_employee = await crud.get_employee(db, employee_id, options=())
     if not existing_employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,26 +233,26 @@ async def update_employee(
     
     # If department_id is being updated, verify new department exists
     if employee_update.department_id:
-        department = crud.get_department(db, employee_update.department_id)
+        department = await crud.get_department(db, employee_update.department_id)
         if not department:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Department not found"
             )
     
-    updated_employee = crud.update_employee(db, employee_id, employee_update)
+    updated_employee = await crud.update_employee(db, employee_id, employee_update)
     return updated_employee
 
 @router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_employee(
     employee_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Delete an employee. Only HR and admin users can delete employees.
     """
-    success = crud.delete_employee(db, employee_id)
+    success = await crud.delete_employee(db, employee_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -153,14 +264,14 @@ async def delete_employee(
 async def create_attendance(
     employee_id: int,
     attendance: AttendanceCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Create an attendance record for an employee.
     """
     # Verify employee exists
-    employee = crud.get_employee(db, employee_id)
+    employee = await crud.get_employee(db, employee_id, options=())
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -170,7 +281,7 @@ async def create_attendance(
     # Set employee_id from path parameter
     attendance.employee_id = employee_id
     
-    return crud.create_attendance(db, attendance)
+    return await crud.create_attendance(db, attendance)
 
 @router.get("/{employee_id}/attendance", response_model=AttendanceList)
 async def list_employee_attendance(
@@ -179,32 +290,45 @@ async def list_employee_attendance(
     end_date: Optional[date] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    List attendance records for a specific employee.
+    List attendance records for a specific employee, ordered by date.
+    Pass the returned next_cursor as `cursor` to fetch the following page.
     """
     # Verify employee exists
-    employee = crud.get_employee(db, employee_id)
+    employee = await crud.get_employee(db, employee_id, options=())
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Employee not found"
         )
     
-    attendances = crud.get_attendances(
+    attendances = await crud.get_attendances(
         db,
         skip=skip,
         limit=limit,
         employee_id=employee_id,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        cursor=cursor
     )
     
     return {
-        "total": len(attendances),
-        "items": attendances
+        "total": await crud.count_attendances(
+            db,
+            employee_id=employee_id,
+            start_date=start_date,
+            end_date=end_date,
+            mode=count
+        ),
+        "items": attendances,
+        "next_cursor": next_cursor(
+            attendances, limit, crud.attendance_page_keys(employee_id)
+        )
     }
 
 @router.put("/{employee_id}/attendance/{attendance_id}", response_model=AttendanceResponse)
@@ -212,38 +336,38 @@ async def update_attendance(
     employee_id: int,
     attendance_id: int,
     attendance_update: AttendanceUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Update an attendance record for an employee.
     """
     # Verify attendance record exists and belongs to the employee
-    attendance = crud.get_attendance(db, attendance_id)
+    attendance = await crud.get_attendance(db, attendance_id)
     if not attendance or attendance.employee_id != employee_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Attendance record not found"
         )
     
-    return crud.update_attendance(db, attendance_id, attendance_update)
+    return await crud.update_attendance(db, attendance_id, attendance_update)
 
 @router.delete("/{employee_id}/attendance/{attendance_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_attendance(
     employee_id: int,
     attendance_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Delete an attendance record for an employee.
     """
     # Verify attendance record exists and belongs to the employee
-    attendance = crud.get_attendance(db, attendance_id)
+    attendance = await crud.get_attendance(db, attendance_id)
     if not attendance or attendance.employee_id != employee_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Attendance record not found"
         )
     
-    crud.delete_attendance(db, attendance_id)
+    await crud.delete_attendance(db, attendance_id)
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import os
+
+from database import get_async_db
+from schemas import JobResponse, JobList
+from models import User, JobStatus
+from auth import check_hr_permission
+import jobs
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+async def get_job_or_404(db: AsyncSession, job_id: int):
+    job = await jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.get("/", response_model=JobList)
+async def list_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[JobStatus] = None,
+    kind: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    List background jobs, newest first, optionally of one status or kind.
+    """
+    return {
+        "total": await jobs.count_jobs(db, status=status, kind=kind),
+        "items": await jobs.get_jobs(db, skip=skip, limit=limit, status=status, kind=kind)
+    }
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Get the state, progress and outcome of a background job.
+    """
+    return await get_job_or_404(db, job_id)
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Cancel a job. A queued job is cancelled at once; a running one is
+    stopped by its worker shortly after. Finished jobs cannot be cancelled.
+    """
+    job = await get_job_or_404(db, job_id)
+    if job.status not in (JobStatus.QUEUED, JobStatus.RUNNING):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot cancel a job with status {job.status.value}"
+        )
+    
+    return await jobs.cancel_job(db, job_id)
+
+@router.get("/{job_id}/result")
+async def download_job_result(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Download the file produced by a succeeded job, such as an export or a
+    payslip archive.
+    """
+    job = await get_job_or_404(db, job_id)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job has not succeeded (status {job.status.value})"
+        )
+    
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job has no result file"
+        )
+    
+    return FileResponse(
+        job.result_path,
+        media_type=job.result["media_type"],
+        filename=job.result["filename"]
+    )
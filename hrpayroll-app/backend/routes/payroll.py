@@ -1,35 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
-from datetime import date
+from datetime import date, timedelta
 
-from database import get_db
+from database import get_async_db
 from schemas import (
     PayrollCreate,
     PayrollUpdate,
     PayrollResponse,
-    PayrollList
+    PayrollList,
+    PayrollRunRequest,
+    PayrollRunSummary,
+    PayrollSummary,
+    PayrollBatchRequest,
+    PayrollBatchResult,
+    PayrollRuleSetCreate,
+    PayrollRuleSetResponse,
+    JobResponse
 )
-from models import User, Employee, PayrollStatus
-from auth import get_current_active_user, check_hr_permission
+from models import User, Employee, PayrollStatus, TransitionOutcome
+from auth import get_current_active_user, check_admin_permission, check_hr_permission
+from pagination import CountMode, next_cursor
+from result_cache import result_cache
+from payslips import MEDIA_TYPES as PAYSLIP_MEDIA_TYPES, PayslipFormat
 import crud
+import jobs
+import payroll_rules
+import payroll_run
+import payroll_transitions
+import payslips
+import summaries
 
 router = APIRouter(
     prefix="/payroll",
     tags=["payroll"]
 )
 
+def validate_pay_period(pay_period_start: date, pay_period_end: date) -> None:
+    """Raise 400 if the pay period ends before it starts."""
+    if pay_period_end < pay_period_start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pay period end date must be after start date"
+        )
+
 @router.post("/", response_model=PayrollResponse)
 async def create_payroll(
     payroll: PayrollCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Create a new payroll record. Only HR and admin users can create payroll records.
+    The net salary is computed; a net_salary that disagrees with the amounts is rejected.
     """
     # Verify employee exists
-    employee = crud.get_employee(db, payroll.employee_id)
+    employee = await crud.get_employee(db, payroll.employee_id, options=())
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -37,26 +64,14 @@ async def create_payroll(
         )
     
     # Validate pay period
-    if payroll.pay_period_end < payroll.pay_period_start:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Pay period end date must be after start date"
-        )
+    validate_pay_period(payroll.pay_period_start, payroll.pay_period_end)
     
-    # Check for existing payroll record in the same period
-    existing_payroll = db.query(crud.Payroll).filter(
-        crud.Payroll.employee_id == payroll.employee_id,
-        crud.Payroll.pay_period_start <= payroll.pay_period_end,
-        crud.Payroll.pay_period_end >= payroll.pay_period_start
-    ).first()
+    # Deductions and tax left out are computed from the payroll rules, and
+    # the net salary from the amounts
+    payroll = await payroll_rules.fill_payroll_amounts(db, payroll, employee)
     
-    if existing_payroll:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Payroll record already exists for this period"
-        )
-    
-    return crud.create_payroll(db, payroll)
+    # Overlapping periods are rejected by the database on insert
+    return await crud.create_payroll(db, payroll)
 
 @router.get("/", response_model=PayrollList)
 async def list_payrolls(
@@ -66,40 +81,296 @@ async def list_payrolls(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     status: Optional[PayrollStatus] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     List all payroll records with optional filtering.
+    Pass the returned next_cursor as `cursor` to fetch the following page.
     """
-    payrolls = crud.get_payrolls(
+    payrolls = await crud.get_payrolls(
         db,
         skip=skip,
         limit=limit,
         employee_id=employee_id,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        status=status,
+        cursor=cursor
     )
     
-    # Filter by status if provided
-    if status:
-        payrolls = [p for p in payrolls if p.status == status]
+    return {
+        "total": await crud.count_payrolls(
+            db,
+            employee_id=employee_id,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            mode=count
+        ),
+        "items": payrolls,
+        "next_cursor": next_cursor(payrolls, limit, ("id",))
+    }
+
+@router.get("/summary", response_model=PayrollSummary)
+async def get_payroll_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    This month's net payroll and its growth against last month, headcount,
+    average base salary and the next scheduled payment date. Read from the
+    summary tables and cached until payroll or employees change.
+    """
+    today = date.today()
+    return await result_cache.get_or_compute(
+        db,
+        "payroll_summary",
+        {"today": today},
+        ("payrolls", "employees"),
+        lambda: summaries.get_payroll_summary(db, today)
+    )
+
+@router.get("/preview", response_model=PayrollRunSummary)
+async def preview_payroll_run(
+    pay_period_start: Optional[date] = None,
+    pay_period_end: Optional[date] = None,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Compute the payroll run for a period without saving it.
+    Defaults to the current calendar month.
+    """
+    today = date.today()
+    if pay_period_start is None:
+        pay_period_start = today.replace(day=1)
+    if pay_period_end is None:
+        next_month = (pay_period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        pay_period_end = next_month - timedelta(days=1)
+    validate_pay_period(pay_period_start, pay_period_end)
+
+    run = await payroll_run.compute_payroll_run(
+        db, pay_period_start, pay_period_end, department_id
+    )
+    return run.summary()
+
+@router.post("/process", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def process_payroll_run(
+    run_request: PayrollRunRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Generate and process payroll for every eligible employee in a period, as
+    a background job. Employees that already have payroll for the period are
+    skipped. Poll the job at the returned Location; its result is the run
+    summary.
+    """
+    validate_pay_period(run_request.pay_period_start, run_request.pay_period_end)
+
+    job = await jobs.submit_job(
+        db, "payroll_run", run_request.model_dump(), created_by=current_user.id
+    )
+    response.headers["Location"] = jobs.job_location(job)
+    return job
+
+@router.get("/rules", response_model=PayrollRuleSetResponse)
+async def get_payroll_rules(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    The payroll tax and deduction rules in force: the latest saved version,
+    or version 0, the flat rates of the settings, if none was saved.
+    """
+    rule_set = await payroll_rules.get_latest_rule_set(db)
+    if rule_set is None:
+        return {
+            "version": 0,
+            "description": "Flat rates from settings",
+            "rules": payroll_rules.settings_rules()
+        }
+    return rule_set
+
+@router.post("/rules", response_model=PayrollRuleSetResponse)
+async def create_payroll_rules(
+    rule_set: PayrollRuleSetCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_admin_permission)
+):
+    """
+    Save payroll tax and deduction rules as a new version. Payroll runs and
+    payroll records created without deductions or tax use them from now on;
+    existing records are unchanged. Only admin users can change the rules.
+    """
+    department_ids = {
+        override.department_id for override in rule_set.overrides
+        if override.department_id is not None
+    }
+    if department_ids:
+        found = await crud.get_departments_by_ids(db, sorted(department_ids))
+        missing = sorted(department_ids - {department.id for department in found})
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Departments not found: {', '.join(map(str, missing))}"
+            )
+    
+    return await payroll_rules.create_rule_set(db, rule_set, created_by=current_user.id)
+
+@router.get("/rules/{version}", response_model=PayrollRuleSetResponse)
+async def get_payroll_rules_version(
+    version: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """A saved version of the payroll rules, e.g. the one a payroll run used."""
+    rule_set = await payroll_rules.get_rule_set(db, version)
+    if not rule_set:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payroll rules version not found"
+        )
+    return rule_set
+
+async def transition_batch(
+    db: AsyncSession,
+    target: PayrollStatus,
+    batch: PayrollBatchRequest
+) -> dict:
+    """Apply a batch transition selected by ids or by pay period."""
+    if batch.payroll_ids is None and (batch.pay_period_start is None or batch.pay_period_end is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Select payroll records by payroll_ids or by pay_period_start and pay_period_end"
+        )
+    if batch.payroll_ids is None:
+        validate_pay_period(batch.pay_period_start, batch.pay_period_end)
     
+    results = await payroll_transitions.transition_payrolls(
+        db,
+        target,
+        payroll_ids=batch.payroll_ids,
+        pay_period_start=batch.pay_period_start,
+        pay_period_end=batch.pay_period_end,
+        department_id=batch.department_id,
+        payment_date=batch.payment_date
+    )
+    updated = sum(1 for result in results if result["outcome"] == TransitionOutcome.UPDATED)
     return {
-        "total": len(payrolls),
-        "items": payrolls
+        "requested": len(set(batch.payroll_ids)) if batch.payroll_ids is not None else None,
+        "updated": updated,
+        "skipped": len(results) - updated,
+        "results": results
     }
 
+@router.post("/batch/process", response_model=PayrollBatchResult)
+async def process_payroll_batch(
+    batch: PayrollBatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Process many pending payroll records at once, selected by id or by pay
+    period (and department), computing their net salaries. Records that are
+    not pending are skipped; the response has the outcome of each record.
+    """
+    return await transition_batch(db, PayrollStatus.PROCESSED, batch)
+
+@router.post("/batch/pay", response_model=PayrollBatchResult)
+async def pay_payroll_batch(
+    batch: PayrollBatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Mark many processed payroll records as paid at once, selected by id or
+    by pay period (and department), on payment_date (default today). Records
+    that are not processed are skipped; the response has the outcome of each
+    record.
+    """
+    return await transition_batch(db, PayrollStatus.PAID, batch)
+
+@router.get("/payslips")
+async def download_run_payslips(
+    pay_period_start: date,
+    pay_period_end: date,
+    department_id: Optional[int] = None,
+    file_format: PayslipFormat = Query(PayslipFormat.PDF, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Download the payslips of every payroll record of a pay period as a ZIP
+    archive, rendered as needed and streamed as they are added.
+    """
+    validate_pay_period(pay_period_start, pay_period_end)
+    if not await payslips.run_exists(db, pay_period_start, pay_period_end, department_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No payroll records for this period"
+        )
+    
+    filename = f"payslips-{pay_period_start.isoformat()}-{pay_period_end.isoformat()}.zip"
+    return StreamingResponse(
+        payslips.stream_run_archive(
+            db, pay_period_start, pay_period_end, file_format, department_id
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/payslips", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def archive_run_payslips(
+    pay_period_start: date,
+    pay_period_end: date,
+    response: Response,
+    department_id: Optional[int] = None,
+    file_format: PayslipFormat = Query(PayslipFormat.PDF, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Build the ZIP archive of the payslips of a pay period as a background
+    job, for runs too large to download in one request. The archive is
+    downloaded from the job's result once it has succeeded.
+    """
+    validate_pay_period(pay_period_start, pay_period_end)
+    if not await payslips.run_exists(db, pay_period_start, pay_period_end, department_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No payroll records for this period"
+        )
+    
+    job = await jobs.submit_job(
+        db,
+        "payslip_archive",
+        {
+            "pay_period_start": pay_period_start,
+            "pay_period_end": pay_period_end,
+            "department_id": department_id,
+            "format": file_format,
+        },
+        created_by=current_user.id
+    )
+    response.headers["Location"] = jobs.job_location(job)
+    return job
+
 @router.get("/{payroll_id}", response_model=PayrollResponse)
 async def get_payroll(
     payroll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Get detailed information about a specific payroll record.
     """
-    payroll = crud.get_payroll(db, payroll_id)
+    payroll = await crud.get_payroll(db, payroll_id)
     if not payroll:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -107,18 +378,44 @@ async def get_payroll(
         )
     return payroll
 
+@router.get("/{payroll_id}/payslip")
+async def download_payslip(
+    payroll_id: int,
+    file_format: PayslipFormat = Query(PayslipFormat.PDF, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(check_hr_permission)
+):
+    """
+    Download the payslip of a payroll record as PDF or HTML. It is rendered
+    on first download and served from the payslip store afterwards.
+    """
+    payslip = await payslips.get_payslip(db, payroll_id)
+    if not payslip:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payroll record not found"
+        )
+    
+    [path] = await payslips.render_payslips([payslip], file_format)
+    return FileResponse(
+        path,
+        media_type=PAYSLIP_MEDIA_TYPES[file_format],
+        filename=payslips.payslip_filename(payslip, file_format)
+    )
+
 @router.put("/{payroll_id}", response_model=PayrollResponse)
 async def update_payroll(
     payroll_id: int,
     payroll_update: PayrollUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Update a payroll record. Only HR and admin users can update payroll records.
+    The net salary is recomputed from the amounts, as on create.
     """
     # Verify payroll record exists
-    existing_payroll = crud.get_payroll(db, payroll_id)
+    existing_payroll = await crud.get_payroll(db, payroll_id)
     if not existing_payroll:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -132,20 +429,32 @@ async def update_payroll(
             detail="Cannot update a paid payroll record"
         )
     
-    updated_payroll = crud.update_payroll(db, payroll_id, payroll_update)
+    # The net salary follows the updated amounts
+    changes = payroll_update.model_dump(exclude_unset=True)
+    amounts = {
+        column: changes.get(column, getattr(existing_payroll, column))
+        for column in ("overtime_pay", "deductions", "tax")
+    }
+    payroll_update = payroll_update.model_copy(update={
+        "net_salary": payroll_rules.net_salary(
+            changes.get("net_salary"), existing_payroll.base_salary, **amounts
+        )
+    })
+    
+    updated_payroll = await crud.update_payroll(db, payroll_id, payroll_update)
     return updated_payroll
 
 @router.delete("/{payroll_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_payroll(
     payroll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Delete a payroll record. Only HR and admin users can delete payroll records.
     """
     # Verify payroll record exists
-    existing_payroll = crud.get_payroll(db, payroll_id)
+    existing_payroll = await crud.get_payroll(db, payroll_id)
     if not existing_payroll:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -159,69 +468,51 @@ async def delete_payroll(
             detail="Cannot delete a paid payroll record"
         )
     
-    success = crud.delete_payroll(db, payroll_id)
+    success = await crud.delete_payroll(db, payroll_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete payroll record"
         )
 
+async def transition_one(db: AsyncSession, payroll_id: int, target: PayrollStatus):
+    """Apply a transition to one payroll record, raising 404 or 400 if it cannot move."""
+    [result] = await payroll_transitions.transition_payrolls(db, target, payroll_ids=[payroll_id])
+    if result["outcome"] == TransitionOutcome.NOT_FOUND:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payroll record not found"
+        )
+    if result["outcome"] == TransitionOutcome.INVALID_STATUS:
+        detail = (
+            f"Cannot process payroll with status {result['status']}"
+            if target == PayrollStatus.PROCESSED
+            else "Can only mark processed payrolls as paid"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    return await crud.get_payroll(db, payroll_id)
+
 @router.post("/{payroll_id}/process", response_model=PayrollResponse)
 async def process_payroll(
     payroll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Process a payroll record, calculating final amounts and setting status to processed.
     """
-    payroll = crud.get_payroll(db, payroll_id)
-    if not payroll:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Payroll record not found"
-        )
-    
-    if payroll.status != PayrollStatus.PENDING:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot process payroll with status {payroll.status}"
-        )
-    
-    # Update payroll status to processed
-    payroll_update = PayrollUpdate(
-        status=PayrollStatus.PROCESSED,
-        net_salary=payroll.base_salary + payroll.overtime_pay - payroll.deductions - payroll.tax
-    )
-    
-    return crud.update_payroll(db, payroll_id, payroll_update)
+    return await transition_one(db, payroll_id, PayrollStatus.PROCESSED)
 
 @router.post("/{payroll_id}/pay", response_model=PayrollResponse)
 async def mark_payroll_as_paid(
     payroll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(check_hr_permission)
 ):
     """
     Mark a processed payroll record as paid.
     """
-    payroll = crud.get_payroll(db, payroll_id)
-    if not payroll:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Payroll record not found"
-        )
-    
-    if payroll.status != PayrollStatus.PROCESSED:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Can only mark processed payrolls as paid"
-        )
-    
-    # Update payroll status to paid and set payment date
-    payroll_update = PayrollUpdate(
-        status=PayrollStatus.PAID,
-        payment_date=date.today()
-    )
-    
-    return crud.update_payroll(db, payroll_id, payroll_update)
+    return await transition_one(db, payroll_id, PayrollStatus.PAID)
@@ -1,7 +1,18 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List
+from pydantic import AfterValidator, BaseModel, EmailStr, Field, PlainSerializer, model_validator, validator
+from typing import Annotated, Any, Optional, List, Dict
 from datetime import datetime, date
-from models import UserRole, PayrollStatus, AttendanceType
+from decimal import Decimal
+from models import UserRole, PayrollStatus, AttendanceType, PunchDirection, JobStatus, TransitionOutcome, DeductionType
+from config import settings
+import money
+
+# Money amounts: accepted as numbers or strings, rounded to whole cents,
+# returned as JSON numbers
+Money = Annotated[
+    Decimal,
+    AfterValidator(lambda value: money.quantize(value)),
+    PlainSerializer(float, return_type=float, when_used="json")
+]
 
 # Base Schemas
 class UserBase(BaseModel):
@@ -21,18 +32,18 @@ class EmployeeBase(BaseModel):
     phone: Optional[str]
     address: Optional[str]
     position: str
-    base_salary: float = Field(gt=0)
+    base_salary: Money = Field(gt=0)
     department_id: int
 
 class PayrollBase(BaseModel):
     employee_id: int
     pay_period_start: date
     pay_period_end: date
-    base_salary: float
-    overtime_pay: float = 0.0
-    deductions: float = 0.0
-    tax: float = 0.0
-    net_salary: float
+    base_salary: Money
+    overtime_pay: Money = Decimal("0.00")
+    deductions: Money = Decimal("0.00")
+    tax: Money = Decimal("0.00")
+    net_salary: Money
     status: PayrollStatus = PayrollStatus.PENDING
     payment_date: Optional[date]
 
@@ -63,7 +74,11 @@ class EmployeeCreate(EmployeeBase):
     user_id: Optional[int]
 
 class PayrollCreate(PayrollBase):
-    pass
+    # Computed from the payroll rules when left out
+    deductions: Optional[Money] = None
+    tax: Optional[Money] = None
+    # Computed from the other amounts; rejected when it disagrees with them
+    net_salary: Optional[Money] = None
 
 class AttendanceCreate(AttendanceBase):
     pass
@@ -87,16 +102,16 @@ class EmployeeUpdate(BaseModel):
     phone: Optional[str]
     address: Optional[str]
     position: Optional[str]
-    base_salary: Optional[float] = Field(gt=0)
+    base_salary: Optional[Money] = Field(gt=0)
     department_id: Optional[int]
 
 class PayrollUpdate(BaseModel):
     status: Optional[PayrollStatus]
     payment_date: Optional[date]
-    overtime_pay: Optional[float]
-    deductions: Optional[float]
-    tax: Optional[float]
-    net_salary: Optional[float]
+    overtime_pay: Optional[Money]
+    deductions: Optional[Money]
+    tax: Optional[Money]
+    net_salary: Optional[Money]
 
 class AttendanceUpdate(BaseModel):
     status: Optional[AttendanceType]
@@ -152,24 +167,263 @@ class AttendanceResponse(AttendanceBase):
 
 # List Response Schemas
 class UserList(BaseModel):
-    total: int
+    total: Optional[int]
     items: List[UserResponse]
+    next_cursor: Optional[str] = None
 
 class DepartmentList(BaseModel):
-    total: int
+    total: Optional[int]
     items: List[DepartmentResponse]
+    next_cursor: Optional[str] = None
 
 class EmployeeList(BaseModel):
-    total: int
+    total: Optional[int]
     items: List[EmployeeResponse]
+    next_cursor: Optional[str] = None
 
 class PayrollList(BaseModel):
-    total: int
+    total: Optional[int]
     items: List[PayrollResponse]
+    next_cursor: Optional[str] = None
 
 class AttendanceList(BaseModel):
-    total: int
+    total: Optional[int]
     items: List[AttendanceResponse]
+    next_cursor: Optional[str] = None
+
+# Attendance Ingestion Schemas
+class PunchEvent(BaseModel):
+    employee_id: int
+    timestamp: datetime
+    direction: PunchDirection
+
+class PunchBatch(BaseModel):
+    events: List[PunchEvent] = Field(max_length=settings.ATTENDANCE_BATCH_MAX_EVENTS)
+
+class RejectedPunch(BaseModel):
+    index: int
+    error: str
+
+class PunchBatchResult(BaseModel):
+    received: int
+    upserted: int
+    rejected: List[RejectedPunch]
+
+    class Config:
+        from_attributes = True
+
+# Bulk Import Schemas
+class ImportRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class ImportReport(BaseModel):
+    total_rows: int
+    created: int
+    failed: int
+    errors: List[ImportRowError]
+
+    class Config:
+        from_attributes = True
+
+# Department Statistics Schemas
+class DepartmentStatistics(BaseModel):
+    department_id: int
+    department_name: str
+    total_employees: int
+    total_salary: float
+    average_salary: float
+    min_salary: Optional[float]
+    max_salary: Optional[float]
+    median_salary: Optional[float]
+    salary_percentiles: Dict[str, Optional[float]]
+    headcount_by_position: Dict[str, int]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+# Payroll Run Schemas
+class PayrollRunRequest(BaseModel):
+    pay_period_start: date
+    pay_period_end: date
+    department_id: Optional[int] = None
+
+class PayrollRunSummary(BaseModel):
+    pay_period_start: date
+    pay_period_end: date
+    total_employees: int
+    skipped_employees: int
+    total_salary: Money
+    total_overtime_hours: float
+    total_overtime: Money
+    total_deductions: Money
+    total_tax: Money
+    net_payable: Money
+    rule_set_version: int = 0
+    created: int = 0
+
+# Payroll Batch Transition Schemas
+class PayrollBatchRequest(BaseModel):
+    payroll_ids: Optional[List[int]] = Field(None, max_length=settings.PAYROLL_BATCH_MAX_IDS)
+    pay_period_start: Optional[date] = None
+    pay_period_end: Optional[date] = None
+    department_id: Optional[int] = None
+    payment_date: Optional[date] = None
+
+class PayrollTransitionResult(BaseModel):
+    id: int
+    outcome: TransitionOutcome
+    status: Optional[PayrollStatus] = None
+    net_salary: Optional[Money] = None
+    payment_date: Optional[date] = None
+
+class PayrollBatchResult(BaseModel):
+    requested: Optional[int]
+    updated: int
+    skipped: int
+    results: List[PayrollTransitionResult]
+
+# Payroll Rule Schemas
+# Rates are fractions, e.g. 0.2 for 20%
+Rate = Annotated[
+    Decimal,
+    Field(ge=0, le=1),
+    PlainSerializer(float, return_type=float, when_used="json")
+]
+
+class TaxBracket(BaseModel):
+    # Taxable pay per period above which the rate applies, up to the next bracket
+    above: Money = Field(ge=0)
+    rate: Rate
+
+class DeductionRule(BaseModel):
+    name: str
+    type: DeductionType
+    amount: Optional[Money] = Field(None, ge=0)
+    rate: Optional[Rate] = None
+    # Largest amount of a percentage deduction per period
+    cap: Optional[Money] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def check_type(self):
+        if self.type == DeductionType.FIXED and self.amount is None:
+            raise ValueError("Fixed deductions need an amount")
+        if self.type == DeductionType.PERCENTAGE and self.rate is None:
+            raise ValueError("Percentage deductions need a rate")
+        return self
+
+class PayrollRuleProfile(BaseModel):
+    tax_brackets: Optional[List[TaxBracket]] = None
+    deductions: Optional[List[DeductionRule]] = None
+
+    @validator('tax_brackets')
+    def brackets_increasing(cls, v):
+        if v is not None:
+            floors = [bracket.above for bracket in v]
+            if floors != sorted(set(floors)):
+                raise ValueError('Tax brackets must be in increasing order of above')
+        return v
+
+class PayrollRuleOverride(PayrollRuleProfile):
+    # Matches employees by department, position (case-insensitive) or both;
+    # brackets or deductions left out are those of the rule set
+    department_id: Optional[int] = None
+    position: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_match(self):
+        if self.department_id is None and not self.position:
+            raise ValueError("Overrides need a department_id or a position")
+        return self
+
+class PayrollRules(PayrollRuleProfile):
+    tax_brackets: List[TaxBracket] = []
+    deductions: List[DeductionRule] = []
+    # The first override matching an employee applies
+    overrides: List[PayrollRuleOverride] = []
+
+class PayrollRuleSetCreate(PayrollRules):
+    description: Optional[str] = None
+
+class PayrollRuleSetResponse(BaseModel):
+    version: int
+    description: Optional[str]
+    rules: PayrollRules
+    created_by: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Background Job Schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    params: Dict[str, Any]
+    status: JobStatus
+    progress_done: int
+    progress_total: Optional[int]
+    progress: Optional[float]
+    message: Optional[str]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    created_by: Optional[int]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class JobList(BaseModel):
+    total: int
+    items: List[JobResponse]
+
+# Dashboard Schemas
+class DashboardStats(BaseModel):
+    total_employees: int
+    total_departments: int
+    monthly_payroll: float
+    attendance_rate: float
+    employee_growth: float
+    payroll_growth: float
+
+class PayrollSummary(BaseModel):
+    total_payroll: float
+    payroll_growth: float
+    total_employees: int
+    average_salary: float
+    next_payroll_date: Optional[date]
+
+class AttendanceSummary(BaseModel):
+    date: date
+    present: int
+    absent: int
+    on_leave: int
+    half_day: int
+    present_percentage: float
+    absent_percentage: float
+    average_attendance: float
+
+class ChartDataset(BaseModel):
+    label: str
+    data: List[float]
+
+class ChartData(BaseModel):
+    labels: List[str]
+    datasets: List[ChartDataset]
+
+class DashboardCharts(BaseModel):
+    employee_distribution: ChartData
+    payroll_trends: ChartData
+    attendance_trends: ChartData
+
+class DashboardActivity(BaseModel):
+    action: str
+    description: str
+    timestamp: datetime
 
 # Token Schemas
 class Token(BaseModel):
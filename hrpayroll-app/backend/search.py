@@ -0,0 +1,174 @@
+"""
+Indexed name search for employees, users and departments.
+
+Each searchable table has a search document, its name columns joined with
+spaces and lowercased (e.g. "ada lovelace" for an employee), and a term
+matches when every word of it occurs somewhere in the document, so "ada lov"
+finds Ada Lovelace by her full name.
+
+PostgreSQL serves the matches from pg_trgm GIN indexes on the document
+expression, which the database keeps up to date on write. SQLite uses an FTS5
+table per searchable table (<table>_search, trigram tokenizer, rowid = id)
+kept up to date by triggers; words shorter than a trigram fall back to LIKE.
+Both are created with the tables by Base.metadata.create_all and for existing
+databases by `python -m search`.
+
+Ranked searches order documents whose first words are the term first, then
+documents starting with it, then those with a word starting with it, and
+within each of these by trigram similarity (PostgreSQL) or length (SQLite).
+"""
+from typing import Dict, List, Sequence
+
+from sqlalchemy import case, event, func, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+
+from database import Base
+
+# Columns of each table's search document
+SEARCH_DOCUMENTS: Dict[str, Sequence[str]] = {
+    "employees": ("first_name", "last_name"),
+    "users": ("username", "email"),
+    "departments": ("name",),
+}
+
+# FTS5's trigram tokenizer can only look up words of at least three characters
+MIN_INDEXED_WORD_LENGTH = 3
+
+LIKE_ESCAPE = "/"
+
+def _document_sql(table_name: str, prefix: str = "") -> str:
+    return " || ' ' || ".join(f"{prefix}{column}" for column in SEARCH_DOCUMENTS[table_name])
+
+def search_document(model):
+    """Lowercased search document of a model, as indexed."""
+    columns = [getattr(model, column) for column in SEARCH_DOCUMENTS[model.__tablename__]]
+    document = columns[0]
+    for column in columns[1:]:
+        # Inline literal, so the expression matches the PostgreSQL index
+        document = document.op("||")(literal_column("' '")).op("||")(column)
+    return func.lower(document)
+
+def _words(term: str) -> List[str]:
+    return term.lower().split()
+
+def _like_escape(value: str) -> str:
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
+
+def search_filters(dialect_name: str, model, term: str) -> list:
+    """WHERE clauses selecting the rows of `model` that match `term`."""
+    words = _words(term)
+    if not words:
+        return []
+
+    document = search_document(model)
+    if dialect_name != "sqlite":
+        return [
+            document.like(f"%{_like_escape(word)}%", escape=LIKE_ESCAPE)
+            for word in words
+        ]
+
+    filters = [
+        document.like(f"%{_like_escape(word)}%", escape=LIKE_ESCAPE)
+        for word in words
+        if len(word) < MIN_INDEXED_WORD_LENGTH
+    ]
+    indexed = [word for word in words if len(word) >= MIN_INDEXED_WORD_LENGTH]
+    if indexed:
+        search_table = f"{model.__tablename__}_search"
+        query = " AND ".join('"' + word.replace('"', '""') + '"' for word in indexed)
+        filters.append(model.id.in_(
+            select(literal_column("rowid"))
+            .select_from(text(search_table))
+            .where(literal_column(search_table).op("MATCH")(query))
+        ))
+    return filters
+
+def search_order(dialect_name: str, model, term: str) -> list:
+    """ORDER BY clauses ranking the matches of `term`, best first."""
+    document = search_document(model)
+    normalized = " ".join(_words(term))
+    phrase = _like_escape(normalized)
+    tier = case(
+        (or_(document == normalized, document.like(f"{phrase} %", escape=LIKE_ESCAPE)), 0),
+        (document.like(f"{phrase}%", escape=LIKE_ESCAPE), 1),
+        (document.like(f"% {phrase}%", escape=LIKE_ESCAPE), 2),
+        else_=3
+    )
+    if dialect_name == "postgresql":
+        closeness = func.similarity(document, normalized).desc()
+    else:
+        closeness = func.length(document)
+    return [tier, closeness, model.id]
+
+def _postgresql_statements() -> List[str]:
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for table_name in SEARCH_DOCUMENTS:
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS idx_{table_name}_search ON {table_name} "
+            f"USING gin (lower({_document_sql(table_name)}) gin_trgm_ops)"
+        )
+    return statements
+
+def _sqlite_statements(table_name: str) -> List[str]:
+    search_table = f"{table_name}_search"
+    columns = ", ".join(SEARCH_DOCUMENTS[table_name])
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} "
+        f"USING fts5(document, tokenize='trigram')",
+        f"""CREATE TRIGGER IF NOT EXISTS {search_table}_insert AFTER INSERT ON {table_name}
+        BEGIN
+            INSERT INTO {search_table}(rowid, document)
+            VALUES (NEW.id, {_document_sql(table_name, "NEW.")});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {search_table}_update AFTER UPDATE OF {columns} ON {table_name}
+        BEGIN
+            UPDATE {search_table} SET document = {_document_sql(table_name, "NEW.")}
+            WHERE rowid = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {search_table}_delete AFTER DELETE ON {table_name}
+        BEGIN
+            DELETE FROM {search_table} WHERE rowid = OLD.id;
+        END""",
+    ]
+
+def create_search_indexes(connection: Connection) -> None:
+    """Create the search indexes missing on the connection's database."""
+    dialect_name = connection.dialect.name
+    if dialect_name == "postgresql":
+        for statement in _postgresql_statements():
+            connection.exec_driver_sql(statement)
+    elif dialect_name == "sqlite":
+        for table_name in SEARCH_DOCUMENTS:
+            search_table = f"{table_name}_search"
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = ?", (search_table,)
+            ).first()
+            for statement in _sqlite_statements(table_name):
+                connection.exec_driver_sql(statement)
+            if not exists:
+                # Index the rows written before the search table existed
+                connection.exec_driver_sql(
+                    f"INSERT INTO {search_table}(rowid, document) "
+                    f"SELECT id, {_document_sql(table_name)} FROM {table_name}"
+                )
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_indexes(target, connection, **kw):
+    create_search_indexes(connection)
+
+@event.listens_for(Base.metadata, "before_drop")
+def _drop_search_tables(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        for table_name in SEARCH_DOCUMENTS:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table_name}_search")
+
+if __name__ == "__main__":
+    # Add the search indexes to an existing database: python -m search
+    from database import engine
+    with engine.begin() as connection:
+        create_search_indexes(connection)
+    engine.dispose()
@@ -0,0 +1,656 @@
+"""
+Dashboard summary tables.
+
+Headcount per department, hires and departures per month, payroll totals per
+month and department, and attendance counts per day are kept in small summary
+tables so that the dashboard reads a handful of rows whatever the size of the
+base tables. crud collects the changes of each write in a SummaryDelta and
+applies it in the same transaction as the write, with one
+INSERT ... ON CONFLICT DO UPDATE per summary table adding the deltas to the
+existing totals. rebuild_summaries() recomputes every table from scratch,
+e.g. after loading data that bypassed crud.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, case, cast, delete, func, select, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from change_tracking import mark_written
+from models import (
+    Attendance, AttendanceType, DailyAttendanceSummary, Department,
+    DepartmentHeadcount, Employee, MonthlyHeadcountChange,
+    MonthlyPayrollSummary, Payroll, PayrollStatus
+)
+
+# Summary key of employees without a department
+UNASSIGNED_DEPARTMENT = 0
+
+# Bound parameters per statement, under SQLite's limit of 32766 and
+# asyncpg's of 32767
+MAX_STATEMENT_PARAMETERS = 30000
+
+ATTENDANCE_STATUS_COLUMNS = {
+    AttendanceType.PRESENT: "present_count",
+    AttendanceType.ABSENT: "absent_count",
+    AttendanceType.LEAVE: "leave_count",
+    AttendanceType.HALF_DAY: "half_day_count",
+}
+
+PAYROLL_AMOUNT_COLUMNS = (
+    "base_salary", "overtime_pay", "deductions", "tax", "net_salary"
+)
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _month_expression(dialect_name: str, column):
+    """SQL expression truncating a date column to the first day of its month."""
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc("month", column), Date)
+    return type_coerce(func.date(column, "start of month"), Date)
+
+def _money_sum(column):
+    """
+    Total of a money column. SQLite stores NUMERIC as REAL, so its sums are
+    rounded back to the cent; on PostgreSQL numeric sums are exact already.
+    """
+    return func.round(func.coalesce(func.sum(column), 0), 2)
+
+def statement_slices(items: Sequence, parameters_per_item: int) -> Iterator[Sequence]:
+    """Consecutive slices of items, each small enough to bind in one statement."""
+    size = max(1, MAX_STATEMENT_PARAMETERS // parameters_per_item)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def dialect_insert(db: AsyncSession):
+    """The INSERT construct with ON CONFLICT support of the session's dialect."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+class SummaryDelta:
+    """
+    Pending increments of summary rows, merged by primary key so that each
+    summary table is written with a single upsert (a few for very large
+    deltas, see MAX_STATEMENT_PARAMETERS).
+    """
+    def __init__(self):
+        self._rows: Dict[type, Dict[Tuple, Dict[str, float]]] = {}
+
+    def add(self, model: type, key: Dict[str, Any], **values: float) -> None:
+        """Add values to the summary row of `model` identified by `key`."""
+        row = self._rows.setdefault(model, {}).setdefault(tuple(key.items()), {})
+        for column, value in values.items():
+            row[column] = row.get(column, 0) + value
+
+    def employee(self, employee: Employee, sign: int = 1) -> None:
+        """Count an employee in (sign=1) or out of (sign=-1) the headcount and hires."""
+        self.add(
+            DepartmentHeadcount,
+            {"department_id": employee.department_id or UNASSIGNED_DEPARTMENT},
+            employee_count=sign,
+            total_base_salary=sign * employee.base_salary
+        )
+        self.add(
+            MonthlyHeadcountChange,
+            {"month": month_start(employee.hire_date)},
+            hires=sign,
+            departures=0
+        )
+
+    def departure(self, employee: Employee, on: date) -> None:
+        """Remove a deleted employee from the headcount and count the departure."""
+        self.add(
+            DepartmentHeadcount,
+            {"department_id": employee.department_id or UNASSIGNED_DEPARTMENT},
+            employee_count=-1,
+            total_base_salary=-employee.base_salary
+        )
+        self.add(
+            MonthlyHeadcountChange,
+            {"month": month_start(on)},
+            hires=0,
+            departures=1
+        )
+
+    def payroll(
+        self,
+        pay_period_start: date,
+        department_id: Optional[int],
+        amounts: Dict[str, float],
+        sign: int = 1,
+        count: int = 1
+    ) -> None:
+        """Add (sign=1) or remove (sign=-1) payroll amounts from a month's totals."""
+        self.add(
+            MonthlyPayrollSummary,
+            {
+                "month": month_start(pay_period_start),
+                "department_id": department_id or UNASSIGNED_DEPARTMENT,
+            },
+            payroll_count=sign * count,
+            **{
+                f"total_{column}": sign * (amounts.get(column) or 0)
+                for column in PAYROLL_AMOUNT_COLUMNS
+            }
+        )
+
+    def attendance(self, attendance: Attendance, sign: int = 1) -> None:
+        """Add (sign=1) or remove (sign=-1) an attendance record from its day."""
+        self.add_attendance(attendance.date, attendance.status, attendance.work_hours, sign)
+
+    def add_attendance(
+        self,
+        day: date,
+        attendance_status: AttendanceType,
+        work_hours: Optional[float],
+        sign: int = 1
+    ) -> None:
+        counts = {column: 0 for column in ATTENDANCE_STATUS_COLUMNS.values()}
+        counts[ATTENDANCE_STATUS_COLUMNS[AttendanceType(attendance_status)]] = sign
+        self.add(
+            DailyAttendanceSummary,
+            {"date": day},
+            total_work_hours=sign * (work_hours or 0.0),
+            **counts
+        )
+
+    async def apply(self, db: AsyncSession) -> None:
+        """
+        Write the pending increments. The caller commits. Tables are written
+        in name order and rows in primary key order, so that concurrent
+        transactions lock summary rows in the same order and cannot deadlock.
+        """
+        insert = dialect_insert(db)
+        for model in sorted(self._rows, key=lambda model: model.__tablename__):
+            rows = self._rows[model]
+            if not rows:
+                continue
+            table = model.__table__
+            primary_key = [column.name for column in table.primary_key]
+            # A multi-row INSERT needs the same columns in every row
+            columns = sorted({column for row in rows.values() for column in row})
+            values = sorted(
+                (
+                    {**dict(key), **{column: row.get(column, 0) for column in columns}}
+                    for key, row in rows.items()
+                ),
+                key=lambda value: tuple(value[name] for name in primary_key)
+            )
+            for chunk in statement_slices(values, len(values[0])):
+                statement = insert(table).values(chunk)
+                statement = statement.on_conflict_do_update(
+                    index_elements=primary_key,
+                    set_={
+                        column: table.c[column] + statement.excluded[column]
+                        for column in columns
+                    }
+                )
+                await db.execute(statement)
+        self._rows.clear()
+
+def payroll_amounts(payroll: Payroll) -> Dict[str, Decimal]:
+    return {column: getattr(payroll, column) for column in PAYROLL_AMOUNT_COLUMNS}
+
+async def employee_department_id(db: AsyncSession, employee_id: int) -> Optional[int]:
+    return await db.scalar(
+        select(Employee.department_id).where(Employee.id == employee_id)
+    )
+
+async def move_employee_payrolls(
+    delta: SummaryDelta,
+    db: AsyncSession,
+    employee_id: int,
+    old_department_id: Optional[int],
+    new_department_id: Optional[int]
+) -> None:
+    """
+    Move the payroll totals of an employee who changed department, so that
+    payroll summaries always follow the employee's current department.
+    """
+    rows = await db.execute(
+        select(Payroll.pay_period_start, *(
+            getattr(Payroll, column) for column in PAYROLL_AMOUNT_COLUMNS
+        )).where(Payroll.employee_id == employee_id)
+    )
+    for pay_period_start, *amounts in rows:
+        amounts = dict(zip(PAYROLL_AMOUNT_COLUMNS, amounts))
+        delta.payroll(pay_period_start, old_department_id, amounts, sign=-1)
+        delta.payroll(pay_period_start, new_department_id, amounts)
+
+async def remove_employee_records(
+    delta: SummaryDelta,
+    db: AsyncSession,
+    employee: Employee
+) -> None:
+    """
+    Remove the payrolls and attendances of a deleted employee from the
+    summaries; the database cascades or orphans them with the employee.
+    """
+    payrolls = await db.execute(
+        select(Payroll.pay_period_start, *(
+            getattr(Payroll, column) for column in PAYROLL_AMOUNT_COLUMNS
+        )).where(Payroll.employee_id == employee.id)
+    )
+    for pay_period_start, *amounts in payrolls:
+        delta.payroll(
+            pay_period_start,
+            employee.department_id,
+            dict(zip(PAYROLL_AMOUNT_COLUMNS, amounts)),
+            sign=-1
+        )
+
+    attendances = await db.execute(
+        select(
+            Attendance.date,
+            Attendance.status,
+            func.count(Attendance.id),
+            func.coalesce(func.sum(Attendance.work_hours), 0.0)
+        )
+        .where(Attendance.employee_id == employee.id)
+        .group_by(Attendance.date, Attendance.status)
+    )
+    for day, attendance_status, count, work_hours in attendances:
+        delta.add(
+            DailyAttendanceSummary,
+            {"date": day},
+            total_work_hours=-work_hours,
+            **{ATTENDANCE_STATUS_COLUMNS[attendance_status]: -count}
+        )
+
+async def rebuild_summaries(db: AsyncSession) -> None:
+    """Recompute every summary table from the base tables and commit."""
+    dialect_name = db.bind.dialect.name
+    department_key = func.coalesce(Employee.department_id, UNASSIGNED_DEPARTMENT)
+
+    for model in (
+        DepartmentHeadcount, MonthlyHeadcountChange,
+        MonthlyPayrollSummary, DailyAttendanceSummary
+    ):
+        await db.execute(delete(model))
+
+    headcounts = (
+        select(
+            department_key,
+            func.count(Employee.id),
+            _money_sum(Employee.base_salary)
+        )
+        .group_by(department_key)
+    )
+    await db.execute(
+        DepartmentHeadcount.__table__.insert().from_select(
+            ["department_id", "employee_count", "total_base_salary"], headcounts
+        )
+    )
+
+    # Departures of deleted employees are not recoverable from the base tables
+    hire_month = _month_expression(dialect_name, Employee.hire_date)
+    hires = select(hire_month, func.count(Employee.id), 0).group_by(hire_month)
+    await db.execute(
+        MonthlyHeadcountChange.__table__.insert().from_select(
+            ["month", "hires", "departures"], hires
+        )
+    )
+
+    payroll_month = _month_expression(dialect_name, Payroll.pay_period_start)
+    payrolls = (
+        select(
+            payroll_month,
+            department_key,
+            func.count(Payroll.id),
+            *(
+                _money_sum(getattr(Payroll, column))
+                for column in PAYROLL_AMOUNT_COLUMNS
+            )
+        )
+        .join(Employee, Employee.id == Payroll.employee_id)
+        .group_by(payroll_month, department_key)
+    )
+    await db.execute(
+        MonthlyPayrollSummary.__table__.insert().from_select(
+            ["month", "department_id", "payroll_count"]
+            + [f"total_{column}" for column in PAYROLL_AMOUNT_COLUMNS],
+            payrolls
+        )
+    )
+
+    attendances = (
+        select(
+            Attendance.date,
+            *(
+                func.count(case((Attendance.status == attendance_status, 1)))
+                for attendance_status in ATTENDANCE_STATUS_COLUMNS
+            ),
+            func.coalesce(func.sum(Attendance.work_hours), 0.0)
+        )
+        .join(Employee, Employee.id == Attendance.employee_id)
+        .group_by(Attendance.date)
+    )
+    await db.execute(
+        DailyAttendanceSummary.__table__.insert().from_select(
+            ["date", *ATTENDANCE_STATUS_COLUMNS.values(), "total_work_hours"],
+            attendances
+        )
+    )
+    # Readers of the summaries check the versions of their source tables
+    mark_written(db, "departments", "employees", "payrolls", "attendances")
+    await db.commit()
+
+# Dashboard reads
+def _department_name(department_id: int, names: Dict[int, str]) -> str:
+    if department_id == UNASSIGNED_DEPARTMENT:
+        return "Unassigned"
+    return names.get(department_id, f"Department {department_id}")
+
+def _growth(current: float, previous: float) -> float:
+    """Percentage change from previous to current, 0 when there is no base."""
+    if not previous:
+        return 0.0
+    return round((current - previous) / previous * 100, 2)
+
+def _attendance_rate(present: int, half_day: int, total: int) -> float:
+    """Share of attendance records that are present, half days counting half."""
+    if not total:
+        return 0.0
+    return round((present + 0.5 * half_day) / total * 100, 2)
+
+async def get_headcounts(db: AsyncSession) -> List[Tuple[int, str, int]]:
+    """(department id, department name, headcount) of every department with staff."""
+    rows = await db.execute(
+        select(
+            DepartmentHeadcount.department_id,
+            Department.name,
+            DepartmentHeadcount.employee_count
+        )
+        .outerjoin(Department, Department.id == DepartmentHeadcount.department_id)
+        .where(DepartmentHeadcount.employee_count > 0)
+        .order_by(DepartmentHeadcount.department_id)
+    )
+    return [
+        (department_id, name or _department_name(department_id, {}), count)
+        for department_id, name, count in rows
+    ]
+
+async def get_monthly_payroll_totals(
+    db: AsyncSession,
+    first_month: date,
+    last_month: date
+) -> Dict[Tuple[date, int], float]:
+    """Net payroll per (month, department id) for a range of months."""
+    rows = await db.execute(
+        select(
+            MonthlyPayrollSummary.month,
+            MonthlyPayrollSummary.department_id,
+            MonthlyPayrollSummary.total_net_salary
+        )
+        .where(
+            MonthlyPayrollSummary.month >= first_month,
+            MonthlyPayrollSummary.month <= last_month,
+            MonthlyPayrollSummary.payroll_count > 0
+        )
+    )
+    return {(month, department_id): total for month, department_id, total in rows}
+
+async def get_daily_attendance(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date
+) -> List[DailyAttendanceSummary]:
+    rows = await db.scalars(
+        select(DailyAttendanceSummary)
+        .where(
+            DailyAttendanceSummary.date >= start_date,
+            DailyAttendanceSummary.date <= end_date
+        )
+        .order_by(DailyAttendanceSummary.date)
+    )
+    return list(rows)
+
+def previous_months(today: date, count: int) -> List[date]:
+    """First days of the `count` months ending with the month of `today`."""
+    months = [month_start(today)]
+    while len(months) < count:
+        months.append(month_start(months[-1] - timedelta(days=1)))
+    return months[::-1]
+
+async def get_dashboard_stats(db: AsyncSession, today: date, attendance_days: int) -> dict:
+    """Headline figures of the dashboard, read from the summary tables only."""
+    total_employees = await db.scalar(
+        select(func.coalesce(func.sum(DepartmentHeadcount.employee_count), 0))
+    )
+    total_departments = await db.scalar(select(func.count(Department.id)))
+
+    previous_month, this_month = previous_months(today, 2)
+    payroll_totals = await get_monthly_payroll_totals(db, previous_month, this_month)
+    monthly_payroll = sum(
+        total for (month, _), total in payroll_totals.items() if month == this_month
+    )
+    previous_payroll = sum(
+        total for (month, _), total in payroll_totals.items() if month == previous_month
+    )
+
+    hires, departures = (await db.execute(
+        select(MonthlyHeadcountChange.hires, MonthlyHeadcountChange.departures)
+        .where(MonthlyHeadcountChange.month == this_month)
+    )).first() or (0, 0)
+    headcount_at_month_start = total_employees - hires + departures
+
+    attendance_totals = (await db.execute(
+        select(
+            func.coalesce(func.sum(DailyAttendanceSummary.present_count), 0),
+            func.coalesce(func.sum(DailyAttendanceSummary.half_day_count), 0),
+            func.coalesce(func.sum(
+                DailyAttendanceSummary.present_count
+                + DailyAttendanceSummary.absent_count
+                + DailyAttendanceSummary.leave_count
+                + DailyAttendanceSummary.half_day_count
+            ), 0)
+        )
+        .where(
+            DailyAttendanceSummary.date > today - timedelta(days=attendance_days),
+            DailyAttendanceSummary.date <= today
+        )
+    )).one()
+
+    return {
+        "total_employees": total_employees,
+        "total_departments": total_departments,
+        "monthly_payroll": round(monthly_payroll, 2),
+        "attendance_rate": _attendance_rate(*attendance_totals),
+        "employee_growth": _growth(total_employees, headcount_at_month_start),
+        "payroll_growth": _growth(monthly_payroll, previous_payroll),
+    }
+
+async def get_dashboard_charts(
+    db: AsyncSession,
+    today: date,
+    months: int,
+    attendance_days: int
+) -> dict:
+    """Chart series of the dashboard, read from the summary tables only."""
+    headcounts = await get_headcounts(db)
+    names = {department_id: name for department_id, name, _ in headcounts}
+
+    month_range = previous_months(today, months)
+    payroll_totals = await get_monthly_payroll_totals(db, month_range[0], month_range[-1])
+    department_ids = sorted({department_id for _, department_id in payroll_totals})
+    if department_ids:
+        names.update(
+            (department_id, name) for department_id, name in await db.execute(
+                select(Department.id, Department.name)
+                .where(Department.id.in_(department_ids))
+            )
+        )
+
+    days = await get_daily_attendance(
+        db, today - timedelta(days=attendance_days - 1), today
+    )
+
+    return {
+        "employee_distribution": {
+            "labels": [name for _, name, _ in headcounts],
+            "datasets": [{
+                "label": "Employees",
+                "data": [count for _, _, count in headcounts],
+            }],
+        },
+        "payroll_trends": {
+            "labels": [month.strftime("%Y-%m") for month in month_range],
+            "datasets": [
+                {
+                    "label": _department_name(department_id, names),
+                    "data": [
+                        round(payroll_totals.get((month, department_id), 0), 2)
+                        for month in month_range
+                    ],
+                }
+                for department_id in department_ids
+            ],
+        },
+        "attendance_trends": {
+            "labels": [day.date.isoformat() for day in days],
+            "datasets": [{
+                "label": "Attendance rate",
+                "data": [
+                    _attendance_rate(
+                        day.present_count,
+                        day.half_day_count,
+                        day.present_count + day.absent_count
+                        + day.leave_count + day.half_day_count
+                    )
+                    for day in days
+                ],
+            }],
+        },
+    }
+
+async def get_payroll_summary(db: AsyncSession, today: date) -> dict:
+    """This month's payroll against the last, headcount and average salary."""
+    total_employees, total_base_salary = (await db.execute(
+        select(
+            func.coalesce(func.sum(DepartmentHeadcount.employee_count), 0),
+            func.coalesce(func.sum(DepartmentHeadcount.total_base_salary), 0)
+        )
+    )).one()
+
+    previous_month, this_month = previous_months(today, 2)
+    payroll_totals = await get_monthly_payroll_totals(db, previous_month, this_month)
+    monthly_payroll = sum(
+        total for (month, _), total in payroll_totals.items() if month == this_month
+    )
+    previous_payroll = sum(
+        total for (month, _), total in payroll_totals.items() if month == previous_month
+    )
+
+    next_payroll_date = await db.scalar(
+        select(func.min(Payroll.payment_date))
+        .where(
+            Payroll.status != PayrollStatus.PAID,
+            Payroll.payment_date >= today
+        )
+    )
+
+    return {
+        "total_payroll": round(monthly_payroll, 2),
+        "payroll_growth": _growth(monthly_payroll, previous_payroll),
+        "total_employees": total_employees,
+        "average_salary": round(total_base_salary / total_employees, 2) if total_employees else 0.0,
+        "next_payroll_date": next_payroll_date,
+    }
+
+async def get_attendance_summary(db: AsyncSession, day: date, attendance_days: int) -> dict:
+    """
+    Attendance counts of a day, as shares of the headcount, and the
+    attendance rate of the `attendance_days` days ending with it.
+    """
+    total_employees = await db.scalar(
+        select(func.coalesce(func.sum(DepartmentHeadcount.employee_count), 0))
+    )
+    counts = await db.scalar(
+        select(DailyAttendanceSummary).where(DailyAttendanceSummary.date == day)
+    )
+    present, absent, on_leave, half_day = (
+        (counts.present_count, counts.absent_count, counts.leave_count, counts.half_day_count)
+        if counts else (0, 0, 0, 0)
+    )
+
+    days = await get_daily_attendance(db, day - timedelta(days=attendance_days - 1), day)
+    average_attendance = _attendance_rate(
+        sum(summary.present_count for summary in days),
+        sum(summary.half_day_count for summary in days),
+        sum(
+            summary.present_count + summary.absent_count
+            + summary.leave_count + summary.half_day_count
+            for summary in days
+        )
+    )
+
+    def share(count: int) -> float:
+        return round(count / total_employees * 100, 2) if total_employees else 0.0
+
+    return {
+        "date": day,
+        "present": present,
+        "absent": absent,
+        "on_leave": on_leave,
+        "half_day": half_day,
+        "present_percentage": share(present),
+        "absent_percentage": share(absent),
+        "average_attendance": average_attendance,
+    }
+
+async def get_recent_activities(db: AsyncSession, limit: int) -> List[dict]:
+    """
+    The latest employee and payroll records as activity entries, newest
+    first. Both queries walk the primary key index backwards, so their cost
+    depends on `limit` only.
+    """
+    employees = await db.execute(
+        select(Employee.first_name, Employee.last_name, Employee.position, Employee.created_at)
+        .order_by(Employee.id.desc())
+        .limit(limit)
+    )
+    payrolls = await db.execute(
+        select(
+            Employee.first_name, Employee.last_name,
+            Payroll.pay_period_start, Payroll.status, Payroll.created_at
+        )
+        .join(Employee, Employee.id == Payroll.employee_id)
+        .order_by(Payroll.id.desc())
+        .limit(limit)
+    )
+
+    activities = [
+        {
+            "action": "employee_added",
+            "description": f"{first_name} {last_name} joined as {position}",
+            "timestamp": created_at,
+        }
+        for first_name, last_name, position, created_at in employees
+    ] + [
+        {
+            "action": f"payroll_{payroll_status.value}",
+            "description": (
+                f"Payroll for {first_name} {last_name}, "
+                f"{pay_period_start.strftime('%Y-%m')}"
+            ),
+            "timestamp": created_at,
+        }
+        for first_name, last_name, pay_period_start, payroll_status, created_at in payrolls
+    ]
+    activities.sort(key=lambda activity: activity["timestamp"], reverse=True)
+    return activities[:limit]
+
+async def _rebuild() -> None:
+    from database import AsyncSessionLocal, dispose_engines
+    async with AsyncSessionLocal() as db:
+        await rebuild_summaries(db)
+    await dispose_engines()
+
+if __name__ == "__main__":
+    # Backfill the summary tables, e.g. after upgrading: python -m summaries
+    import asyncio
+    asyncio.run(_rebuild())
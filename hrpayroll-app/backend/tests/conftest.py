@@ -0,0 +1,119 @@
+"""
+Test configuration.
+
+The settings are read from the environment when config is first imported, so
+the test environment is set up here, before any application module is
+imported: a SQLite database and scratch directories in a temporary directory,
+SQL statement budgets enforced ("raise"), cheap password hashing and no
+background job runner. SQLite connections get the bound parameter limit of
+stock SQLite builds (some distributions raise it), so that statements
+too large for production databases fail here too. The tests of a session
+share one event loop, one database and one running application.
+"""
+import asyncio
+import itertools
+import os
+import sqlite3
+import tempfile
+
+SCRATCH = tempfile.mkdtemp(prefix="hrpayroll-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{SCRATCH}/test.db",
+    "QUERY_BUDGET_MODE": "raise",
+    "BCRYPT_ROUNDS": "4",
+    "JOB_RUNNER_ENABLED": "false",
+    "PUNCH_SPOOL_PATH": f"{SCRATCH}/spool/punches.ndjson",
+    "PAYSLIP_STORE_PATH": f"{SCRATCH}/payslips",
+    "JOB_RESULTS_PATH": f"{SCRATCH}/job_results",
+})
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from auth import get_password_hash
+from config import settings
+from database import SessionLocal, async_engine, engine, init_db
+from main import app
+from models import User, UserRole
+
+API = settings.API_V1_PREFIX
+
+# SQLITE_MAX_VARIABLE_NUMBER of stock SQLite since 3.32
+SQLITE_MAX_VARIABLES = 32766
+
+@event.listens_for(engine, "connect")
+def _limit_variables(dbapi_connection, connection_record):
+    dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, SQLITE_MAX_VARIABLES)
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _limit_async_variables(dbapi_connection, connection_record):
+    # Run on aiosqlite's thread, which owns the sqlite3 connection
+    connection = dbapi_connection.driver_connection
+    dbapi_connection.await_(connection._execute(
+        connection._conn.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, SQLITE_MAX_VARIABLES
+    ))
+
+_names = itertools.count(1)
+
+def unique(prefix: str) -> str:
+    """A name not used by any other test of the session."""
+    return f"{prefix}-{next(_names)}"
+
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture(scope="session")
+async def client():
+    """Client of the running application, authenticated as an admin."""
+    init_db()
+    with SessionLocal() as db:
+        db.add(User(
+            email="admin@example.com",
+            username="admin",
+            hashed_password=get_password_hash("admin-password"),
+            role=UserRole.ADMIN
+        ))
+        db.commit()
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                f"{API}/auth/login", data={"username": "admin", "password": "admin-password"}
+            )
+            assert response.status_code == 200, response.text
+            client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+            yield client
+
+@pytest.fixture
+async def department(client) -> dict:
+    response = await client.post(f"{API}/departments/", json={"name": unique("Department")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.fixture
+async def employee(client, department) -> dict:
+    response = await client.post(f"{API}/employees/", json=employee_payload(department["id"]))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def employee_payload(department_id: int, **fields) -> dict:
+    payload = {
+        "first_name": unique("First"),
+        "last_name": "Tester",
+        "date_of_birth": None,
+        "gender": None,
+        "phone": None,
+        "address": None,
+        "position": "Engineer",
+        "base_salary": 5000,
+        "department_id": department_id,
+        "hire_date": "2020-01-01",
+        "user_id": None,
+    }
+    payload.update(fields)
+    return payload
@@ -0,0 +1,63 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select
+
+from config import settings
+from conftest import API, employee_payload
+from database import SessionLocal
+from models import Attendance
+from summaries import MAX_STATEMENT_PARAMETERS, statement_slices
+
+def test_statement_slices_fit_parameter_limit():
+    items = list(range(10001))
+    chunks = list(statement_slices(items, 5))
+    assert [item for chunk in chunks for item in chunk] == items
+    assert all(len(chunk) * 5 <= MAX_STATEMENT_PARAMETERS for chunk in chunks)
+
+async def test_maximum_size_batch(client, department):
+    employee_ids = []
+    for _ in range(2):
+        response = await client.post(f"{API}/employees/", json=employee_payload(department["id"]))
+        assert response.status_code == 200, response.text
+        employee_ids.append(response.json()["id"])
+
+    # One attendance row per event: more rows than fit in one statement
+    events = [
+        {
+            "employee_id": employee_ids[index % 2],
+            "timestamp": datetime.combine(
+                date(2000, 1, 1) + timedelta(days=index // 2), time(9)
+            ).isoformat(),
+            "direction": "in",
+        }
+        for index in range(settings.ATTENDANCE_BATCH_MAX_EVENTS)
+    ]
+    response = await client.post(f"{API}/attendance/punches", json={"events": events})
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "received": len(events),
+        "upserted": len(events),
+        "rejected": [],
+    }
+
+    # Again with check-outs: every row is updated and gets its work hours
+    for event in events:
+        event["timestamp"] = event["timestamp"].replace("T09:00", "T17:30")
+        event["direction"] = "out"
+    response = await client.post(f"{API}/attendance/punches", json={"events": events})
+    assert response.status_code == 200, response.text
+    assert response.json()["upserted"] == len(events)
+
+    with SessionLocal() as db:
+        hours = db.execute(
+            select(func.count(), func.min(Attendance.work_hours), func.max(Attendance.work_hours))
+            .where(Attendance.employee_id.in_(employee_ids))
+        ).one()
+    assert tuple(hours) == (len(events), 8.5, 8.5)
+
+async def test_oversized_batch_rejected(client, employee):
+    events = [
+        {"employee_id": employee["id"], "timestamp": "2024-01-01T09:00:00", "direction": "in"}
+    ] * (settings.ATTENDANCE_BATCH_MAX_EVENTS + 1)
+    response = await client.post(f"{API}/attendance/punches", json={"events": events})
+    assert response.status_code == 422
@@ -0,0 +1,151 @@
+"""
+Principal and result caches sharing one store, as two workers would, with
+the in-process InMemoryCacheBackend standing in for Redis, and result caches
+seeing writes committed by other processes.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+import summaries
+from cache import InMemoryCacheBackend
+from change_tracking import get_table_versions
+from conftest import API, employee_payload, unique
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Department, Employee
+from principal_cache import PrincipalCache
+from result_cache import ResultCache
+from schemas import UserResponse
+
+def principal(role: str = "hr") -> UserResponse:
+    return UserResponse(
+        id=1,
+        email="user@example.com",
+        username="user",
+        role=role,
+        is_active=True,
+        created_at=datetime(2024, 1, 1),
+        updated_at=None
+    )
+
+async def test_invalidation_reaches_other_workers():
+    backend = InMemoryCacheBackend()
+    first, second = (PrincipalCache(100, 60, backend) for _ in range(2))
+
+    generation = await first.generation("user")
+    await first.set("user", 1, generation, principal())
+    assert await second.get("user", 1, await second.generation("user")) == principal()
+
+    await second.invalidate("user")
+    assert await first.get("user", 1, await first.generation("user")) is None
+    assert await second.get("user", 1, await second.generation("user")) is None
+
+async def test_principal_loaded_before_invalidation_is_not_served():
+    backend = InMemoryCacheBackend()
+    first, second = (PrincipalCache(100, 60, backend) for _ in range(2))
+
+    # first reads the generation and loads the user; second changes it meanwhile
+    generation = await first.generation("user")
+    await second.invalidate("user")
+    await first.set("user", 1, generation, principal("employee"))
+
+    assert await first.get("user", 1, await first.generation("user")) is None
+
+async def test_local_invalidation_without_shared_store():
+    cache = PrincipalCache(100, 60)
+    generation = await cache.generation("user")
+    await cache.invalidate("user")
+    await cache.set("user", 1, generation, principal())
+    assert await cache.get("user", 1, await cache.generation("user")) is None
+
+def add_employee(department_id: int) -> None:
+    """Commit an employee outside the API, as a job worker would."""
+    with SessionLocal() as db:
+        db.add(Employee(
+            department_id=department_id,
+            first_name=unique("Worker"),
+            last_name="Tester",
+            hire_date=date(2021, 1, 1),
+            position="Engineer",
+            base_salary=1000
+        ))
+        db.commit()
+
+async def test_results_shared_until_tables_change(client, department):
+    backend = InMemoryCacheBackend()
+    first, second = ResultCache(100, 60, backend), ResultCache(100, 60, backend)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"total": len(calls)}
+
+    async with AsyncSessionLocal() as db:
+        assert await first.get_or_compute(db, "summary", {}, ("employees",), compute) == {"total": 1}
+        assert await second.get_or_compute(db, "summary", {}, ("employees",), compute) == {"total": 1}
+
+    # Neither cache is told about the write
+    add_employee(department["id"])
+    async with AsyncSessionLocal() as db:
+        assert await second.get_or_compute(db, "summary", {}, ("employees",), compute) == {"total": 2}
+        assert await first.get_or_compute(db, "summary", {}, ("employees",), compute) == {"total": 2}
+
+async def test_write_by_another_process_changes_next_response(client, department):
+    url = f"{API}/departments/{department['id']}/statistics"
+    response = await client.get(url)
+    assert response.status_code == 200, response.text
+    assert response.json()["total_employees"] == 0
+    etag = response.headers["etag"]
+
+    add_employee(department["id"])
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_employees"] == 1
+    assert response.headers["etag"] != etag
+
+async def test_employee_directory_sees_writes_of_other_processes(client, department):
+    url = f"{API}/employees/directory"
+    params = {"department_id": department["id"]}
+    response = await client.post(f"{API}/employees/", json=employee_payload(department["id"]))
+    assert response.status_code == 200, response.text
+    response = await client.get(url, params=params)
+    assert len(response.json()["items"]) == 1
+    etag = response.headers["etag"]
+
+    add_employee(department["id"])
+    response = await client.get(url, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 2
+    assert response.headers["etag"] != etag
+
+async def test_summary_rebuild_changes_source_table_versions(client):
+    async with AsyncSessionLocal() as db:
+        before = await get_table_versions(db, ("employees", "payrolls"))
+        await summaries.rebuild_summaries(db)
+        after = await get_table_versions(db, ("employees", "payrolls"))
+    assert all(after[table] == before[table] + 1 for table in before)
+
+async def test_versions_incremented_after_the_commit_of_the_write(client):
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split("(")[0].strip())
+    def record_commit(conn):
+        statements.append("COMMIT")
+
+    async with AsyncSessionLocal() as db:
+        before = await get_table_versions(db, ("departments",))
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record_statement)
+        event.listen(async_engine.sync_engine, "commit", record_commit)
+        try:
+            db.add(Department(name=unique("Department")))
+            await db.commit()
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record_statement)
+            event.remove(async_engine.sync_engine, "commit", record_commit)
+        after = await get_table_versions(db, ("departments",))
+
+    # The row lock of table_versions is not held across the write
+    assert statements == [
+        "INSERT INTO departments", "COMMIT", "INSERT INTO table_versions", "COMMIT"
+    ]
+    assert after["departments"] == before["departments"] + 1
@@ -0,0 +1,42 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+import pytest
+
+from conftest import API, employee_payload
+from file_formats import FileFormat, encode_rows
+
+def test_money_encoded_as_the_api_returns_it():
+    rows = [(1, Decimal("5123.45")), (2, Decimal("100")), (3, Decimal("0.1"))]
+    columns = ("id", "base_salary")
+    assert encode_rows(rows, columns, FileFormat.NDJSON) == (
+        '{"id": 1, "base_salary": 5123.45}\n'
+        '{"id": 2, "base_salary": 100.0}\n'
+        '{"id": 3, "base_salary": 0.1}\n'
+    )
+    assert encode_rows(rows, columns, FileFormat.CSV, header=True) == (
+        "id,base_salary\n1,5123.45\n2,100.00\n3,0.10\n"
+    )
+
+@pytest.mark.parametrize("file_format", list(FileFormat))
+async def test_employee_export(client, department, file_format):
+    response = await client.post(
+        f"{API}/employees/",
+        json=employee_payload(department["id"], base_salary="5123.45")
+    )
+    assert response.status_code == 200, response.text
+    employee = response.json()
+
+    response = await client.get(
+        f"{API}/employees/export",
+        params={"format": file_format.value, "department_id": department["id"]}
+    )
+    assert response.status_code == 200, response.text
+    if file_format == FileFormat.NDJSON:
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [record["base_salary"] for record in records] == [employee["base_salary"]]
+    else:
+        records = list(csv.DictReader(io.StringIO(response.text)))
+        assert [record["base_salary"] for record in records] == ["5123.45"]
@@ -0,0 +1,69 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+import jobs
+from config import Settings
+from conftest import API
+
+def test_api_does_not_run_jobs_by_default():
+    assert Settings.model_fields["JOB_RUNNER_ENABLED"].default is False
+
+@pytest.fixture
+async def job_worker(client):
+    """A job runner like those of the worker service."""
+    runner = jobs.JobRunner(concurrency=2, poll_interval=0.05, lease=60)
+    await runner.start()
+    yield runner
+    await runner.stop()
+
+async def finished_job(client, job_id: int) -> dict:
+    for _ in range(200):
+        response = await client.get(f"{API}/jobs/{job_id}")
+        assert response.status_code == 200, response.text
+        job = response.json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+@pytest.mark.parametrize("file_format", ["csv", "ndjson"])
+async def test_export_job_result_is_downloadable(client, job_worker, employee, file_format):
+    response = await client.post(
+        f"{API}/employees/export",
+        params={"department_id": employee["department_id"], "format": file_format}
+    )
+    assert response.status_code == 202, response.text
+
+    job = await finished_job(client, response.json()["id"])
+    assert job["status"] == "succeeded", job
+    assert job["result"]["rows"] == 1
+
+    response = await client.get(f"{API}/jobs/{job['id']}/result")
+    assert response.status_code == 200
+    if file_format == "ndjson":
+        rows = [json.loads(line) for line in response.text.splitlines()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["first_name"] for row in rows] == [employee["first_name"]]
+
+async def test_result_file_written_off_the_event_loop(tmp_path, monkeypatch):
+    write_threads = []
+    real_to_thread = asyncio.to_thread
+
+    async def to_thread(function, *args):
+        write_threads.append(function)
+        return await real_to_thread(function, *args)
+
+    monkeypatch.setattr(jobs.asyncio, "to_thread", to_thread)
+    path = str(tmp_path / "results" / "job-1-export.csv")
+    async with jobs.open_result_file(path) as write:
+        await write(b"a,b\n")
+        await write(b"1,2\n")
+    with open(path, "rb") as file:
+        assert file.read() == b"a,b\n1,2\n"
+    # Creating, both writes and closing
+    assert len(write_threads) == 4
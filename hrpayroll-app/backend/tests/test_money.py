@@ -0,0 +1,120 @@
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import money
+from conftest import API, employee_payload
+from database import SessionLocal
+from models import Employee
+from money import RoundingPolicy
+from schemas import PayrollCreate
+
+def reference_divide(numerator: int, denominator: int, policy: RoundingPolicy) -> int:
+    """Quotient rounded by Decimal, whose precision is ample for these values."""
+    quotient = Decimal(numerator) / Decimal(denominator)
+    return int(quotient.quantize(Decimal(1), rounding=money.DECIMAL_ROUNDING[policy]))
+
+def test_divide_ties_half_up_and_half_even():
+    numerators = np.array([5, 15, 25, 35, -5, -15, -25, -35, 4, 6, -4, -6], dtype=np.int64)
+    assert money.divide(numerators, 10, RoundingPolicy.HALF_UP).tolist() == [
+        1, 2, 3, 4, -1, -2, -3, -4, 0, 1, 0, -1
+    ]
+    assert money.divide(numerators, 10, RoundingPolicy.HALF_EVEN).tolist() == [
+        0, 2, 2, 4, 0, -2, -2, -4, 0, 1, 0, -1
+    ]
+
+@pytest.mark.parametrize("policy", list(RoundingPolicy))
+@pytest.mark.parametrize("denominator", [1, 2, 3, 4, 7, 10, 100])
+def test_divide_matches_decimal_rounding(policy, denominator):
+    numerators = np.arange(-1000, 1001, dtype=np.int64)
+    expected = [reference_divide(value, denominator, policy) for value in numerators.tolist()]
+    assert money.divide(numerators, denominator, policy).tolist() == expected
+    # Python integers, as used when int64 could overflow
+    assert money.divide(numerators.astype(object), denominator, policy).tolist() == expected
+
+def test_quantize_negative_amounts():
+    assert money.quantize("-0.005", RoundingPolicy.HALF_UP) == Decimal("-0.01")
+    assert money.quantize("-0.005", RoundingPolicy.HALF_EVEN) == Decimal("0.00")
+    assert money.quantize("-0.015", RoundingPolicy.HALF_EVEN) == Decimal("-0.02")
+    assert money.to_cents("-1234.565", RoundingPolicy.HALF_UP) == -123457
+
+@pytest.mark.parametrize("policy", [RoundingPolicy.HALF_UP, RoundingPolicy.HALF_EVEN])
+def test_multiply_totals_are_exact(policy):
+    rng = random.Random(7)
+    cents = np.array([rng.randrange(-10_000_000, 10_000_000) for _ in range(1000)], dtype=np.int64)
+    rate = "0.0725"
+    products = money.multiply(cents, rate, policy)
+    expected = [
+        money.quantize(money.from_cents(value) * Decimal(rate), policy)
+        for value in cents.tolist()
+    ]
+    assert money.decimals(products) == expected
+    assert money.from_cents(int(products.sum())) == sum(expected)
+
+def test_multiply_falls_back_to_python_integers():
+    cents = np.array([money.INT64_MAX // 10, -(money.INT64_MAX // 10)], dtype=np.int64)
+    factor = Fraction(999_999_937, 1_000_000_007)
+    expected = [
+        reference_divide(value * factor.numerator, factor.denominator, RoundingPolicy.HALF_EVEN)
+        for value in cents.tolist()
+    ]
+    assert money.multiply(cents, factor, RoundingPolicy.HALF_EVEN).tolist() == expected
+
+def test_allocate_distributes_remainder_to_largest_remainders():
+    assert money.allocate(100, [1, 1, 1]).tolist() == [34, 33, 33]
+    assert money.allocate(-100, [1, 1, 1]).tolist() == [-34, -33, -33]
+    # Exact shares 14.4, 28.8, 56.8: the two cents left go to 0.8 and 0.8
+    assert money.allocate(100, [1, 2, 4]).tolist() == [14, 29, 57]
+    assert money.allocate(5, [0, 3, 0]).tolist() == [0, 5, 0]
+    assert money.allocate(0, [1, 2]).tolist() == [0, 0]
+
+def test_allocate_shares_add_up():
+    rng = random.Random(11)
+    for _ in range(500):
+        cents = rng.randrange(-10**12, 10**12)
+        weights = [rng.randrange(0, 10**6) for _ in range(rng.randrange(1, 20))]
+        if not any(weights):
+            continue
+        shares = money.allocate(cents, weights)
+        assert int(shares.sum()) == cents
+        exact = [Fraction(cents * weight, sum(weights)) for weight in weights]
+        assert all(abs(share - value) < 1 for share, value in zip(shares.tolist(), exact))
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1]])
+def test_allocate_rejects_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        money.allocate(100, weights)
+
+def test_money_schema_rounds_to_cents():
+    payroll = PayrollCreate(
+        employee_id=1,
+        pay_period_start="2024-01-01",
+        pay_period_end="2024-01-31",
+        payment_date="2024-02-01",
+        base_salary="1234.565",
+        overtime_pay=0.1,
+        net_salary="1000"
+    )
+    assert payroll.base_salary == money.quantize(Decimal("1234.565"))
+    assert payroll.overtime_pay == Decimal("0.10")
+    assert payroll.model_dump(mode="json")["overtime_pay"] == 0.1
+    # Ten times 0.1 is exactly 1.00, unlike with floats
+    assert sum([payroll.overtime_pay] * 10) == Decimal("1.00")
+
+async def test_money_round_trip_through_numeric_column(client, department):
+    response = await client.post(
+        f"{API}/employees/", json=employee_payload(department["id"], base_salary="98765.43")
+    )
+    assert response.status_code == 200, response.text
+    employee = response.json()
+    assert employee["base_salary"] == 98765.43
+
+    with SessionLocal() as db:
+        stored = db.get(Employee, employee["id"]).base_salary
+    assert stored == Decimal("98765.43")
+
+    response = await client.get(f"{API}/employees/{employee['id']}")
+    assert response.json()["base_salary"] == 98765.43
@@ -0,0 +1,32 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import API
+from models import Attendance, Employee
+from pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    key = [Attendance.date, Attendance.id]
+    assert decode_cursor(encode_cursor([date(2024, 1, 2), 7]), key) == [date(2024, 1, 2), 7]
+
+@pytest.mark.parametrize("values, key", [
+    (["7"], [Employee.id]),
+    ([True], [Employee.id]),
+    ([None], [Employee.id]),
+    ([1.5], [Employee.id]),
+    ([{"id": 1}], [Employee.id]),
+    ([3, 3], [Attendance.date, Attendance.id]),
+    (["not a date", 3], [Attendance.date, Attendance.id]),
+    ([7], [Attendance.date, Attendance.id]),
+])
+def test_tampered_cursor_rejected(values, key):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor(values), key)
+    assert error.value.status_code == 400
+
+async def test_tampered_cursor_is_400(client):
+    response = await client.get(f"{API}/employees/", params={"cursor": encode_cursor(["7"])})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid pagination cursor"}
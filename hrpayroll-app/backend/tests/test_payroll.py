@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import API
+
+def payroll_payload(employee: dict, month: int, **amounts) -> dict:
+    return {
+        "employee_id": employee["id"],
+        "pay_period_start": f"2023-{month:02d}-01",
+        "pay_period_end": f"2023-{month:02d}-28",
+        "payment_date": None,
+        **amounts,
+    }
+
+@pytest.mark.parametrize("amounts, net_salary", [
+    ({"base_salary": "4000.10", "overtime_pay": "250.25", "deductions": "300.30", "tax": "0.05"}, 3950.0),
+    ({"base_salary": "0.30", "deductions": "0.10", "tax": "0.10"}, 0.1),
+    ({"base_salary": "4000.10", "overtime_pay": "250.25", "deductions": "300.30", "tax": "0.05",
+      "net_salary": "3950.00"}, 3950.0),
+])
+async def test_net_salary_computed_in_cents(client, employee, amounts, net_salary):
+    response = await client.post(f"{API}/payroll/", json=payroll_payload(employee, 1, **amounts))
+    assert response.status_code == 200, response.text
+    assert response.json()["net_salary"] == net_salary
+
+async def test_disagreeing_net_salary_rejected(client, employee):
+    response = await client.post(f"{API}/payroll/", json=payroll_payload(
+        employee, 2, base_salary=5000, deductions=500, tax=800, net_salary=5000
+    ))
+    assert response.status_code == 400
+    assert "3700.00" in response.json()["detail"]
+
+async def test_net_salary_follows_updates(client, employee):
+    response = await client.post(f"{API}/payroll/", json=payroll_payload(
+        employee, 3, base_salary=5000, deductions=500, tax=800
+    ))
+    assert response.status_code == 200, response.text
+    payroll = response.json()
+    assert payroll["net_salary"] == 3700.0
+
+    update = {
+        "status": "pending",
+        "payment_date": None,
+        "overtime_pay": "100.01",
+        "deductions": 500,
+        "tax": "799.99",
+        "net_salary": None,
+    }
+    response = await client.put(f"{API}/payroll/{payroll['id']}", json=update)
+    assert response.status_code == 200, response.text
+    assert response.json()["net_salary"] == 3800.02
+
+    response = await client.put(
+        f"{API}/payroll/{payroll['id']}", json={**update, "net_salary": 3800}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,154 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from sqlalchemy import delete
+
+import money
+import payroll_rules
+from conftest import API
+from database import AsyncSessionLocal
+from models import DeductionType, PayrollRuleSet
+from money import RoundingPolicy
+from schemas import PayrollRules
+
+POSITIONS = ["Engineer", "ENGINEER", "Analyst", "Intern"]
+
+def random_rules(rng: random.Random) -> PayrollRules:
+    def rate() -> str:
+        return str(Decimal(rng.randrange(0, 5000)).scaleb(-4))
+
+    def brackets() -> list:
+        floors = sorted({0, *(rng.randrange(1, 10000) for _ in range(rng.randrange(0, 5)))})
+        return [{"above": floor, "rate": rate()} for floor in floors]
+
+    def deductions() -> list:
+        rules = []
+        for index in range(rng.randrange(0, 4)):
+            if rng.random() < 0.5:
+                rules.append({
+                    "name": f"fixed-{index}",
+                    "type": "fixed",
+                    "amount": str(Decimal(rng.randrange(0, 50000)).scaleb(-2)),
+                })
+            else:
+                rules.append({
+                    "name": f"percentage-{index}",
+                    "type": "percentage",
+                    "rate": rate(),
+                    "cap": rng.randrange(10, 500) if rng.random() < 0.5 else None,
+                })
+        return rules
+
+    return PayrollRules.model_validate({
+        "tax_brackets": brackets(),
+        "deductions": deductions(),
+        "overrides": [
+            {"department_id": 2, "position": "engineer", "tax_brackets": brackets()},
+            {"position": "Engineer", "deductions": deductions()},
+            {"department_id": 3, "tax_brackets": [], "deductions": deductions()},
+        ],
+    })
+
+def evaluate(rules: PayrollRules, department_id: int, position: str, gross: int, policy: RoundingPolicy):
+    """Deductions and tax in cents of one record, interpreting the rules in Decimal."""
+    brackets, deductions = rules.tax_brackets, rules.deductions
+    for override in rules.overrides:
+        if override.department_id is not None and override.department_id != department_id:
+            continue
+        if override.position is not None and override.position.casefold() != position.casefold():
+            continue
+        if override.tax_brackets is not None:
+            brackets = override.tax_brackets
+        if override.deductions is not None:
+            deductions = override.deductions
+        break
+
+    pay = money.from_cents(gross)
+    total = Decimal(0)
+    for deduction in deductions:
+        if deduction.type == DeductionType.FIXED:
+            total += deduction.amount
+            continue
+        amount = money.quantize(pay * deduction.rate, policy)
+        total += amount if deduction.cap is None else min(amount, deduction.cap)
+    total = min(total, pay)
+
+    taxable = pay - total
+    tax = Decimal(0)
+    for index, bracket in enumerate(brackets):
+        top = brackets[index + 1].above if index + 1 < len(brackets) else taxable
+        tax += max(Decimal(0), min(taxable, top) - bracket.above) * bracket.rate
+    return money.to_cents(total), money.to_cents(tax, policy)
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("policy", [RoundingPolicy.HALF_UP, RoundingPolicy.HALF_EVEN, RoundingPolicy.FLOOR])
+def test_compiled_plan_matches_per_record_evaluation(seed, policy):
+    rng = random.Random(seed)
+    rules = random_rules(rng)
+    plan = payroll_rules.compile_rules(1, rules)
+    count = 2000
+    department_ids = np.array([rng.randrange(0, 5) for _ in range(count)], dtype=np.int64)
+    positions = [rng.choice(POSITIONS) for _ in range(count)]
+    gross = np.array([rng.randrange(0, 3_000_000) for _ in range(count)], dtype=np.int64)
+
+    profiles = plan.profiles(department_ids, positions)
+    deductions = plan.deductions(gross, profiles, policy)
+    tax = plan.tax(gross - deductions, profiles, policy)
+
+    expected = [
+        evaluate(rules, department_id, position, cents, policy)
+        for department_id, position, cents in zip(department_ids.tolist(), positions, gross.tolist())
+    ]
+    assert list(zip(deductions.tolist(), tax.tolist())) == expected
+    # Every profile is exercised
+    assert set(profiles.tolist()) == {0, 1, 2, 3}
+
+@pytest.fixture
+async def saved_rules(client):
+    """Rule sets saved by a test, removed again afterwards."""
+    yield
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PayrollRuleSet))
+        await db.commit()
+    payroll_rules._plans.clear()
+
+def flat_tax(rate: str) -> dict:
+    return {"tax_brackets": [{"above": 0, "rate": rate}], "deductions": []}
+
+async def test_new_rule_version_replaces_cached_plan(client, saved_rules, employee):
+    response = await client.post(f"{API}/payroll/rules", json=flat_tax("0.1"))
+    assert response.status_code == 200, response.text
+    first_version = response.json()["version"]
+
+    async with AsyncSessionLocal() as db:
+        plan = await payroll_rules.get_rule_plan(db)
+        assert plan.version == first_version
+        # Compiled once, then served from the cache
+        assert await payroll_rules.get_rule_plan(db) is plan
+        assert payroll_rules._plans.get(first_version) is plan
+
+    response = await client.post(f"{API}/payroll/rules", json=flat_tax("0.2"))
+    assert response.status_code == 200, response.text
+    second_version = response.json()["version"]
+    assert second_version > first_version
+
+    async with AsyncSessionLocal() as db:
+        new_plan = await payroll_rules.get_rule_plan(db)
+    assert new_plan.version == second_version
+    assert new_plan is not plan
+    profiles = np.zeros(1, dtype=np.intp)
+    assert new_plan.tax(np.array([100_000]), profiles).tolist() == [20_000]
+
+    # Records created from now on use the new version
+    response = await client.post(f"{API}/payroll/", json={
+        "employee_id": employee["id"],
+        "pay_period_start": "2022-01-01",
+        "pay_period_end": "2022-01-31",
+        "payment_date": None,
+        "base_salary": 1000,
+    })
+    assert response.status_code == 200, response.text
+    payroll = response.json()
+    assert (payroll["deductions"], payroll["tax"], payroll["net_salary"]) == (0.0, 200.0, 800.0)
@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import API, employee_payload
+
+async def preview(client, department: dict, start: str, end: str) -> dict:
+    response = await client.get(f"{API}/payroll/preview", params={
+        "pay_period_start": start, "pay_period_end": end, "department_id": department["id"]
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.mark.parametrize("start, end, total_salary", [
+    ("2023-04-01", "2023-04-30", 3000.0),
+    ("2023-04-01", "2023-04-15", 1500.0),
+    ("2023-02-01", "2023-02-14", 1500.0),
+    ("2023-01-01", "2023-01-07", 677.42),
+    ("2023-03-16", "2023-04-15", 3048.39),
+    ("2023-01-01", "2023-03-31", 9000.0),
+])
+async def test_base_salary_prorated_to_period(client, department, start, end, total_salary):
+    await client.post(f"{API}/employees/", json=employee_payload(department["id"], base_salary=3000))
+    summary = await preview(client, department, start, end)
+    assert summary["total_employees"] == 1
+    assert summary["total_salary"] == total_salary
+
+async def test_base_salary_prorated_from_hire_date(client, department):
+    for hire_date in ("2020-01-01", "2023-06-16", "2023-06-30", "2023-07-01"):
+        response = await client.post(f"{API}/employees/", json=employee_payload(
+            department["id"], base_salary=3000, hire_date=hire_date
+        ))
+        assert response.status_code == 200, response.text
+
+    summary = await preview(client, department, "2023-06-01", "2023-06-30")
+    # Hired in the period from the 16th (15 days) and on the last day (1 day)
+    assert summary["total_employees"] == 3
+    assert summary["total_salary"] == 3000.0 + 1500.0 + 100.0
@@ -0,0 +1,136 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import punch_queue
+from attendance_ingest import ingest_punches
+from conftest import API
+from schemas import PunchEvent
+
+def punches(employee_id: int, count: int):
+    return [
+        PunchEvent(
+            employee_id=employee_id,
+            timestamp=f"2023-03-{day:02d}T09:00:00",
+            direction="in"
+        )
+        for day in range(1, count + 1)
+    ]
+
+def dead_letters(queue) -> list:
+    if not os.path.exists(queue.dead_letter_path):
+        return []
+    with open(queue.dead_letter_path, "rb") as dead_letter_file:
+        return [PunchEvent.model_validate_json(line) for line in dead_letter_file]
+
+def new_queue(spool_path) -> punch_queue.PunchQueue:
+    return punch_queue.PunchQueue(
+        spool_path=str(spool_path),
+        batch_size=100,
+        flush_interval=0.01,
+        max_pending=1000,
+        max_attempts=3
+    )
+
+@pytest.fixture
+async def queue(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(punch_queue, "RETRY_DELAY_SECONDS", 0)
+    queue = new_queue(tmp_path / "punches.ndjson")
+    await queue.start()
+    yield queue
+    await queue.stop()
+
+async def drained(queue) -> None:
+    await asyncio.wait_for(queue._drain(), 5)
+    with open(queue.checkpoint_path) as checkpoint_file:
+        assert checkpoint_file.read() == "0"
+    assert os.path.getsize(queue.spool_path) == 0
+
+async def test_faulty_punch_is_dead_lettered(queue, employee, monkeypatch):
+    poison = punches(employee["id"], 8)[5]
+    written = []
+
+    async def ingest(db, events):
+        if poison in events:
+            raise IntegrityError("INSERT", {}, Exception("constraint failed"))
+        written.extend(events)
+        return await ingest_punches(db, events)
+
+    monkeypatch.setattr(punch_queue, "ingest_punches", ingest)
+    await asyncio.gather(*(queue.submit(event) for event in punches(employee["id"], 8)))
+    await drained(queue)
+
+    assert dead_letters(queue) == [poison]
+    assert sorted(written, key=lambda event: event.timestamp) == [
+        event for event in punches(employee["id"], 8) if event != poison
+    ]
+
+async def test_batch_dead_lettered_after_operational_errors(queue, employee, monkeypatch):
+    attempts = []
+
+    async def ingest(db, events):
+        attempts.append(len(events))
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(punch_queue, "ingest_punches", ingest)
+    await asyncio.gather(*(queue.submit(event) for event in punches(employee["id"], 4)))
+    await drained(queue)
+
+    assert attempts == [4] * queue.max_attempts
+    assert dead_letters(queue) == punches(employee["id"], 4)
+
+async def test_rejected_punch_is_dead_lettered(queue, employee):
+    unknown = punches(10**9, 1)
+    await asyncio.gather(*(
+        queue.submit(event) for event in punches(employee["id"], 2) + unknown
+    ))
+    await drained(queue)
+    assert dead_letters(queue) == unknown
+
+async def test_batch_recorded_again_after_checkpoint_failure(queue, employee, monkeypatch):
+    checkpoint = queue._checkpoint
+    failures = []
+
+    def failing_checkpoint(offset):
+        if not failures:
+            failures.append(offset)
+            raise OSError("No space left on device")
+        checkpoint(offset)
+
+    monkeypatch.setattr(queue, "_checkpoint", failing_checkpoint)
+    await asyncio.gather(*(queue.submit(event) for event in punches(employee["id"], 3)))
+    await drained(queue)
+    assert failures
+    # The loop keeps going
+    await queue.submit(punches(employee["id"], 4)[3])
+    await drained(queue)
+
+async def test_punch_of_unknown_employee_rejected(client):
+    response = await client.post(f"{API}/attendance/punch", json={
+        "employee_id": 10**9, "timestamp": "2023-04-03T09:00:00", "direction": "in"
+    })
+    assert response.status_code == 404
+
+async def test_spool_of_another_worker_is_not_used(queue):
+    other = new_queue(queue.spool_path)
+    with pytest.raises(RuntimeError):
+        await other.start()
+    assert not other.running
+
+async def test_unwritable_spool_does_not_start(tmp_path):
+    (tmp_path / "file").write_text("")
+    queue = new_queue(tmp_path / "file" / "punches.ndjson")
+    with pytest.raises(OSError):
+        await queue.start()
+    assert not queue.running
+
+async def test_punch_written_directly_without_queue(client, employee):
+    assert not punch_queue.punch_queue.running
+    response = await client.post(f"{API}/attendance/punch", json={
+        "employee_id": employee["id"], "timestamp": "2023-04-03T09:00:00", "direction": "in"
+    })
+    assert response.status_code == 202, response.text
+    response = await client.get(f"{API}/employees/{employee['id']}/attendance")
+    assert [record["date"] for record in response.json()["items"]] == ["2023-04-03"]
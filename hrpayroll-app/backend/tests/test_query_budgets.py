@@ -0,0 +1,108 @@
+"""
+Every endpoint with a statement budget in QUERY_BUDGETS is requested with
+QUERY_BUDGET_MODE="raise" (see conftest.py), so a request over its budget
+fails, and its statements are counted with count_queries.
+"""
+import pytest
+
+from conftest import API, employee_payload
+from query_budget import QUERY_BUDGETS, QueryBudgetExceeded, QueryCounter, check_query_budget, count_queries
+
+@pytest.fixture
+async def records(client, department, employee) -> dict:
+    """One record of each kind the budgeted endpoints read."""
+    attendance = await client.post(
+        f"{API}/employees/{employee['id']}/attendance",
+        json={
+            "employee_id": employee["id"],
+            "date": "2024-01-02",
+            "status": "present",
+            "check_in": "2024-01-02T09:00:00",
+            "check_out": "2024-01-02T17:00:00",
+            "work_hours": None,
+            "notes": None,
+        }
+    )
+    assert attendance.status_code == 200, attendance.text
+    payroll = await client.post(
+        f"{API}/payroll/",
+        json={
+            "employee_id": employee["id"],
+            "pay_period_start": "2024-01-01",
+            "pay_period_end": "2024-01-31",
+            "base_salary": 5000,
+            "payment_date": None,
+        }
+    )
+    assert payroll.status_code == 200, payroll.text
+    job = await client.post(f"{API}/dashboard/rebuild")
+    assert job.status_code == 202, job.text
+    return {
+        "department_id": department["id"],
+        "employee_id": employee["id"],
+        "payroll_id": payroll.json()["id"],
+        "job_id": job.json()["id"],
+        "employee_name": employee["first_name"],
+    }
+
+# Concrete request of each budgeted route
+ENDPOINT_URLS = {
+    "/employees/": "/employees/",
+    "/employees/search": "/employees/search?q={employee_name}",
+    "/employees/directory": "/employees/directory",
+    "/employees/{employee_id}": "/employees/{employee_id}",
+    "/employees/{employee_id}/attendance": "/employees/{employee_id}/attendance",
+    "/departments/": "/departments/",
+    "/departments/{department_id}": "/departments/{department_id}",
+    "/departments/{department_id}/employees": "/departments/{department_id}/employees",
+    "/departments/statistics": "/departments/statistics",
+    "/departments/{department_id}/statistics": "/departments/{department_id}/statistics",
+    "/payroll/": "/payroll/",
+    "/payroll/summary": "/payroll/summary",
+    "/payroll/{payroll_id}": "/payroll/{payroll_id}",
+    "/payroll/{payroll_id}/payslip": "/payroll/{payroll_id}/payslip?format=html",
+    "/attendance/summary": "/attendance/summary?day=2024-01-02",
+    "/dashboard/stats": "/dashboard/stats",
+    "/dashboard/charts": "/dashboard/charts",
+    "/dashboard/activities": "/dashboard/activities",
+    "/jobs/{job_id}": "/jobs/{job_id}",
+}
+
+def test_every_budget_is_tested():
+    assert {path for _, path in QUERY_BUDGETS} == {API + path for path in ENDPOINT_URLS}
+
+@pytest.mark.parametrize("route", sorted(ENDPOINT_URLS))
+async def test_endpoint_within_budget(client, records, route):
+    url = API + ENDPOINT_URLS[route].format(**records)
+    with count_queries() as counter:
+        response = await client.get(url)
+
+    assert response.status_code == 200, response.text
+    assert 0 < counter.count <= QUERY_BUDGETS[("GET", API + route)], counter.statements
+
+async def test_list_statements_do_not_grow_with_rows(client, department):
+    """A page of 1 and a page of 10 employees take the same statements."""
+    for _ in range(10):
+        response = await client.post(
+            f"{API}/employees/", json=employee_payload(department["id"], hire_date="2021-01-01")
+        )
+        assert response.status_code == 200, response.text
+
+    url = f"{API}/departments/{department['id']}/employees"
+    counts = []
+    for limit in (1, 10):
+        with count_queries() as counter:
+            response = await client.get(url, params={"limit": limit})
+        assert response.status_code == 200, response.text
+        counts.append(counter.count)
+    assert counts[0] == counts[1]
+
+def test_check_query_budget_raises_over_budget():
+    method, path = next(iter(QUERY_BUDGETS))
+    counter = QueryCounter()
+    counter.statements = ["SELECT 1"] * QUERY_BUDGETS[(method, path)]
+    check_query_budget(method, path, counter)
+
+    counter.statements.append("SELECT 1")
+    with pytest.raises(QueryBudgetExceeded):
+        check_query_budget(method, path, counter)
@@ -0,0 +1,37 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from database import AsyncSessionLocal, async_engine
+from models import DailyAttendanceSummary, DepartmentHeadcount, MonthlyPayrollSummary
+from summaries import SummaryDelta
+
+async def test_delta_applied_in_table_and_key_order(client):
+    delta = SummaryDelta()
+    delta.add(DepartmentHeadcount, {"department_id": 900002}, employee_count=0)
+    delta.add(MonthlyPayrollSummary, {"month": date(2031, 2, 1), "department_id": 900001}, payroll_count=0)
+    delta.add(MonthlyPayrollSummary, {"month": date(2031, 1, 1), "department_id": 900002}, payroll_count=0)
+    delta.add(DailyAttendanceSummary, {"date": date(2031, 1, 1)}, present_count=0)
+    delta.add(DepartmentHeadcount, {"department_id": 900001}, employee_count=0)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT"):
+            statements.append((statement.split()[2], list(parameters)))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with AsyncSessionLocal() as db:
+            await delta.apply(db)
+            await db.rollback()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert [table for table, _ in statements] == [
+        "daily_attendance_summaries", "department_headcounts", "monthly_payroll_summaries"
+    ]
+    headcounts = statements[1][1]
+    assert headcounts.index(900001) < headcounts.index(900002)
+    payrolls = [str(value) for value in statements[2][1]]
+    assert payrolls.index("2031-01-01") < payrolls.index("2031-02-01")